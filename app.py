@@ -21,8 +21,9 @@ from blueprints import auth_bp, admin_bp
 
 # Imports das funções originais (mantidas para compatibilidade)
 from core.cache import (
-    CACHE_DIR, read_from_cache, save_to_cache, 
-    limpar_cache_contas, limpar_todo_cache
+    CACHE_DIR, read_from_cache, save_to_cache, ler_cabecalho_cache,
+    abrir_snapshot_contas, limpar_cache_contas, limpar_todo_cache,
+    iniciar_faxina_cache
 )
 from core.api import (
     buscar_lista_contas, buscar_todas_contas, buscar_detalhes_conta,
@@ -37,6 +38,20 @@ from core.constants import (
     NOMES_BLOQUEADOS, CACHE_EXPIRY_MINUTES
 )
 
+# Servidores de cada região (filtro "regiao" da busca)
+REGIAO_SERVIDORES = {
+    "ASIA1": ["ASIA011", "ASIA012", "ASIA013", "ASIA014", "ASIA021", "ASIA022", "ASIA023", "ASIA024", "ASIA031", "ASIA032", "ASIA033", "ASIA041", "ASIA042", "ASIA043"],
+    "ASIA2": ["ASIA051", "ASIA052", "ASIA053", "ASIA054", "ASIA061", "ASIA062", "ASIA063", "ASIA064", "ASIA071", "ASIA072", "ASIA073", "ASIA081", "ASIA082", "ASIA083"],
+    "ASIA3": ["ASIA311", "ASIA312", "ASIA313", "ASIA314", "ASIA321", "ASIA322", "ASIA323", "ASIA324", "ASIA331", "ASIA332", "ASIA333", "ASIA341", "ASIA342", "ASIA343"],
+    "ASIA4": ["ASIA351", "ASIA352", "ASIA353", "ASIA354", "ASIA361", "ASIA362", "ASIA363", "ASIA364", "ASIA371", "ASIA372", "ASIA373"],
+    "INMENA1": ["INMENA011", "INMENA012", "INMENA013", "INMENA014", "INMENA021", "INMENA022", "INMENA023", "INMENA024"],
+    "EU1": ["EU011", "EU012", "EU013", "EU014", "EU021", "EU022", "EU023", "EU024", "EU031", "EU032", "EU033", "EU034", "EU041", "EU042", "EU043"],
+    "SA1": ["SA011", "SA012", "SA013", "SA014", "SA021", "SA022", "SA023", "SA031", "SA032", "SA033", "SA034", "SA041", "SA043", "SA044"],
+    "SA2": ["SA051", "SA052", "SA053", "SA054", "SA061", "SA062", "SA064", "SA071", "SA072", "SA073", "SA081", "SA082", "SA083"],
+    "NA1": ["NA011", "NA012", "NA013", "NA014", "NA021", "NA022", "NA023", "NA031", "NA032", "NA033", "NA034", "NA042", "NA043", "NA044"],
+    "NA2": ["NA051", "NA052", "NA053", "NA054", "NA061", "NA062", "NA071", "NA072", "NA073", "NA074", "NA081", "NA082", "NA083", "NA084"]
+}
+
 
 def create_app(config_name=None):
     """Factory function para criar a aplicação Flask"""
@@ -140,15 +155,16 @@ def create_app(config_name=None):
         outros_status = sorted(outros_status, key=lambda x: x["nome"])
         status_importantes.extend(outros_status)
         
-        cache_completo = read_from_cache("contas_completas")
-        cache_teste = read_from_cache("contas_teste")
+        # Só a contagem é necessária: ler apenas o cabeçalho das entradas
+        cabecalho_completo = ler_cabecalho_cache("contas_completas")
+        cabecalho_teste = ler_cabecalho_cache("contas_teste")
         
-        tem_cache_completo = bool(cache_completo)
-        tem_cache_teste = bool(cache_teste)
-        cache_padrao = "completas" if tem_cache_completo else ("teste" if tem_cache_teste else None)
+        total_completo = cabecalho_completo["count"] if cabecalho_completo and not cabecalho_completo["expirado"] else 0
+        total_teste = cabecalho_teste["count"] if cabecalho_teste and not cabecalho_teste["expirado"] else 0
         
-        total_completo = len(cache_completo) if cache_completo else 0
-        total_teste = len(cache_teste) if cache_teste else 0
+        tem_cache_completo = total_completo > 0
+        tem_cache_teste = total_teste > 0
+        cache_padrao = "completas" if tem_cache_completo else ("teste" if tem_cache_teste else None)
         cache_status = "completo" if tem_cache_completo else ("teste" if tem_cache_teste else "vazio")
         
         # Verificar se usuário tem acesso premium
@@ -258,17 +274,32 @@ def create_app(config_name=None):
         
         cache_tipo = request.args.get("cache_tipo", "teste")
         
-        # Obter contas do cache
+        # Obter contas do cache: o snapshot é lido via mmap e cada conta só é
+        # decodificada quando acessada (read_from_cache fica como fallback)
         cache_key = "contas_completas" if cache_tipo == "completas" else "contas_teste"
-        contas_com_detalhes = read_from_cache(cache_key) or []
+        contas_com_detalhes = abrir_snapshot_contas(cache_key) or read_from_cache(cache_key) or []
+        
+        # Carregamento completo em andamento: servir as contas já carregadas se forem mais
+        # que as do snapshot atual (a resposta leva o marcador "parcial")
+        parcial = None
+        chave_indice = cache_key
+        if cache_key == "contas_completas":
+            from core.loader import abrir_publicacao_parcial, PUBLICACAO_PARCIAL_CHAVE
+            contas_parciais, marcador_parcial = abrir_publicacao_parcial()
+            if contas_parciais and len(contas_parciais) > len(contas_com_detalhes):
+                contas_com_detalhes = contas_parciais
+                parcial = marcador_parcial
+                chave_indice = PUBLICACAO_PARCIAL_CHAVE
         
         # Se não tem cache, busca diretamente da API (modo básico)
         if not contas_com_detalhes:
-            from core.api import buscar_todas_contas
+            from core.cache import executar_unico
             try:
-                contas_api = buscar_todas_contas(max_paginas=1)  # Só primeira página
+                # Só primeira página; requisições simultâneas compartilham a mesma busca
+                contas_api = executar_unico("buscar_todas_contas_p1", buscar_todas_contas, max_paginas=1)
                 if contas_api:
                     # Formatar contas da API para o mesmo formato do cache
+                    chave_indice = None
                     contas_com_detalhes = []
                     for c in contas_api[:20]:  # Máximo 20 contas sem cache
                         conta_formatada = {
@@ -296,10 +327,6 @@ def create_app(config_name=None):
                 "cache_carregando": False
             })
         
-        # Filtrar contas bloqueadas
-        contas_filtradas_cache = [c for c in contas_com_detalhes 
-                                   if c.get("basic", {}).get("name", c.get("name", "")) not in NOMES_BLOQUEADOS]
-        
         # Buscar nftIDs com bid ativo do wemixplay (se filtro bidding estiver ativo)
         nft_ids_com_bid = set()
         contas_bid_wemixplay = []
@@ -321,130 +348,45 @@ def create_app(config_name=None):
                         nomes_com_bid[nome_bid.lower()] = bid
                 
                 print(f"[FILTRO] {len(nomes_com_bid)} nomes únicos com bid para cruzamento")
-                
-                # NOVA LÓGICA: Cruzar contas com bid pelo NOME com cache do xDraco
-                # Isso é mais confiável porque a conta deve existir no cache para receber lance
-                contas_atualizadas = []
-                nomes_encontrados = set()
-                
-                for conta in contas_com_detalhes:
-                    nome_conta = (conta.get("basic", {}).get("name", "") or conta.get("name", "")).strip().lower()
-                    
-                    if nome_conta in nomes_com_bid:
-                        # Conta encontrada no cache! Atualizar com dados do bid
-                        bid_info = nomes_com_bid[nome_conta]
-                        conta["has_active_bid"] = True
-                        conta["price"] = bid_info.get("price", conta.get("price", 0))
-                        conta["auctionEndTime"] = bid_info.get("auctionEndTime", 0)
-                        conta["nftID"] = bid_info.get("nftID", conta.get("nftID", ""))
-                        conta["from_cache_match"] = True  # Flag para indicar que veio do cruzamento
-                        nomes_encontrados.add(nome_conta)
-                        print(f"[CRUZAMENTO] Conta '{nome_conta}' encontrada no cache com bid ativo!")
-                    
-                    contas_atualizadas.append(conta)
-                
-                contas_com_detalhes = contas_atualizadas
-                
-                # Atualizar nomes_com_bid para remover os já encontrados
-                nomes_faltantes = set(nomes_com_bid.keys()) - nomes_encontrados
-                print(f"[CRUZAMENTO] {len(nomes_encontrados)} contas com bid encontradas no cache")
-                print(f"[CRUZAMENTO] {len(nomes_faltantes)} contas com bid NÃO estão no cache")
-                
-                # Para contas com bid que NÃO estão no cache, buscar stats básicos
-                # Isso inclui contas com status "Vendas Completas" que ainda têm leilão ativo
-                if filtros.get("status_lance") == "bidding" and nomes_faltantes:
-                    print(f"[VENDAS COMPLETAS] Buscando stats de {len(nomes_faltantes)} contas não cacheadas...")
-                    
-                    from core.api import buscar_detalhes_conta
-                    
-                    for nome_faltante in list(nomes_faltantes):
-                        bid_info = nomes_com_bid.get(nome_faltante, {})
-                        if bid_info:
-                            seq = bid_info.get("seq")
-                            transport_id = bid_info.get("transportID", seq)
-                            nft_id = bid_info.get("nftID", "")
-                            
-                            if seq:
-                                try:
-                                    print(f"[VENDAS COMPLETAS] Buscando stats da conta '{nome_faltante}' (seq={seq})...")
-                                    
-                                    # Buscar detalhes da API - mesmo para contas "Vendas Completas" a API retorna dados
-                                    detalhes = buscar_detalhes_conta(seq, transport_id)
-                                    
-                                    if detalhes and detalhes.get("basic", {}).get("name"):
-                                        # Conta encontrada! Adicionar dados do bid
-                                        detalhes["nftID"] = nft_id
-                                        detalhes["price"] = bid_info.get("price", detalhes.get("price", 0))
-                                        detalhes["auctionEndTime"] = bid_info.get("auctionEndTime", 0)
-                                        detalhes["has_active_bid"] = True
-                                        detalhes["from_vendas_completas"] = True  # Flag especial
-                                        
-                                        contas_com_detalhes.append(detalhes)
-                                        print(f"[VENDAS COMPLETAS] Conta '{nome_faltante}' adicionada com stats!")
-                                    else:
-                                        # Fallback: criar com dados mínimos do wemixplay
-                                        conta_basica = {
-                                            "seq": seq,
-                                            "transportID": transport_id,
-                                            "nftID": nft_id,
-                                            "name": bid_info.get("name", nome_faltante),
-                                            "powerScore": bid_info.get("powerScore", 0),
-                                            "level": bid_info.get("level", 0),
-                                            "class": str(bid_info.get("class", "1")),
-                                            "worldName": bid_info.get("server", ""),
-                                            "price": bid_info.get("price", 0),
-                                            "auctionEndTime": bid_info.get("auctionEndTime", 0),
-                                            "has_active_bid": True,
-                                            "from_vendas_completas": True,
-                                            "basic": {
-                                                "name": bid_info.get("name", nome_faltante),
-                                                "powerScore": bid_info.get("powerScore", 0),
-                                                "level": bid_info.get("level", 0),
-                                                "class": str(bid_info.get("class", "1")),
-                                                "worldName": bid_info.get("server", "")
-                                            },
-                                            "stats": [],
-                                            "equip": [],
-                                            "spirit_list": [],
-                                            "skills_list": [],
-                                            "inven": [],
-                                            "codex": 0,
-                                            "potencial": 0,
-                                            "training": {},
-                                            "building": {"mina": 0}
-                                        }
-                                        contas_com_detalhes.append(conta_basica)
-                                        print(f"[VENDAS COMPLETAS] Conta '{nome_faltante}' adicionada com dados básicos")
-                                        
-                                except Exception as e:
-                                    print(f"[VENDAS COMPLETAS] Erro ao buscar conta '{nome_faltante}': {e}")
-                    
-                    # Atualizar filtro
-                    contas_filtradas_cache = [c for c in contas_com_detalhes
-                                               if c.get("basic", {}).get("name", c.get("name", "")) not in NOMES_BLOQUEADOS]
-                    
-                    contas_com_bid_total = sum(1 for c in contas_com_detalhes if c.get("has_active_bid"))
-                    print(f"[VENDAS COMPLETAS] Total de contas com bid agora: {contas_com_bid_total}")
             except Exception as e:
                 print(f"[FILTRO] Erro ao buscar nftIDs com bid: {e}")
                 import traceback
                 traceback.print_exc()
-
-        # Aplicar filtros
-        contas_filtradas = []
-        for conta in contas_filtradas_cache:
+        
+        from core.busca import (
+            IndiceContas, obter_indice, registro_busca, valor_status, ORDENACOES_STATUS,
+            BUSCA_CACHE_CONSULTAS, chave_consulta, ler_resultado, guardar_resultado
+        )
+        
+        # Filtros de itens: hash -> nome pela lista de itens (lida uma vez por requisição)
+        itens_minimos = {}
+        if is_premium and filtros["itens_filtros"]:
+            itens_lista = []
+            try:
+                itens_path = os.path.join(app.static_folder, 'itens_lista.json')
+                if os.path.exists(itens_path):
+                    with open(itens_path, 'r', encoding='utf-8') as f_itens:
+                        itens_lista = json.load(f_itens)
+            except:
+                pass
+            
+            hash_to_nome = {item["hash"]: item["nome"] for item in itens_lista}
+            for item_hash, qtd_min in filtros["itens_filtros"].items():
+                nome_item = hash_to_nome.get(item_hash, "")
+                if nome_item:
+                    itens_minimos[nome_item] = max(qtd_min, itens_minimos.get(nome_item, 0))
+        
+        espiritos_desejados = []
+        if filtros.get("espiritos"):
+            espiritos_desejados = [e.strip().lower() for e in filtros["espiritos"].split(",")]
+        
+        def conta_passa_nos_filtros_colunares(conta):
+            """Filtros que o índice colunar (core.busca) também calcula; usado nas contas fora dele"""
             # Filtros básicos (disponíveis para todos)
             classe_conta = str(conta.get("class", "1"))
             if filtros.get("classe") and filtros["classe"] != "0":
                 if classe_conta != filtros["classe"]:
-                    continue
-            
-            # Filtro por nome do jogador
-            if filtros.get("nome_jogador") and filtros["nome_jogador"]:
-                nome_conta = conta.get("name", conta.get("basic", {}).get("name", "")).lower()
-                nome_busca = filtros["nome_jogador"].lower()
-                if nome_busca not in nome_conta:
-                    continue
+                    return False
             
             # Filtro por status de lance (usando dados em tempo real do wemixplay)
             status_lance = filtros.get("status_lance")
@@ -453,7 +395,7 @@ def create_app(config_name=None):
                 if status_lance == "bidding":
                     # Aba "Com Lance" (Premium) - mostra APENAS contas com bid ativo
                     if nft_id not in nft_ids_com_bid:
-                        continue
+                        return False
                 # Aba "Listado" mostra TODAS as contas (incluindo as com bid)
                 # O badge será atualizado no frontend baseado em has_active_bid
             
@@ -461,198 +403,125 @@ def create_app(config_name=None):
             world_name = conta.get("worldName", conta.get("basic", {}).get("worldName", ""))
             if filtros.get("servidor") and filtros["servidor"]:
                 if world_name != filtros["servidor"]:
-                    continue
+                    return False
             elif filtros.get("regiao") and filtros["regiao"]:
                 # Se só tem região, filtra pelos servidores daquela região
-                regiao_servidores = {
-                    "ASIA1": ["ASIA011", "ASIA012", "ASIA013", "ASIA014", "ASIA021", "ASIA022", "ASIA023", "ASIA024", "ASIA031", "ASIA032", "ASIA033", "ASIA041", "ASIA042", "ASIA043"],
-                    "ASIA2": ["ASIA051", "ASIA052", "ASIA053", "ASIA054", "ASIA061", "ASIA062", "ASIA063", "ASIA064", "ASIA071", "ASIA072", "ASIA073", "ASIA081", "ASIA082", "ASIA083"],
-                    "ASIA3": ["ASIA311", "ASIA312", "ASIA313", "ASIA314", "ASIA321", "ASIA322", "ASIA323", "ASIA324", "ASIA331", "ASIA332", "ASIA333", "ASIA341", "ASIA342", "ASIA343"],
-                    "ASIA4": ["ASIA351", "ASIA352", "ASIA353", "ASIA354", "ASIA361", "ASIA362", "ASIA363", "ASIA364", "ASIA371", "ASIA372", "ASIA373"],
-                    "INMENA1": ["INMENA011", "INMENA012", "INMENA013", "INMENA014", "INMENA021", "INMENA022", "INMENA023", "INMENA024"],
-                    "EU1": ["EU011", "EU012", "EU013", "EU014", "EU021", "EU022", "EU023", "EU024", "EU031", "EU032", "EU033", "EU034", "EU041", "EU042", "EU043"],
-                    "SA1": ["SA011", "SA012", "SA013", "SA014", "SA021", "SA022", "SA023", "SA031", "SA032", "SA033", "SA034", "SA041", "SA043", "SA044"],
-                    "SA2": ["SA051", "SA052", "SA053", "SA054", "SA061", "SA062", "SA064", "SA071", "SA072", "SA073", "SA081", "SA082", "SA083"],
-                    "NA1": ["NA011", "NA012", "NA013", "NA014", "NA021", "NA022", "NA023", "NA031", "NA032", "NA033", "NA034", "NA042", "NA043", "NA044"],
-                    "NA2": ["NA051", "NA052", "NA053", "NA054", "NA061", "NA062", "NA071", "NA072", "NA073", "NA074", "NA081", "NA082", "NA083", "NA084"]
-                }
-                servidores_regiao = regiao_servidores.get(filtros["regiao"], [])
+                servidores_regiao = REGIAO_SERVIDORES.get(filtros["regiao"], [])
                 if servidores_regiao and world_name not in servidores_regiao:
-                    continue
+                    return False
             
             power = conta.get("powerScore", conta.get("basic", {}).get("powerScore", 0))
             if filtros.get("power_min") and power < filtros["power_min"]:
-                continue
+                return False
             if filtros.get("power_max") and power > filtros["power_max"]:
-                continue
+                return False
             
             level = conta.get("level", conta.get("basic", {}).get("level", 0))
             if filtros.get("level_min") and level < filtros["level_min"]:
-                continue
+                return False
             if filtros.get("level_max") and level > filtros["level_max"]:
-                continue
+                return False
             
             price = conta.get("price", 0)
             if filtros.get("price_min") and price < filtros["price_min"]:
-                continue
+                return False
             if filtros.get("price_max") and price > filtros["price_max"]:
-                continue
+                return False
             
             mina_level = conta.get("building", {}).get("mina", 0)
             if filtros.get("mina_min") and mina_level < filtros["mina_min"]:
-                continue
+                return False
             
             codex = conta.get("codex", 0)
             if filtros.get("codex_min") and codex < filtros["codex_min"]:
-                continue
+                return False
+            
+            # Contagens de equipamentos vêm prontas do registro de busca da conta
+            registro = registro_busca(conta)
             
             # FILTRO: Equipamentos Lendários (APENAS grade 5, equipados)
             if filtros.get("itens_comercio_min"):
-                # Contar APENAS equipamentos lendários (grade 5)
-                equipamentos = conta.get("equip", [])
-                equip_lendarios = [e for e in equipamentos if e.get("grade", 0) == 5]
-                if len(equip_lendarios) < filtros["itens_comercio_min"]:
-                    continue
+                if registro["equip_lendarios"] < filtros["itens_comercio_min"]:
+                    return False
             
             # NOVO FILTRO: Equipamentos Trade (comercializáveis com balança)
-            if filtros.get("equip_lend_trade_min") or filtros.get("equip_epic_trade_min"):
-                equipamentos = conta.get("equip", [])
-                lend_trade_count = sum(1 for e in equipamentos if e.get("trade") and e.get("grade") == 5)
-                epic_trade_count = sum(1 for e in equipamentos if e.get("trade") and e.get("grade") == 4)
-                
-                if filtros.get("equip_lend_trade_min") and lend_trade_count < filtros["equip_lend_trade_min"]:
-                    continue
-                if filtros.get("equip_epic_trade_min") and epic_trade_count < filtros["equip_epic_trade_min"]:
-                    continue
-            
-            # NOVO FILTRO: Nome do jogador
-            if filtros.get("nome_jogador"):
-                nome_conta = conta.get("basic", {}).get("name", conta.get("name", ""))
-                if filtros["nome_jogador"].lower() not in nome_conta.lower():
-                    continue
+            if filtros.get("equip_lend_trade_min") and registro["equip_lend_trade"] < filtros["equip_lend_trade_min"]:
+                return False
+            if filtros.get("equip_epic_trade_min") and registro["equip_epic_trade"] < filtros["equip_epic_trade_min"]:
+                return False
             
             # Filtros Premium
             if is_premium:
                 pets_lendarios = conta.get("spirit", {}).get("lendarios", 0)
                 if filtros.get("pets_lendarios_min") and pets_lendarios < filtros["pets_lendarios_min"]:
-                    continue
+                    return False
                 
                 # Filtros de Treino
                 training = conta.get("training", {})
                 
                 constituicao = training.get("constituicao", 0)
                 if filtros.get("treino_constituicao") and constituicao < filtros["treino_constituicao"]:
-                    continue
+                    return False
                 # Também verificar filtro antigo
                 if filtros.get("constituicao_min") and constituicao < filtros["constituicao_min"]:
-                    continue
+                    return False
                 
                 muscular = training.get("muscular", 0)
                 if filtros.get("treino_muscular") and muscular < filtros["treino_muscular"]:
-                    continue
+                    return False
                 
                 noveyin = training.get("noveyin", 0)
                 if filtros.get("treino_noveyin") and noveyin < filtros["treino_noveyin"]:
-                    continue
+                    return False
                 
                 noveyang = training.get("noveyang", 0)
                 if filtros.get("treino_noveyang") and noveyang < filtros["treino_noveyang"]:
-                    continue
+                    return False
                 
                 sapo = training.get("sapo", 0)
                 if filtros.get("treino_sapo") and sapo < filtros["treino_sapo"]:
-                    continue
+                    return False
                 
                 habs_lendarias = conta.get("skills", {}).get("lendarias", 0)
                 if filtros.get("habs_lendarias_min") and habs_lendarias < filtros["habs_lendarias_min"]:
-                    continue
+                    return False
                 
                 pets_misticos = conta.get("spirit", {}).get("grade6", 0)
                 if filtros.get("pets_misticos_min") and pets_misticos < filtros["pets_misticos_min"]:
-                    continue
+                    return False
                 
                 potencial = conta.get("potencial", 0)
                 if filtros.get("potencial_min") and potencial < filtros["potencial_min"]:
-                    continue
-                
-                # Filtros de status
-                if filtros["status_filtros"]:
-                    stats_list = conta.get("stats", [])
-                    stats_dict = {}
-                    for stat in stats_list:
-                        if isinstance(stat, dict):
-                            stat_name = stat.get("statName", "")
-                            stat_value = stat.get("statValue", "0")
-                            stats_dict[stat_name] = formatar_valor(stat_value)
-                    
-                    passa_nos_filtros = True
-                    for status_nome, valor_min in filtros["status_filtros"].items():
-                        if stats_dict.get(status_nome, 0) < valor_min:
-                            passa_nos_filtros = False
-                            break
-                    
-                    if not passa_nos_filtros:
-                        continue
+                    return False
                 
-                # Filtros de itens específicos
-                if filtros["itens_filtros"]:
-                    # Carregar lista de itens para fazer o mapeamento hash -> nome
-                    import os as os_local
-                    itens_lista = []
-                    try:
-                        itens_path = os_local.path.join(app.static_folder, 'itens_lista.json')
-                        if os_local.path.exists(itens_path):
-                            with open(itens_path, 'r', encoding='utf-8') as f_itens:
-                                itens_lista = json.load(f_itens)
-                    except:
-                        pass
-                    
-                    # Criar mapeamento hash -> nome
-                    hash_to_nome = {item["hash"]: item["nome"] for item in itens_lista}
-                    
-                    # Obter inventário completo da conta
-                    inventario = conta.get("inven_all", [])
-                    
-                    # Contar itens por nome (usando os campos corretos: name e count)
-                    contagem_itens = {}
-                    for item in inventario:
-                        if isinstance(item, dict):
-                            nome_item = item.get("name", "")
-                            quantidade = item.get("count", 1)
-                            if quantidade == 0:
-                                quantidade = 1
-                            contagem_itens[nome_item] = contagem_itens.get(nome_item, 0) + quantidade
-                    
-                    # Verificar se passa nos filtros de itens
-                    passa_nos_itens = True
-                    for item_hash, qtd_min in filtros["itens_filtros"].items():
-                        nome_item = hash_to_nome.get(item_hash, "")
-                        if nome_item:
-                            qtd_atual = contagem_itens.get(nome_item, 0)
-                            if qtd_atual < qtd_min:
-                                passa_nos_itens = False
-                                break
-                    
-                    if not passa_nos_itens:
-                        continue
+                # Filtros de itens específicos (quantidade mínima por nome do item)
+                for nome_item, qtd_min in itens_minimos.items():
+                    if registro["itens"].get(nome_item, 0) < qtd_min:
+                        return False
                 
-                # Filtro de Espíritos específicos
-                if filtros.get("espiritos"):
-                    espiritos_desejados = [e.strip() for e in filtros["espiritos"].split(",")]
-                    spirit_list = conta.get("spirit_list", [])
-                    nomes_espiritos = [s.get("name", "") for s in spirit_list if isinstance(s, dict)]
-                    
-                    # Verificar se a conta tem TODOS os espíritos selecionados
-                    tem_todos = True
-                    for espirito in espiritos_desejados:
-                        # Busca parcial (contém)
-                        encontrado = any(espirito.lower() in nome.lower() for nome in nomes_espiritos)
-                        if not encontrado:
-                            tem_todos = False
-                            break
-                    
-                    if not tem_todos:
-                        continue
+                # Filtro de Espíritos específicos: a conta precisa ter TODOS (busca parcial)
+                for espirito in espiritos_desejados:
+                    if not any(espirito in nome for nome in registro["espiritos"]):
+                        return False
+            
+            return True
+        
+        def conta_passa_nos_filtros_restantes(conta):
+            """Filtros sem coluna no índice: nome do jogador, status e habilidades"""
+            registro = registro_busca(conta)
+            
+            # Filtro por nome do jogador (nos dois nomes da conta)
+            if filtros.get("nome_jogador"):
+                nome_busca = filtros["nome_jogador"].lower()
+                if any(nome_busca not in nome for nome in registro["nomes"]):
+                    return False
+            
+            # Filtros Premium
+            if is_premium:
+                # Filtros de status
+                for status_nome, valor_min in filtros["status_filtros"].items():
+                    if registro["stats"].get(status_nome, 0) < valor_min:
+                        return False
                 
                 # Filtro de Skills/Habilidades
                 if filtros.get("skills_filtro"):
@@ -661,12 +530,10 @@ def create_app(config_name=None):
                         skills_list = conta.get("skills_list", [])
                         classe_conta = str(conta.get("class", "1"))
                         
-                        passa_skills = True
                         for skill_req in skills_requeridas:
                             # Verificar se a classe bate
                             if str(skill_req.get("classe")) != classe_conta:
-                                passa_skills = False
-                                break
+                                return False
                             
                             # Buscar a skill pelo índice (1-13)
                             idx = skill_req.get("idx", 0)
@@ -678,79 +545,215 @@ def create_app(config_name=None):
                                 # O nível da skill está no campo 'enhance'
                                 nivel_skill = skill.get("enhance", 0) if isinstance(skill, dict) else 0
                                 if nivel_skill < nivel_min:
-                                    passa_skills = False
-                                    break
+                                    return False
                             else:
-                                passa_skills = False
-                                break
-                        
-                        if not passa_skills:
-                            continue
+                                return False
                     except json.JSONDecodeError:
                         pass
             
-            contas_filtradas.append(conta)
+            return True
+        
+        def conta_passa_nos_filtros(conta):
+            """Aplica os filtros da requisição a uma conta"""
+            return conta_passa_nos_filtros_colunares(conta) and conta_passa_nos_filtros_restantes(conta)
         
         # Ordenação
         ordenar_por = request.args.get("ordenar_por", "power")
         ordenar_desc = request.args.get("ordenar_desc", "true").lower() == "true"
         
-        # Função auxiliar para obter valor de um stat pelo nome
-        def get_stat_value(conta, stat_name):
-            """Retorna o valor de um stat específico"""
-            for stat in conta.get("stats", []):
-                if isinstance(stat, dict):
-                    name = stat.get("statName", "").upper()
-                    if stat_name.upper() in name:
-                        try:
-                            val = stat.get("statValue", "0")
-                            if isinstance(val, str):
-                                val = val.replace(",", "").replace("%", "")
-                            return float(val)
-                        except:
-                            return 0
-            return 0
-        
-        if ordenar_por == "power":
-            contas_filtradas.sort(key=lambda x: x.get("powerScore", x.get("basic", {}).get("powerScore", 0)), reverse=ordenar_desc)
-        elif ordenar_por == "price":
-            contas_filtradas.sort(key=lambda x: x.get("price", 0), reverse=ordenar_desc)
-        elif ordenar_por == "level":
-            contas_filtradas.sort(key=lambda x: x.get("level", x.get("basic", {}).get("level", 0)), reverse=ordenar_desc)
-        elif ordenar_por == "critico":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "CRÍTICO"), reverse=ordenar_desc)
-        elif ordenar_por == "evasao":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "EVASÃO"), reverse=ordenar_desc)
-        elif ordenar_por == "ataque_fisico":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "ATAQUE FÍSICO"), reverse=ordenar_desc)
-        elif ordenar_por == "ataque_magico":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "ATAQUE DE FEITIÇO"), reverse=ordenar_desc)
-        elif ordenar_por == "precisao":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "PRECISÃO"), reverse=ordenar_desc)
-        elif ordenar_por == "derrubada":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "AUMENTO DA PROBABILIDADE DE SUCESSO DE DERRUBAR"), reverse=ordenar_desc)
-        elif ordenar_por == "evasao_critico":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "EVASÃO DE CRÍTICO"), reverse=ordenar_desc)
-        elif ordenar_por == "atk_habilidade":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "AUMENTO DE ATK DE HABILIDADE"), reverse=ordenar_desc)
-        elif ordenar_por == "aceleramento":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "ACELERAMENTO DE TEMPO DE MINERAÇÃO"), reverse=ordenar_desc)
-        elif ordenar_por == "aconegro":
-            contas_filtradas.sort(key=lambda x: get_stat_value(x, "AUMENTO DE GANHO DE AÇO NEGRO"), reverse=ordenar_desc)
-        elif ordenar_por == "codex":
-            contas_filtradas.sort(key=lambda x: x.get("codex", 0), reverse=ordenar_desc)
-        elif ordenar_por == "mina":
-            contas_filtradas.sort(key=lambda x: x.get("building", {}).get("mina", 0), reverse=ordenar_desc)
-        elif ordenar_por == "constituicao":
-            contas_filtradas.sort(key=lambda x: x.get("training", {}).get("constituicao", 0), reverse=ordenar_desc)
-        
-        # Paginação
+        # Chaves de ordenação das contas fora do índice (cruzadas com lances e extras);
+        # as do snapshot vêm das colunas pré-ordenadas do índice (core.busca)
+        chaves_ordenacao = {
+            "power": lambda x: x.get("powerScore", x.get("basic", {}).get("powerScore", 0)),
+            "price": lambda x: x.get("price", 0),
+            "level": lambda x: x.get("level", x.get("basic", {}).get("level", 0)),
+            "codex": lambda x: x.get("codex", 0),
+            "mina": lambda x: x.get("building", {}).get("mina", 0),
+            "constituicao": lambda x: x.get("training", {}).get("constituicao", 0)
+        }
+        for nome_ordenacao, trecho_status in ORDENACOES_STATUS.items():
+            chaves_ordenacao[nome_ordenacao] = (
+                lambda x, trecho=trecho_status: valor_status(x, trecho)
+            )
+        chave_ordenacao = chaves_ordenacao.get(ordenar_por, lambda x: 0)
+        
+        # Paginação: só as contas da página são decodificadas de novo
         pagina = request.args.get("pagina", 0, type=int)
         limite = request.args.get("limite", 10, type=int)
         offset = pagina * limite
+        ordenar = ordenar_por in chaves_ordenacao
+        
+        # Filtros numéricos, de categoria, de itens e de espíritos: uma máscara sobre o
+        # índice do snapshot (core.busca). Só as contas que passam nela são decodificadas,
+        # e só se houver filtros restantes. As contas alteradas com dados do wemixplay
+        # (e as extras) ficam em selecionadas como (chave, posição de inserção, dict).
+        import numpy as np
+        
+        indice = obter_indice(chave_indice, contas_com_detalhes) if chave_indice else IndiceContas(contas_com_detalhes)
+        total_cache = len(indice) - int(np.count_nonzero(indice.bloqueado))
+        
+        tem_filtros_restantes = bool(filtros.get("nome_jogador")) or (is_premium and bool(
+            filtros["status_filtros"] or filtros.get("skills_filtro")
+        ))
         
-        total_filtrado = len(contas_filtradas)
-        contas_paginadas = contas_filtradas[offset:offset + limite] if offset < len(contas_filtradas) else []
+        # Cruzar contas com bid pelo NOME com cache do xDraco
+        # Isso é mais confiável porque a conta deve existir no cache para receber lance.
+        # Essas contas recebem preço/nftID do lance e passam por todos os filtros em Python.
+        cruzadas = np.zeros(len(indice), dtype=bool)
+        if nomes_com_bid:
+            cruzadas = np.isin(indice.nomes, list(nomes_com_bid)) & ~indice.bloqueado
+        
+        selecionadas = []
+        nomes_encontrados = set()
+        
+        for indice_conta in np.flatnonzero(cruzadas).tolist():
+            # Conta encontrada no cache! Atualizar com dados do bid
+            # (cópia: o objeto do cache é compartilhado entre requisições)
+            nome_conta = str(indice.nomes[indice_conta])
+            bid_info = nomes_com_bid[nome_conta]
+            conta = dict(contas_com_detalhes[indice_conta])
+            conta["has_active_bid"] = True
+            conta["price"] = bid_info.get("price", conta.get("price", 0))
+            conta["auctionEndTime"] = bid_info.get("auctionEndTime", 0)
+            conta["nftID"] = bid_info.get("nftID", conta.get("nftID", ""))
+            conta["from_cache_match"] = True  # Flag para indicar que veio do cruzamento
+            nomes_encontrados.add(nome_conta)
+            print(f"[CRUZAMENTO] Conta '{nome_conta}' encontrada no cache com bid ativo!")
+            if conta_passa_nos_filtros(conta):
+                selecionadas.append((chave_ordenacao(conta), indice_conta, conta))
+        
+        # Linhas do índice filtradas e ordenadas: guardadas num cache LRU por consulta
+        # (filtros canônicos, ordenação, premium, lances ativos e versão do snapshot), de
+        # modo que outras páginas e buscas repetidas só fatiam o resultado. Sem cache,
+        # só as offset + limite primeiras linhas são selecionadas (top-k).
+        consulta = None
+        if chave_indice and BUSCA_CACHE_CONSULTAS > 0:
+            consulta = chave_consulta(
+                filtros, ordenar_por if ordenar else None, ordenar_desc, is_premium,
+                hash(frozenset(nft_ids_com_bid)), hash(frozenset(nomes_com_bid))
+            )
+        ordenadas = ler_resultado(chave_indice, indice, consulta) if consulta else None
+        total_indice = len(ordenadas) if ordenadas is not None else 0
+        
+        if ordenadas is None:
+            mascara = indice.mascara(
+                filtros, is_premium,
+                servidores_regiao=REGIAO_SERVIDORES.get(filtros.get("regiao") or "", []),
+                nft_ids_com_bid=nft_ids_com_bid,
+                itens_minimos=itens_minimos,
+                espiritos=espiritos_desejados
+            )
+            mascara &= ~cruzadas
+            
+            if tem_filtros_restantes:
+                for indice_conta in np.flatnonzero(mascara).tolist():
+                    if not conta_passa_nos_filtros_restantes(contas_com_detalhes[indice_conta]):
+                        mascara[indice_conta] = False
+            
+            total_indice = int(np.count_nonzero(mascara))
+            if consulta:
+                ordenadas = indice.ordenar(mascara, ordenar_por if ordenar else None, ordenar_desc)
+                guardar_resultado(chave_indice, indice, consulta, ordenadas)
+            else:
+                ordenadas = indice.primeiras(mascara, offset + limite, ordenar_por if ordenar else None, ordenar_desc)
+        
+        if nomes_com_bid:
+            # Contas com bid que NÃO estão no cache
+            nomes_faltantes = set(nomes_com_bid.keys()) - nomes_encontrados
+            print(f"[CRUZAMENTO] {len(nomes_encontrados)} contas com bid encontradas no cache")
+            print(f"[CRUZAMENTO] {len(nomes_faltantes)} contas com bid NÃO estão no cache")
+            
+            # Para contas com bid que NÃO estão no cache, buscar stats básicos
+            # Isso inclui contas com status "Vendas Completas" que ainda têm leilão ativo
+            if filtros.get("status_lance") == "bidding" and nomes_faltantes:
+                print(f"[VENDAS COMPLETAS] Buscando stats de {len(nomes_faltantes)} contas não cacheadas...")
+                
+                for nome_faltante in list(nomes_faltantes):
+                    bid_info = nomes_com_bid.get(nome_faltante, {})
+                    if not bid_info:
+                        continue
+                    seq = bid_info.get("seq")
+                    transport_id = bid_info.get("transportID", seq)
+                    nft_id = bid_info.get("nftID", "")
+                    if not seq:
+                        continue
+                    
+                    try:
+                        print(f"[VENDAS COMPLETAS] Buscando stats da conta '{nome_faltante}' (seq={seq})...")
+                        
+                        # Buscar detalhes da API - mesmo para contas "Vendas Completas" a API retorna dados
+                        detalhes = buscar_detalhes_conta(seq, transport_id)
+                        
+                        if detalhes and detalhes.get("basic", {}).get("name"):
+                            # Conta encontrada! Adicionar dados do bid
+                            extra = dict(detalhes)
+                            extra["nftID"] = nft_id
+                            extra["price"] = bid_info.get("price", detalhes.get("price", 0))
+                            extra["auctionEndTime"] = bid_info.get("auctionEndTime", 0)
+                            extra["has_active_bid"] = True
+                            extra["from_vendas_completas"] = True  # Flag especial
+                            print(f"[VENDAS COMPLETAS] Conta '{nome_faltante}' adicionada com stats!")
+                        else:
+                            # Fallback: criar com dados mínimos do wemixplay
+                            extra = {
+                                "seq": seq,
+                                "transportID": transport_id,
+                                "nftID": nft_id,
+                                "name": bid_info.get("name", nome_faltante),
+                                "powerScore": bid_info.get("powerScore", 0),
+                                "level": bid_info.get("level", 0),
+                                "class": str(bid_info.get("class", "1")),
+                                "worldName": bid_info.get("server", ""),
+                                "price": bid_info.get("price", 0),
+                                "auctionEndTime": bid_info.get("auctionEndTime", 0),
+                                "has_active_bid": True,
+                                "from_vendas_completas": True,
+                                "basic": {
+                                    "name": bid_info.get("name", nome_faltante),
+                                    "powerScore": bid_info.get("powerScore", 0),
+                                    "level": bid_info.get("level", 0),
+                                    "class": str(bid_info.get("class", "1")),
+                                    "worldName": bid_info.get("server", "")
+                                },
+                                "stats": [],
+                                "equip": [],
+                                "spirit_list": [],
+                                "skills_list": [],
+                                "inven": [],
+                                "codex": 0,
+                                "potencial": 0,
+                                "training": {},
+                                "building": {"mina": 0}
+                            }
+                            print(f"[VENDAS COMPLETAS] Conta '{nome_faltante}' adicionada com dados básicos")
+                        
+                        if extra.get("basic", {}).get("name", extra.get("name", "")) in NOMES_BLOQUEADOS:
+                            continue
+                        total_cache += 1
+                        if conta_passa_nos_filtros(extra):
+                            selecionadas.append((chave_ordenacao(extra), len(indice) + len(selecionadas), extra))
+                    except Exception as e:
+                        print(f"[VENDAS COMPLETAS] Erro ao buscar conta '{nome_faltante}': {e}")
+        
+        total_filtrado = total_indice + len(selecionadas)
+        
+        # As offset + limite primeiras linhas do índice na ordenação pedida, mescladas com
+        # as contas fora do índice. A ordem final é a mesma de ordenar a lista inteira
+        # (estável, empates na ordem de inserção).
+        coluna_ordenacao = indice.colunas[ordenar_por] if ordenar else None
+        primeiras = ordenadas[:offset + limite]
+        candidatas = [
+            (float(coluna_ordenacao[linha]) if ordenar else 0, linha, linha)
+            for linha in primeiras.tolist()
+        ] + selecionadas
+        candidatas.sort(key=lambda x: x[1])
+        if ordenar:
+            candidatas.sort(key=lambda x: x[0], reverse=ordenar_desc)
+        
+        contas_paginadas = [
+            contas_com_detalhes[referencia] if isinstance(referencia, int) else referencia
+            for _, _, referencia in candidatas[offset:offset + limite]
+        ] if offset < total_filtrado else []
         
         wemix_brl = get_wemix_brl_price()
         
@@ -851,8 +854,9 @@ def create_app(config_name=None):
             "total_filtrado": total_filtrado,
             "tempo": round(tempo_total, 2),
             "wemix_brl": wemix_brl,
-            "total_cache": len(contas_com_detalhes),
+            "total_cache": total_cache,
             "cache_tipo": cache_tipo,
+            "parcial": parcial,
             "is_premium": is_premium
         })
 
@@ -890,17 +894,19 @@ def create_app(config_name=None):
         """Retorna status do carregamento de cache"""
         from core.loader import is_cache_carregando, get_progresso, get_status_auto_renovacao
         
-        cache_completo = read_from_cache("contas_completas")
-        cache_teste = read_from_cache("contas_teste")
+        cabecalho_completo = ler_cabecalho_cache("contas_completas")
+        cabecalho_teste = ler_cabecalho_cache("contas_teste")
+        tem_cache_completo = bool(cabecalho_completo) and not cabecalho_completo["expirado"]
+        tem_cache_teste = bool(cabecalho_teste) and not cabecalho_teste["expirado"]
         progresso = get_progresso()
         auto_renovacao = get_status_auto_renovacao()
         
         return jsonify({
             "carregando": is_cache_carregando(),
-            "tem_cache_completo": cache_completo is not None,
-            "total_completo": len(cache_completo) if cache_completo else 0,
-            "tem_cache_teste": cache_teste is not None,
-            "total_teste": len(cache_teste) if cache_teste else 0,
+            "tem_cache_completo": tem_cache_completo,
+            "total_completo": cabecalho_completo["count"] if tem_cache_completo else 0,
+            "tem_cache_teste": tem_cache_teste,
+            "total_teste": cabecalho_teste["count"] if tem_cache_teste else 0,
             "progresso": progresso,
             "auto_renovacao": auto_renovacao
         })
@@ -1048,7 +1054,10 @@ app = create_app()
 import os as os_check
 if os_check.environ.get('RAILWAY_ENVIRONMENT') or os_check.environ.get('FLASK_ENV') == 'production':
     try:
-        from core.loader import iniciar_auto_renovacao, renovar_cache_em_background, restaurar_do_cache
+        from core.loader import (
+            iniciar_auto_renovacao, renovar_cache_em_background, restaurar_do_cache,
+            tem_checkpoint_carregamento
+        )
         import threading
         
         # PRIMEIRO: Tentar restaurar cache do disco (instantâneo)
@@ -1063,8 +1072,15 @@ if os_check.environ.get('RAILWAY_ENVIRONMENT') or os_check.environ.get('FLASK_EN
         iniciar_auto_renovacao()
         print("[APP] Sistema de auto-renovação de cache iniciado (3h)")
         
-        # TERCEIRO: Se não tinha cache, carregar agora em background
-        if not cache_restaurado:
+        # Faxina do diretório de cache (vencidos, temporários e orçamento de disco)
+        iniciar_faxina_cache()
+        
+        # TERCEIRO: Se não tinha cache (ou um carregamento foi interrompido), carregar agora em background
+        retomar_carregamento = tem_checkpoint_carregamento()
+        if retomar_carregamento:
+            print("[APP] Carregamento completo interrompido encontrado, será retomado")
+        
+        if not cache_restaurado or retomar_carregamento:
             def prewarm_cache():
                 import time
                 time.sleep(3)  # Aguardar app estar pronto
@@ -140,3 +140,38 @@ def api_activate_premium(user_id):
         'message': f'Premium ativado para {user.username} por {days} dias',
         'premium_expires_at': user.premium_expires_at.isoformat() if user.premium_expires_at else None
     })
+
+
+# Métricas do cache (JSON ou ?formato=prometheus)
+@admin_bp.route('/api/cache-metricas')
+@admin_required
+def api_cache_metricas():
+    """Hits/misses/latência do cache por prefixo de chave"""
+    from flask import Response
+    from core.cache import get_status_cache_memoria
+    from core.cache_metricas import get_metricas, metricas_prometheus
+    
+    if request.args.get('formato') == 'prometheus':
+        return Response(metricas_prometheus(), mimetype='text/plain; version=0.0.4')
+    
+    metricas = get_metricas()
+    metricas['memoria'] = get_status_cache_memoria()
+    return jsonify(metricas)
+
+
+@admin_bp.route('/api/cache-faxina')
+@admin_required
+def api_cache_faxina():
+    """Contadores da faxina do cache (bytes liberados, arquivos removidos)"""
+    from core.cache import get_status_faxina_cache
+    
+    return jsonify(get_status_faxina_cache())
+
+
+@admin_bp.route('/api/limitadores')
+@admin_required
+def api_limitadores():
+    """Concorrência adaptativa e token bucket das APIs externas, por host"""
+    from core.api import get_status_limitadores
+    
+    return jsonify(get_status_limitadores())
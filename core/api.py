@@ -2,31 +2,301 @@
 Funções de API para buscar dados do xDraco
 """
 import os
-import json
+import random
+import threading
+import time
 import requests
-from datetime import datetime, timedelta
-from core.cache import CACHE_DIR, save_to_cache, read_from_cache
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from core.cache import (
+    ler_detalhes_conta_com_estado, salvar_detalhes_conta, executar_unico,
+    agendar_revalidacao, obter_com_revalidacao, DETALHES_JANELA_VELHO_MINUTOS
+)
 from core.constants import NOMES_BLOQUEADOS, CLASSE_PARA_PASTA
+from core.ttl_adaptativo import CHAVES_POR_GRUPO, grupos_vencidos, registrar_busca, minutos_ate_vencer
 
-# Sessão HTTP compartilhada
+# Teto de requisições simultâneas por host (a concorrência adaptativa nunca passa disso)
+API_MAX_REQUISICOES = int(os.environ.get('API_MAX_REQUISICOES', 16))
+# Concorrência adaptativa (AIMD) por host: valor inicial e mínimo
+API_CONCORRENCIA_INICIAL = int(os.environ.get('API_CONCORRENCIA_INICIAL', 4))
+API_CONCORRENCIA_MIN = int(os.environ.get('API_CONCORRENCIA_MIN', 1))
+# Respostas acima desta latência (segundos) não aumentam a concorrência
+API_LATENCIA_ALVO = float(os.environ.get('API_LATENCIA_ALVO', 3.0))
+# Token bucket por host: requisições por segundo e rajada máxima
+API_TAXA_POR_SEGUNDO = float(os.environ.get('API_TAXA_POR_SEGUNDO', 10))
+API_RAJADA = int(os.environ.get('API_RAJADA', 20))
+# Threads compartilhadas que buscam os endpoints de uma conta em paralelo
+API_DETALHES_WORKERS = int(os.environ.get('API_DETALHES_WORKERS', 16))
+# Novas tentativas de GET em 429, 5xx e erros de rede: quantidade e backoff exponencial
+# com jitter (espera sorteada entre 0 e min(API_RETRY_MAX_SEGUNDOS, base * 2^tentativa))
+API_RETRY_TENTATIVAS = int(os.environ.get('API_RETRY_TENTATIVAS', 3))
+API_RETRY_BASE_SEGUNDOS = float(os.environ.get('API_RETRY_BASE_SEGUNDOS', 0.5))
+API_RETRY_MAX_SEGUNDOS = float(os.environ.get('API_RETRY_MAX_SEGUNDOS', 8))
+# Circuit breaker por host: falhas seguidas (5xx/rede) que abrem o circuito e por quanto tempo
+API_CIRCUITO_FALHAS = int(os.environ.get('API_CIRCUITO_FALHAS', 5))
+API_CIRCUITO_SEGUNDOS = float(os.environ.get('API_CIRCUITO_SEGUNDOS', 30))
+# TTL (minutos) de detalhes gravados com algum grupo sem dados (busca de novo logo)
+DETALHES_INCOMPLETO_MINUTOS = float(os.environ.get('DETALHES_INCOMPLETO_MINUTOS', 10))
+
+# Sessão HTTP compartilhada (pool de conexões do tamanho do limite de requisições)
 session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=API_MAX_REQUISICOES))
 
+# Memo curto de respostas JSON por URL (a mesma URL numa mesma carga não é buscada de novo)
+API_MEMO_SEGUNDOS = float(os.environ.get('API_MEMO_SEGUNDOS', 60))
+API_MEMO_MAX_ITENS = int(os.environ.get('API_MEMO_MAX_ITENS', 512))
 
-def get_wemix_brl_price():
-    """Obtém preço do WEMIX em BRL da CoinMarketCap"""
-    cache_key = "wemix_brl_price"
-    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.json")
+_limitadores = {}  # host -> _LimitadorHost
+_limitadores_lock = threading.Lock()
+_memo_respostas = {}  # url -> (expira_em monotônico, json)
+_memo_lock = threading.Lock()
+_detalhes_executor = None
+_detalhes_executor_lock = threading.Lock()
+
+
+class CircuitoAberto(requests.exceptions.ConnectionError):
+    """Requisição recusada sem ir à rede: o circuito do host está aberto"""
+
+
+class _LimitadorHost:
+    """
+    Ritmo, concorrência e circuit breaker das requisições a um host.
+    
+    Token bucket: API_TAXA_POR_SEGUNDO requisições por segundo, com rajada de API_RAJADA.
+    Concorrência AIMD: cada resposta rápida e sem erro soma 1/limite ao limite (cerca de +1
+    a cada "janela" de respostas), até API_MAX_REQUISICOES; 429, 5xx, timeouts e erros
+    de conexão cortam o limite pela metade (no máximo uma vez por janela de latência).
+    Circuito: API_CIRCUITO_FALHAS falhas seguidas de 5xx/rede abrem o circuito por
+    API_CIRCUITO_SEGUNDOS; depois disso uma única requisição de teste passa e, se
+    falhar, o circuito abre de novo.
+    """
+    
+    def __init__(self, host):
+        self.host = host
+        self.limite = float(min(API_MAX_REQUISICOES, max(API_CONCORRENCIA_MIN, API_CONCORRENCIA_INICIAL)))
+        self.em_andamento = 0
+        self.tokens = float(API_RAJADA)
+        self.reposto_em = time.monotonic()
+        self.pausado_ate = 0.0
+        self.reduzido_em = 0.0
+        self.erros = 0
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self.testando = False
+        self._cond = threading.Condition()
+    
+    def verificar_circuito(self):
+        """Levanta CircuitoAberto se o host estiver fora; no meio-aberto, libera um teste"""
+        with self._cond:
+            if self.falhas_seguidas < API_CIRCUITO_FALHAS:
+                return
+            if self.testando or time.monotonic() < self.aberto_ate:
+                raise CircuitoAberto(f"Circuito aberto para {self.host}")
+            self.testando = True
+    
+    def entrar(self):
+        """Espera uma vaga de concorrência e um token"""
+        with self._cond:
+            while self.em_andamento >= int(self.limite):
+                self._cond.wait()
+            self.em_andamento += 1
+        
+        while True:
+            with self._cond:
+                agora = time.monotonic()
+                self.tokens = min(API_RAJADA, self.tokens + (agora - self.reposto_em) * API_TAXA_POR_SEGUNDO)
+                self.reposto_em = agora
+                espera = self.pausado_ate - agora
+                if espera <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    espera = (1 - self.tokens) / API_TAXA_POR_SEGUNDO
+            time.sleep(espera)
+    
+    def sair(self, latencia, falhou, retry_after=None, indisponivel=False):
+        """
+        Libera a vaga e ajusta o limite conforme o resultado. indisponivel (5xx ou
+        erro de rede) conta para o circuito; 429 só reduz a concorrência.
+        """
+        with self._cond:
+            self.em_andamento -= 1
+            agora = time.monotonic()
+            
+            if indisponivel:
+                self.falhas_seguidas += 1
+                if self.testando or self.falhas_seguidas == API_CIRCUITO_FALHAS:
+                    self.aberto_ate = agora + API_CIRCUITO_SEGUNDOS
+                    print(f"[CIRCUITO] {self.host}: aberto por {API_CIRCUITO_SEGUNDOS:.0f}s "
+                          f"após {self.falhas_seguidas} falhas seguidas")
+            elif not falhou or self.testando:
+                if self.falhas_seguidas >= API_CIRCUITO_FALHAS:
+                    print(f"[CIRCUITO] {self.host}: fechado")
+                self.falhas_seguidas = 0
+            self.testando = False
+            
+            if falhou:
+                self.erros += 1
+                if retry_after:
+                    self.pausado_ate = max(self.pausado_ate, agora + retry_after)
+                if agora - self.reduzido_em >= max(1.0, latencia):
+                    anterior = self.limite
+                    self.limite = max(float(API_CONCORRENCIA_MIN), self.limite / 2)
+                    self.reduzido_em = agora
+                    print(f"[LIMITE] {self.host}: concorrência {int(anterior)} -> {int(self.limite)}")
+            elif latencia <= API_LATENCIA_ALVO:
+                self.limite = min(float(API_MAX_REQUISICOES), self.limite + 1 / self.limite)
+            
+            self._cond.notify_all()
+
+
+def _limitador(url):
+    host = urlsplit(url).hostname or ""
+    with _limitadores_lock:
+        limitador = _limitadores.get(host)
+        if limitador is None:
+            limitador = _limitadores[host] = _LimitadorHost(host)
+        return limitador
+
+
+def _segundos_retry_after(valor):
+    """Retry-After em segundos (None se ausente ou em formato de data)"""
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        return None
+
+
+def _requisitar(metodo, url, **kwargs):
+    """
+    Requisição pela sessão compartilhada, passando pelo limitador do host.
+    429 (respeitando Retry-After), 5xx e exceções contam como falha.
+    Com o circuito do host aberto, levanta CircuitoAberto na hora.
+    """
+    limitador = _limitador(url)
+    limitador.verificar_circuito()
+    limitador.entrar()
+    inicio = time.monotonic()
+    falhou, indisponivel, retry_after = True, True, None
     
-    if os.path.exists(cache_path):
+    try:
+        res = session.request(metodo, url, **kwargs)
+        indisponivel = res.status_code >= 500
+        falhou = res.status_code == 429 or indisponivel
+        if res.status_code == 429:
+            retry_after = _segundos_retry_after(res.headers.get("Retry-After"))
+        return res
+    finally:
+        limitador.sair(time.monotonic() - inicio, falhou, retry_after, indisponivel)
+
+
+def _espera_retry(tentativa):
+    """Backoff exponencial com jitter completo para a tentativa (0 = primeira repetição)"""
+    return random.uniform(0, min(API_RETRY_MAX_SEGUNDOS, API_RETRY_BASE_SEGUNDOS * 2 ** tentativa))
+
+
+def _get(url, **kwargs):
+    """
+    GET (idempotente) com até API_RETRY_TENTATIVAS novas tentativas em 429, 5xx,
+    timeouts e erros de conexão. O Retry-After de um 429 já pausa o limitador do host.
+    Circuito aberto não é repetido; a última resposta ou exceção é devolvida.
+    """
+    for tentativa in range(API_RETRY_TENTATIVAS + 1):
+        ultima = tentativa == API_RETRY_TENTATIVAS
         try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                cache_entry = json.load(f)
-            cache_time = datetime.fromisoformat(cache_entry["timestamp"])
-            if datetime.now() - cache_time < timedelta(minutes=5):
-                return cache_entry["data"]
-        except Exception as e:
-            print(f"[ERRO] Falha ao ler cache WEMIX: {e}")
+            res = _requisitar("GET", url, **kwargs)
+        except CircuitoAberto:
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if ultima:
+                raise
+        else:
+            if ultima or (res.status_code != 429 and res.status_code < 500):
+                return res
+            # Devolve a conexão ao pool antes de esperar pela próxima tentativa
+            res.close()
+        time.sleep(_espera_retry(tentativa))
+
+
+def get_status_limitadores():
+    """Estado atual dos limitadores por host"""
+    with _limitadores_lock:
+        limitadores = list(_limitadores.values())
+    return {
+        l.host: {
+            "concorrencia": int(l.limite),
+            "em_andamento": l.em_andamento,
+            "tokens": round(l.tokens, 2),
+            "erros": l.erros,
+            "falhas_seguidas": l.falhas_seguidas,
+            "circuito": (
+                "fechado" if l.falhas_seguidas < API_CIRCUITO_FALHAS
+                else "aberto" if time.monotonic() < l.aberto_ate else "meio-aberto"
+            )
+        }
+        for l in limitadores
+    }
+
+
+def _get_json(url, **kwargs):
+    """
+    GET de uma URL JSON com memo de API_MEMO_SEGUNDOS. Chamadas repetidas dentro da
+    janela reaproveitam a resposta e chamadas simultâneas esperam a mesma requisição.
+    Retorna None se a resposta não for ok; erros de rede são propagados.
+    """
+    with _memo_lock:
+        memo = _memo_respostas.get(url)
+    if memo and memo[0] > time.monotonic():
+        return memo[1]
+    
+    return executar_unico(f"url_{url}", _buscar_json, url, **kwargs)
+
+
+def _buscar_json(url, **kwargs):
+    """Faz o GET de _get_json e guarda a resposta no memo"""
+    res = _get(url, **kwargs)
+    if not res.ok:
+        return None
+    dados = res.json()
     
+    if API_MEMO_SEGUNDOS > 0:
+        agora = time.monotonic()
+        with _memo_lock:
+            if len(_memo_respostas) >= API_MEMO_MAX_ITENS:
+                for chave in [c for c, (expira, _) in _memo_respostas.items() if expira <= agora]:
+                    del _memo_respostas[chave]
+                if len(_memo_respostas) >= API_MEMO_MAX_ITENS:
+                    _memo_respostas.pop(next(iter(_memo_respostas)))
+            _memo_respostas[url] = (agora + API_MEMO_SEGUNDOS, dados)
+    
+    return dados
+
+
+def _get_detalhes_executor():
+    """Pool compartilhado dos endpoints de detalhes (criado no primeiro uso)"""
+    global _detalhes_executor
+    
+    with _detalhes_executor_lock:
+        if _detalhes_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _detalhes_executor = ThreadPoolExecutor(
+                max_workers=API_DETALHES_WORKERS, thread_name_prefix="detalhes"
+            )
+        return _detalhes_executor
+
+
+def get_wemix_brl_price():
+    """
+    Obtém preço do WEMIX em BRL da CoinMarketCap.
+    Cache de 5 minutos; até 1 hora o preço anterior é servido enquanto atualiza.
+    """
+    return obter_com_revalidacao(
+        "wemix_brl_preco", _buscar_preco_wemix, expiry_minutes=5, hard_expiry_minutes=60
+    )
+
+
+def _buscar_preco_wemix():
+    """Consulta o preço na CoinMarketCap (None se falhar)"""
     url = 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest'
     parameters = {'symbol': 'WEMIX', 'convert': 'BRL'}
     headers = {
@@ -39,16 +309,7 @@ def get_wemix_brl_price():
         response.raise_for_status()
         data = response.json()
         
-        brl_price = data['data']['WEMIX']['quote']['BRL']['price']
-        
-        cache_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "data": brl_price
-        }
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(cache_entry, f, ensure_ascii=False, indent=2)
-        
-        return brl_price
+        return data['data']['WEMIX']['quote']['BRL']['price']
         
     except Exception as e:
         print(f"[ERRO] Erro ao buscar preço WEMIX: {e}")
@@ -57,20 +318,24 @@ def get_wemix_brl_price():
 
 
 def buscar_lista_contas(page=1):
-    """Busca lista de contas da API do xDraco"""
-    cache_key = f"lista_contas_page_{page}"
-    cached = read_from_cache(cache_key)
-    if cached:
-        return cached
-    
+    """
+    Busca lista de contas da API do xDraco.
+    Cache de 30 minutos; até 2 horas a página anterior é servida enquanto atualiza.
+    """
+    return obter_com_revalidacao(
+        f"lista_contas_page_{page}", lambda: _buscar_pagina_lista(page),
+        expiry_minutes=30, hard_expiry_minutes=120
+    )
+
+
+def _buscar_pagina_lista(page):
+    """Busca uma página da listagem na API (None se falhar)"""
     url = f"https://webapi.mir4global.com/nft/lists?listType=sale&class=0&levMin=0&levMax=0&powerMin=0&powerMax=0&priceMin=0&priceMax=0&sort=latest&page={page}&languageCode=pt"
     
     try:
-        response = session.get(url, timeout=15)
+        response = _get(url, timeout=15)
         if response.status_code == 200:
-            data = response.json()
-            save_to_cache(cache_key, data, expiry_minutes=30)
-            return data
+            return response.json()
         else:
             print(f"Erro HTTP {response.status_code} na página {page}")
     except Exception as e:
@@ -79,13 +344,17 @@ def buscar_lista_contas(page=1):
     return None
 
 
-def buscar_todas_contas(max_paginas=100):
-    """Busca contas disponíveis (limitado por max_paginas)"""
-    import time
+def buscar_todas_contas(max_paginas=100, pagina_inicial=1, contas_iniciais=None, ao_buscar_pagina=None):
+    """
+    Busca contas disponíveis (limitado por max_paginas)
     
+    Args:
+        pagina_inicial / contas_iniciais: retomam uma busca interrompida
+        ao_buscar_pagina: chamada com (pagina, contas acumuladas) após cada página
+    """
     print(f"Iniciando busca de contas (max {max_paginas} páginas)...")
-    todas_contas = []
-    pagina = 1
+    todas_contas = list(contas_iniciais or [])
+    pagina = pagina_inicial
     
     while pagina <= max_paginas:
         print(f"Buscando página {pagina}...")
@@ -106,13 +375,15 @@ def buscar_todas_contas(max_paginas=100):
         contas_filtradas = [c for c in contas if c.get("characterName", "") not in NOMES_BLOQUEADOS]
         todas_contas.extend(contas_filtradas)
         
+        if ao_buscar_pagina:
+            ao_buscar_pagina(pagina, todas_contas)
+        
         total_count = data_dict.get("totalCount", 0)
         if len(todas_contas) >= total_count:
             print(f"Todas as {total_count} contas foram coletadas")
             break
         
         pagina += 1
-        time.sleep(0.5)
     
     print(f"Total de contas coletadas: {len(todas_contas)}")
     return todas_contas
@@ -121,6 +392,19 @@ def buscar_todas_contas(max_paginas=100):
 def buscar_equipamentos_equipados(seq):
     """Busca equipamentos equipados de uma conta"""
     url = f"https://webapi.mir4global.com/nft/character/summary?seq={seq}&languageCode=pt"
+    
+    try:
+        resposta = _get_json(url, timeout=10)
+        if resposta is not None:
+            return _extrair_equipamentos(resposta.get("data", {}))
+    except Exception as e:
+        print(f"Erro ao buscar equipamentos: {e}")
+    
+    return []
+
+
+def _extrair_equipamentos(data):
+    """Lista os equipamentos (raro ou melhor) do equipItem de uma resposta do summary"""
     equipamentos = []
     
     TIPO_POR_SLOT = {
@@ -131,60 +415,60 @@ def buscar_equipamentos_equipados(seq):
         "4_1": "Colar", "4_2": "Pulseira", "4_3": "Anel", "4_4": "Brincos"
     }
     
-    try:
-        res = session.get(url, timeout=10)
-        if res.ok:
-            data = res.json().get("data", {}).get("equipItem", {})
-            if isinstance(data, dict):
-                for slot_key, item in data.items():
-                    if not isinstance(item, dict):
-                        continue
-                        
-                    item_type = str(item.get("itemType", ""))
-                    if item_type not in TIPO_POR_SLOT:
-                        continue
-                    
-                    grade = int(item.get("grade", 0))
-                    if grade not in [3, 4, 5]:
-                        continue
-                    
-                    item_idx = str(item.get("itemIdx", ""))
-                    is_trade = len(item_idx) >= 4 and item_idx[3] == "1"
-                    
-                    cor_fundo = ""
-                    if grade == 5:
-                        cor_fundo = "fundo-lendario"
-                    elif grade == 4:
-                        cor_fundo = "fundo-epico"
-                    elif grade == 3:
-                        cor_fundo = "fundo-raro"
-                    
-                    equipamentos.append({
-                        "slot": TIPO_POR_SLOT[item_type],
-                        "tipo": item_type,
-                        "nome": item.get("itemName", "Desconhecido"),
-                        "img": item.get("itemPath", ""),
-                        "aprimoramento": int(item.get("enhance", 0)),
-                        "tier": item.get("tier", "I"),
-                        "grade": grade,
-                        "trade": is_trade,
-                        "cor_fundo": cor_fundo
-                    })
-    except Exception as e:
-        print(f"Erro ao buscar equipamentos: {e}")
+    itens = data.get("equipItem", {}) if isinstance(data, dict) else {}
+    if isinstance(itens, dict):
+        for slot_key, item in itens.items():
+            if not isinstance(item, dict):
+                continue
+                
+            item_type = str(item.get("itemType", ""))
+            if item_type not in TIPO_POR_SLOT:
+                continue
+            
+            grade = int(item.get("grade", 0))
+            if grade not in [3, 4, 5]:
+                continue
+            
+            item_idx = str(item.get("itemIdx", ""))
+            is_trade = len(item_idx) >= 4 and item_idx[3] == "1"
+            
+            cor_fundo = ""
+            if grade == 5:
+                cor_fundo = "fundo-lendario"
+            elif grade == 4:
+                cor_fundo = "fundo-epico"
+            elif grade == 3:
+                cor_fundo = "fundo-raro"
+            
+            equipamentos.append({
+                "slot": TIPO_POR_SLOT[item_type],
+                "tipo": item_type,
+                "nome": item.get("itemName", "Desconhecido"),
+                "img": item.get("itemPath", ""),
+                "aprimoramento": int(item.get("enhance", 0)),
+                "tier": item.get("tier", "I"),
+                "grade": grade,
+                "trade": is_trade,
+                "cor_fundo": cor_fundo
+            })
     
     return equipamentos
 
 
 def buscar_spirit_detalhado(transport_id):
     """Busca espíritos detalhados"""
+    return _buscar_spirit(transport_id) or ([], 0, 0, 0)
+
+
+def _buscar_spirit(transport_id):
+    """buscar_spirit_detalhado que retorna None se a busca falhar"""
     # Usando languageCode=en para que os nomes batam com o filtro HTML (em inglês)
     url = f"https://webapi.mir4global.com/nft/character/spirit?transportID={transport_id}&languageCode=en"
     
     try:
-        res = session.get(url, timeout=10)
-        if res.ok:
-            data = res.json().get("data", {})
+        resposta = _get_json(url, timeout=10)
+        if resposta is not None:
+            data = resposta.get("data", {})
             
             pets = []
             cont_epico = cont_lendario = cont_grade6 = 0
@@ -257,17 +541,22 @@ def buscar_spirit_detalhado(transport_id):
     except Exception as e:
         print(f"Erro ao buscar espíritos: {e}")
     
-    return [], 0, 0, 0
+    return None
 
 
 def buscar_habilidades_detalhadas(transport_id, class_id):
     """Busca habilidades com imagens corretas"""
+    return _buscar_skills(transport_id, class_id) or ([], 0, 0)
+
+
+def _buscar_skills(transport_id, class_id):
+    """buscar_habilidades_detalhadas que retorna None se a busca falhar"""
     url = f"https://webapi.mir4global.com/nft/character/skills?transportID={transport_id}&class={class_id}&languageCode=pt"
     
     try:
-        res = session.get(url, timeout=10)
-        if res.ok:
-            data = res.json().get("data", [])
+        resposta = _get_json(url, timeout=10)
+        if resposta is not None:
+            data = resposta.get("data", [])
             
             habilidades = []
             cont_epico = cont_lendario = 0
@@ -300,22 +589,40 @@ def buscar_habilidades_detalhadas(transport_id, class_id):
     except Exception as e:
         print(f"Erro ao buscar habilidades: {e}")
     
-    return [], 0, 0
+    return None
 
 
-def buscar_detalhes_conta(seq, transport_id):
-    """Busca todos os detalhes de uma conta"""
-    from core.filters import (
-        filtrar_itens_comercializaveis, filtrar_itens_especiais,
-        processar_equipamento_para_frontend, roman_to_int
-    )
-    from core.constants import STATUS_DISPONIVEIS
+def buscar_detalhes_conta(seq, transport_id, permitir_velho=True):
+    """
+    Busca todos os detalhes de uma conta.
     
-    cache_key = f"detalhes_{seq}_equip"
-    cached = read_from_cache(cache_key)
-    if cached:
+    Detalhes velhos (além do TTL, dentro do TTL máximo) são retornados na hora e
+    atualizados em segundo plano; com permitir_velho=False a busca é feita agora.
+    """
+    cached, estado = ler_detalhes_conta_com_estado(seq)
+    if cached and (estado == "fresco" or permitir_velho):
+        if estado == "velho":
+            agendar_revalidacao(f"detalhes_{seq}", _buscar_detalhes_conta_api, seq, transport_id)
         return cached
     
+    return executar_unico(f"detalhes_{seq}", _buscar_detalhes_conta_api, seq, transport_id)
+
+
+def _buscar_detalhes_conta_api(seq, transport_id):
+    """
+    Busca os detalhes de uma conta nos endpoints do xDraco e grava no armazém.
+    
+    Os endpoints independentes rodam em paralelo no pool compartilhado; habilidades
+    e status de lance dependem da classe e do nftID e saem logo após o resumo.
+    Cada _buscar_<grupo> retorna só as chaves que preenche, mescladas em detalhes.
+    
+    Com uma versão anterior no armazém, só os grupos vencidos pelo TTL adaptativo
+    (core.ttl_adaptativo) são buscados; os demais são reaproveitados.
+    
+    Grupos que nunca vieram com sucesso ficam listados em detalhes["incompleto"] e,
+    se algum grupo falhou, o registro é gravado com TTL de DETALHES_INCOMPLETO_MINUTOS.
+    Se nenhum grupo respondeu, nada é gravado.
+    """
     print(f"[API] Buscando detalhes para conta {seq}")
     
     detalhes = {
@@ -344,238 +651,83 @@ def buscar_detalhes_conta(seq, transport_id):
         "bid_count": 0
     }
     
+    anterior, _ = ler_detalhes_conta_com_estado(seq)
+    vencidos = grupos_vencidos(anterior)
+    if anterior and "ttl_grupos" in anterior:
+        detalhes.update(anterior)
+        detalhes["ttl_grupos"] = dict(anterior["ttl_grupos"])
+    else:
+        anterior = None
+    
+    if len(vencidos) < len(CHAVES_POR_GRUPO):
+        print(f"[API] Conta {seq}: atualizando {', '.join(sorted(vencidos))}")
+    
+    por_transport_id = {
+        "stats": _buscar_stats, "inventario": _buscar_inventario, "codex": _buscar_codex,
+        "potencial": _buscar_potencial, "espiritos": _buscar_espiritos,
+        "treinamento": _buscar_treinamento, "mina": _buscar_mina
+    }
+    executor = _get_detalhes_executor()
+    
     try:
-        # 1. Informações básicas
-        url_basic = f"https://webapi.mir4global.com/nft/character/summary?seq={seq}&languageCode=pt"
-        res = session.get(url_basic, timeout=15)
+        resumo = executor.submit(_buscar_resumo, seq) if "resumo" in vencidos else None
+        grupos = {
+            grupo: executor.submit(buscar, transport_id)
+            for grupo, buscar in por_transport_id.items() if grupo in vencidos
+        }
         
-        if res.ok:
-            data = res.json().get("data", {})
-            if data:
-                character = data.get("character", {})
-                if character:
-                    detalhes["basic"] = {
-                        "name": character.get("name", "Desconhecido"),
-                        "worldName": character.get("worldName", "N/A"),
-                        "class": character.get("class", "1"),
-                        "level": int(character.get("level", 0)),
-                        "powerScore": int(character.get("powerScore", 0))
-                    }
-                    detalhes["classe"] = character.get("class", "1")
-                
-                try:
-                    price_str = str(data.get("price", "0")).replace(',', '').strip()
-                    detalhes["price"] = float(price_str) if price_str else 0
-                except:
-                    detalhes["price"] = 0
-                
-                # tradeType: 1 = venda direta, 2 = leilão/bidding
-                detalhes["tradeType"] = int(data.get("tradeType", 1))
-                
-                # sealedTS: timestamp de quando foi selado (para calcular tempo de leilão)
-                detalhes["sealedTS"] = data.get("sealedTS", 0)
-                
-                # nftID: ID do NFT no wemixplay (para verificar status de lance)
-                detalhes["nftID"] = data.get("nftID", "")
+        if resumo:
+            parcial_resumo = resumo.result()
+            if parcial_resumo and anterior:
+                # Sem lance ativo agora: não herdar o tradeType/bid_count da versão anterior
+                detalhes["bid_count"] = 0
+            detalhes.update(parcial_resumo)
         
-        classe = detalhes["classe"]
+        # Sem resumo bem-sucedido (agora ou antes) a classe é só o padrão: habilidades ficam para depois
+        classe_conhecida = (resumo and parcial_resumo) or "resumo" in detalhes.get("ttl_grupos", {})
+        if detalhes["classe"] and classe_conhecida and "habilidades" in vencidos:
+            grupos["habilidades"] = executor.submit(_buscar_habilidades, transport_id, detalhes["classe"])
         
-        # 2. Status
-        url_stats = f"https://webapi.mir4global.com/nft/character/stats?transportID={transport_id}&languageCode=pt"
-        res = session.get(url_stats, timeout=10)
-        if res.ok:
-            data = res.json().get("data", {})
-            if isinstance(data, dict):
-                detalhes["stats"] = data.get("lists", [])
-                
-                for stat in detalhes["stats"]:
-                    if isinstance(stat, dict):
-                        nome_status = stat.get("statName")
-                        if nome_status and nome_status not in STATUS_DISPONIVEIS:
-                            STATUS_DISPONIVEIS.append(nome_status)
-
-        # 3. Equipamentos
-        equipamentos_raw = buscar_equipamentos_equipados(seq)
-        for eq in equipamentos_raw:
-            processed = processar_equipamento_para_frontend(eq)
-            if processed:
-                detalhes["equip"].append(processed)
-
-        # 4. Inventário
-        url_inven = f"https://webapi.mir4global.com/nft/character/inven?transportID={transport_id}&languageCode=pt"
-        try:
-            res = session.get(url_inven, timeout=15)
-            if res.ok:
-                data = res.json().get("data", [])
-                if isinstance(data, list):
-                    # Itens comercializáveis (para exibição)
-                    itens_filtrados = filtrar_itens_comercializaveis(data)
-                    
-                    # IDs dos itens comercializáveis para marcar
-                    ids_comercializaveis = set()
-                    for item in itens_filtrados:
-                        ids_comercializaveis.add(item["itemID"])
-                    
-                    itens_comerciais_frontend = []
-                    for item in itens_filtrados:
-                        itens_comerciais_frontend.append({
-                            "name": item["nome"],
-                            "grade": item["grade"],
-                            "tier": roman_to_int(item["tier"]),
-                            "enhance": item["enhance"],
-                            "count": item["quantidade"],
-                            "img": item["imagem"],
-                            "trade": True
-                        })
-                    
-                    itens_comerciais_frontend.sort(key=lambda x: (-x["grade"], -x["tier"], -x["enhance"]))
-                    
-                    # TODOS os itens para busca (com flag trade)
-                    todos_itens = []
-                    for item in data:
-                        if not isinstance(item, dict):
-                            continue
-                        item_id = str(item.get("itemID", ""))
-                        item_name = item.get("itemName", "")
-                        if not item_name:
-                            continue
-                        
-                        grade = int(item.get("grade", "0")) if str(item.get("grade", "0")).isdigit() else 0
-                        tier_str = item.get("tier", "I")
-                        enhance = int(item.get("enhance", 0)) if str(item.get("enhance", 0)).isdigit() else 0
-                        quantidade = item.get("stack", 0) or 1
-                        imagem = item.get("itemPath", "")
-                        
-                        todos_itens.append({
-                            "name": item_name,
-                            "grade": grade,
-                            "tier": roman_to_int(tier_str),
-                            "enhance": enhance,
-                            "count": quantidade,
-                            "img": imagem,
-                            "trade": item_id in ids_comercializaveis
-                        })
-                    
-                    todos_itens.sort(key=lambda x: (-x["grade"], -x["tier"], -x["enhance"]))
-                    
-                    detalhes["inven_all"] = todos_itens
-                    detalhes["inven"] = itens_comerciais_frontend[:12]
-                    detalhes["inven_total"] = len(itens_comerciais_frontend)
-                    
-                    bilhetes, cristais, fragmentos = filtrar_itens_especiais(data)
-                    detalhes["tickets"] = bilhetes
-                    detalhes["crystals"] = cristais
-                    detalhes["fragments"] = fragmentos
-                    
-        except Exception as e:
-            print(f"Erro ao buscar inventário: {e}")
+        # Status de lance em tempo real do wemixplay (mesclado por último: pode mudar tradeType)
+        lance = None
+        if resumo and detalhes.get("nftID"):
+            lance = executor.submit(_buscar_lance, seq, detalhes["nftID"])
         
-        # 5. Codex
-        url_codex = f"https://webapi.mir4global.com/nft/character/codex?transportID={transport_id}&languageCode=pt"
-        try:
-            res = session.get(url_codex, timeout=10)
-            if res.ok:
-                data = res.json().get("data", {})
-                if isinstance(data, dict):
-                    total = 0
-                    for key, item in data.items():
-                        if isinstance(item, dict):
-                            try:
-                                total += int(item.get("completed", "0"))
-                            except:
-                                pass
-                    detalhes["codex"] = total
-        except Exception as e:
-            print(f"Erro ao buscar codex: {e}")
+        atualizados = {"resumo": parcial_resumo} if resumo else {}
+        for grupo, future in grupos.items():
+            atualizados[grupo] = future.result()
+            detalhes.update(atualizados[grupo])
+        if lance:
+            detalhes.update(lance.result())
         
-        # 6. Potencial
-        url_pot = f"https://webapi.mir4global.com/nft/character/potential?transportID={transport_id}&languageCode=pt"
-        try:
-            res = session.get(url_pot, timeout=10)
-            if res.ok:
-                data = res.json().get("data", {})
-                if isinstance(data, dict):
-                    detalhes["potencial"] = int(data.get("total", 0))
-        except Exception as e:
-            print(f"Erro ao buscar potencial: {e}")
-        
-        # 7. Espíritos
-        pets, epicos, lendarios, grade6 = buscar_spirit_detalhado(transport_id)
-        detalhes["spirit_list"] = pets
-        detalhes["spirit"] = {"epicos": epicos, "lendarios": lendarios, "grade6": grade6}
-        
-        # 8. Treinamento
-        url_train = f"https://webapi.mir4global.com/nft/character/training?transportID={transport_id}&languageCode=pt"
-        try:
-            res = session.get(url_train, timeout=10)
-            if res.ok:
-                data = res.json().get("data", {})
-                if isinstance(data, dict):
-                    detalhes["training"]["constituicao"] = int(data.get("consitutionLevel", 0))
-                    detalhes["training"]["limbo"] = int(data.get("collectLevel", 0))
-                    
-                    # Mapear forças por forceIdx
-                    for i in range(6):
-                        force = data.get(str(i), {})
-                        if isinstance(force, dict):
-                            force_idx = force.get("forceIdx", "")
-                            force_level = int(force.get("forceLevel", 0))
-                            force_name = force.get("forceName", f"Força {i+1}")
-                            
-                            detalhes["training"]["inner_force"].append({
-                                "name": force_name,
-                                "level": force_level,
-                                "idx": force_idx
-                            })
-                            
-                            # Mapear para campos específicos
-                            if force_idx == "3001":  # Muscular
-                                detalhes["training"]["muscular"] = force_level
-                            elif force_idx == "3002":  # Nine Yin
-                                detalhes["training"]["noveyin"] = force_level
-                            elif force_idx == "3003":  # Nine Yang
-                                detalhes["training"]["noveyang"] = force_level
-                            elif force_idx == "3006":  # Postura do Sapo
-                                detalhes["training"]["sapo"] = force_level
-        except Exception as e:
-            print(f"Erro ao buscar treinamento: {e}")
-        
-        # 9. Habilidades
-        if classe:
-            habilidades, habs_epicas, habs_lendarias = buscar_habilidades_detalhadas(transport_id, classe)
-            detalhes["skills_list"] = habilidades
-            detalhes["skills"] = {"epicas": habs_epicas, "lendarias": habs_lendarias}
-        
-        # 10. Mina
-        url_building = f"https://webapi.mir4global.com/nft/character/building?transportID={transport_id}&languageCode=pt"
-        try:
-            res = session.get(url_building, timeout=10)
-            if res.ok:
-                data = res.json().get("data", {})
-                if data:
-                    for building_id, building_info in data.items():
-                        if str(building_id) == "3000000":
-                            try:
-                                detalhes["building"]["mina"] = int(building_info.get("buildingLevel", "0"))
-                            except ValueError:
-                                pass
-                            break
-        except Exception as e:
-            print(f"Erro ao buscar mina: {e}")
-            
-        # Verificar status de lance em tempo real do wemixplay
-        if detalhes.get("nftID"):
-            try:
-                status_lance = buscar_status_lance_wemixplay(detalhes["nftID"])
-                if status_lance.get("has_bid"):
-                    detalhes["tradeType"] = 2  # Atualizar para bidding
-                    detalhes["bid_count"] = status_lance.get("bid_count", 0)
-                    print(f"[LANCE] Conta {seq} tem {detalhes['bid_count']} lance(s) ativos")
-            except Exception as e:
-                print(f"Erro ao verificar status de lance: {e}")
+        # Grupo que falhou (resposta vazia) continua vencido e sai na próxima busca
+        for grupo, parcial in atualizados.items():
+            if parcial:
+                registrar_busca(detalhes, grupo, anterior)
+        
+        # Grupos que nunca vieram com sucesso estão com os valores padrão (codex 0,
+        # inventário vazio...): a conta fica marcada como incompleta e com TTL curto
+        incompletos = sorted(set(CHAVES_POR_GRUPO) - set(detalhes.get("ttl_grupos", {})))
+        if incompletos:
+            detalhes["incompleto"] = incompletos
+        else:
+            detalhes.pop("incompleto", None)
         
-        save_to_cache(cache_key, detalhes)
-        print(f"[SUCESSO] Detalhes salvos para conta {seq}")
+        if vencidos and not any(atualizados.values()):
+            print(f"[API] Conta {seq}: nenhum endpoint respondeu, detalhes não gravados")
+            return detalhes
+        
+        expiry_minutes, ultimo_minutos = minutos_ate_vencer(detalhes)
+        if vencidos - {grupo for grupo, parcial in atualizados.items() if parcial}:
+            expiry_minutes = min(expiry_minutes, DETALHES_INCOMPLETO_MINUTOS)
+        salvar_detalhes_conta(
+            seq, detalhes, expiry_minutes=expiry_minutes,
+            hard_expiry_minutes=ultimo_minutos + DETALHES_JANELA_VELHO_MINUTOS
+        )
+        if incompletos:
+            print(f"[API] Conta {seq} gravada incompleta (sem {', '.join(incompletos)})")
+        else:
+            print(f"[SUCESSO] Detalhes salvos para conta {seq}")
         
     except Exception as e:
         print(f"Erro ao buscar detalhes da conta {seq}: {e}")
@@ -583,6 +735,317 @@ def buscar_detalhes_conta(seq, transport_id):
     return detalhes
 
 
+def _buscar_resumo(seq):
+    """1. Informações básicas, preço, tradeType, sealedTS, nftID e (3.) equipamentos"""
+    parcial = {}
+    
+    url_basic = f"https://webapi.mir4global.com/nft/character/summary?seq={seq}&languageCode=pt"
+    try:
+        resposta = _get_json(url_basic, timeout=15)
+    except Exception as e:
+        print(f"Erro ao buscar resumo: {e}")
+        resposta = None
+    
+    if resposta is not None:
+        data = resposta.get("data", {})
+        if data:
+            character = data.get("character", {})
+            if character:
+                parcial["basic"] = {
+                    "name": character.get("name", "Desconhecido"),
+                    "worldName": character.get("worldName", "N/A"),
+                    "class": character.get("class", "1"),
+                    "level": int(character.get("level", 0)),
+                    "powerScore": int(character.get("powerScore", 0))
+                }
+                parcial["classe"] = character.get("class", "1")
+            
+            try:
+                price_str = str(data.get("price", "0")).replace(',', '').strip()
+                parcial["price"] = float(price_str) if price_str else 0
+            except:
+                parcial["price"] = 0
+            
+            # tradeType: 1 = venda direta, 2 = leilão/bidding
+            parcial["tradeType"] = int(data.get("tradeType", 1))
+            
+            # sealedTS: timestamp de quando foi selado (para calcular tempo de leilão)
+            parcial["sealedTS"] = data.get("sealedTS", 0)
+            
+            # nftID: ID do NFT no wemixplay (para verificar status de lance)
+            parcial["nftID"] = data.get("nftID", "")
+            
+            # 3. Equipamentos: o equipItem vem na mesma resposta do summary
+            parcial["equip"] = _processar_equipamentos(_extrair_equipamentos(data))
+    
+    return parcial
+
+
+def _buscar_stats(transport_id):
+    """2. Status"""
+    from core.constants import STATUS_DISPONIVEIS
+    
+    parcial = {}
+    
+    url_stats = f"https://webapi.mir4global.com/nft/character/stats?transportID={transport_id}&languageCode=pt"
+    try:
+        resposta = _get_json(url_stats, timeout=10)
+    except Exception as e:
+        print(f"Erro ao buscar stats: {e}")
+        resposta = None
+    if resposta is not None:
+        data = resposta.get("data", {})
+        if isinstance(data, dict):
+            parcial["stats"] = data.get("lists", [])
+            
+            for stat in parcial["stats"]:
+                if isinstance(stat, dict):
+                    nome_status = stat.get("statName")
+                    if nome_status and nome_status not in STATUS_DISPONIVEIS:
+                        STATUS_DISPONIVEIS.append(nome_status)
+    
+    return parcial
+
+
+def _processar_equipamentos(equipamentos_raw):
+    """Converte os equipamentos para o formato do frontend"""
+    from core.filters import processar_equipamento_para_frontend
+    
+    equip = []
+    for eq in equipamentos_raw:
+        processed = processar_equipamento_para_frontend(eq)
+        if processed:
+            equip.append(processed)
+    
+    return equip
+
+
+def _buscar_inventario(transport_id):
+    """4. Inventário: itens comercializáveis, todos os itens e itens especiais"""
+    from core.filters import filtrar_itens_comercializaveis, filtrar_itens_especiais, roman_to_int
+    
+    parcial = {}
+    
+    url_inven = f"https://webapi.mir4global.com/nft/character/inven?transportID={transport_id}&languageCode=pt"
+    try:
+        resposta = _get_json(url_inven, timeout=15)
+        if resposta is not None:
+            data = resposta.get("data", [])
+            if isinstance(data, list):
+                # Itens comercializáveis (para exibição)
+                itens_filtrados = filtrar_itens_comercializaveis(data)
+                
+                # IDs dos itens comercializáveis para marcar
+                ids_comercializaveis = set()
+                for item in itens_filtrados:
+                    ids_comercializaveis.add(item["itemID"])
+                
+                itens_comerciais_frontend = []
+                for item in itens_filtrados:
+                    itens_comerciais_frontend.append({
+                        "name": item["nome"],
+                        "grade": item["grade"],
+                        "tier": roman_to_int(item["tier"]),
+                        "enhance": item["enhance"],
+                        "count": item["quantidade"],
+                        "img": item["imagem"],
+                        "trade": True
+                    })
+                
+                itens_comerciais_frontend.sort(key=lambda x: (-x["grade"], -x["tier"], -x["enhance"]))
+                
+                # TODOS os itens para busca (com flag trade)
+                todos_itens = []
+                for item in data:
+                    if not isinstance(item, dict):
+                        continue
+                    item_id = str(item.get("itemID", ""))
+                    item_name = item.get("itemName", "")
+                    if not item_name:
+                        continue
+                    
+                    grade = int(item.get("grade", "0")) if str(item.get("grade", "0")).isdigit() else 0
+                    tier_str = item.get("tier", "I")
+                    enhance = int(item.get("enhance", 0)) if str(item.get("enhance", 0)).isdigit() else 0
+                    quantidade = item.get("stack", 0) or 1
+                    imagem = item.get("itemPath", "")
+                    
+                    todos_itens.append({
+                        "name": item_name,
+                        "grade": grade,
+                        "tier": roman_to_int(tier_str),
+                        "enhance": enhance,
+                        "count": quantidade,
+                        "img": imagem,
+                        "trade": item_id in ids_comercializaveis
+                    })
+                
+                todos_itens.sort(key=lambda x: (-x["grade"], -x["tier"], -x["enhance"]))
+                
+                parcial["inven_all"] = todos_itens
+                parcial["inven"] = itens_comerciais_frontend[:12]
+                parcial["inven_total"] = len(itens_comerciais_frontend)
+                
+                bilhetes, cristais, fragmentos = filtrar_itens_especiais(data)
+                parcial["tickets"] = bilhetes
+                parcial["crystals"] = cristais
+                parcial["fragments"] = fragmentos
+                
+    except Exception as e:
+        print(f"Erro ao buscar inventário: {e}")
+    
+    return parcial
+
+
+def _buscar_codex(transport_id):
+    """5. Codex"""
+    parcial = {}
+    
+    url_codex = f"https://webapi.mir4global.com/nft/character/codex?transportID={transport_id}&languageCode=pt"
+    try:
+        resposta = _get_json(url_codex, timeout=10)
+        if resposta is not None:
+            data = resposta.get("data", {})
+            if isinstance(data, dict):
+                total = 0
+                for key, item in data.items():
+                    if isinstance(item, dict):
+                        try:
+                            total += int(item.get("completed", "0"))
+                        except:
+                            pass
+                parcial["codex"] = total
+    except Exception as e:
+        print(f"Erro ao buscar codex: {e}")
+    
+    return parcial
+
+
+def _buscar_potencial(transport_id):
+    """6. Potencial"""
+    parcial = {}
+    
+    url_pot = f"https://webapi.mir4global.com/nft/character/potential?transportID={transport_id}&languageCode=pt"
+    try:
+        resposta = _get_json(url_pot, timeout=10)
+        if resposta is not None:
+            data = resposta.get("data", {})
+            if isinstance(data, dict):
+                parcial["potencial"] = int(data.get("total", 0))
+    except Exception as e:
+        print(f"Erro ao buscar potencial: {e}")
+    
+    return parcial
+
+
+def _buscar_espiritos(transport_id):
+    """7. Espíritos"""
+    espiritos = _buscar_spirit(transport_id)
+    if espiritos is None:
+        return {}
+    pets, epicos, lendarios, grade6 = espiritos
+    return {
+        "spirit_list": pets,
+        "spirit": {"epicos": epicos, "lendarios": lendarios, "grade6": grade6}
+    }
+
+
+def _buscar_treinamento(transport_id):
+    """8. Treinamento (constituição, limbo e forças internas)"""
+    training = {"constituicao": 0, "limbo": 0, "inner_force": []}
+    
+    url_train = f"https://webapi.mir4global.com/nft/character/training?transportID={transport_id}&languageCode=pt"
+    try:
+        resposta = _get_json(url_train, timeout=10)
+        if resposta is not None:
+            data = resposta.get("data", {})
+            if isinstance(data, dict):
+                training["constituicao"] = int(data.get("consitutionLevel", 0))
+                training["limbo"] = int(data.get("collectLevel", 0))
+                
+                # Mapear forças por forceIdx
+                for i in range(6):
+                    force = data.get(str(i), {})
+                    if isinstance(force, dict):
+                        force_idx = force.get("forceIdx", "")
+                        force_level = int(force.get("forceLevel", 0))
+                        force_name = force.get("forceName", f"Força {i+1}")
+                        
+                        training["inner_force"].append({
+                            "name": force_name,
+                            "level": force_level,
+                            "idx": force_idx
+                        })
+                        
+                        # Mapear para campos específicos
+                        if force_idx == "3001":  # Muscular
+                            training["muscular"] = force_level
+                        elif force_idx == "3002":  # Nine Yin
+                            training["noveyin"] = force_level
+                        elif force_idx == "3003":  # Nine Yang
+                            training["noveyang"] = force_level
+                        elif force_idx == "3006":  # Postura do Sapo
+                            training["sapo"] = force_level
+                
+                return {"training": training}
+    except Exception as e:
+        print(f"Erro ao buscar treinamento: {e}")
+    
+    return {}
+
+
+def _buscar_habilidades(transport_id, classe):
+    """9. Habilidades (dependem da classe vinda do resumo)"""
+    skills = _buscar_skills(transport_id, classe)
+    if skills is None:
+        return {}
+    habilidades, habs_epicas, habs_lendarias = skills
+    return {
+        "skills_list": habilidades,
+        "skills": {"epicas": habs_epicas, "lendarias": habs_lendarias}
+    }
+
+
+def _buscar_mina(transport_id):
+    """10. Mina"""
+    parcial = {}
+    
+    url_building = f"https://webapi.mir4global.com/nft/character/building?transportID={transport_id}&languageCode=pt"
+    try:
+        resposta = _get_json(url_building, timeout=10)
+        if resposta is not None:
+            parcial["building"] = {"mina": 0}
+            data = resposta.get("data", {})
+            if data:
+                for building_id, building_info in data.items():
+                    if str(building_id) == "3000000":
+                        try:
+                            parcial["building"] = {"mina": int(building_info.get("buildingLevel", "0"))}
+                        except ValueError:
+                            pass
+                        break
+    except Exception as e:
+        print(f"Erro ao buscar mina: {e}")
+    
+    return parcial
+
+
+def _buscar_lance(seq, nft_id):
+    """Status de lance do wemixplay: marca a conta como leilão se houver lance ativo"""
+    parcial = {}
+    
+    try:
+        status_lance = buscar_status_lance_wemixplay(nft_id)
+        if status_lance.get("has_bid"):
+            parcial["tradeType"] = 2  # Atualizar para bidding
+            parcial["bid_count"] = status_lance.get("bid_count", 0)
+            print(f"[LANCE] Conta {seq} tem {parcial['bid_count']} lance(s) ativos")
+    except Exception as e:
+        print(f"Erro ao verificar status de lance: {e}")
+    
+    return parcial
+
+
 def buscar_status_lance_wemixplay(nft_id):
     """
     Busca o status de lance em tempo real do wemixplay.com
@@ -610,7 +1073,7 @@ def buscar_status_lance_wemixplay(nft_id):
             "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8"
         }
         
-        response = session.get(url, headers=headers, timeout=15, allow_redirects=True)
+        response = _get(url, headers=headers, timeout=15, allow_redirects=True)
         
         if not response.ok:
             print(f"[WEMIXPLAY] Erro HTTP {response.status_code} para NFT {nft_id}")
@@ -683,25 +1146,22 @@ def buscar_status_lances_batch(nft_ids, max_concurrent=5):
     
     Args:
         nft_ids: lista de IDs de NFT
-        max_concurrent: número máximo de requisições simultâneas (não implementado por simplicidade)
+        max_concurrent: número máximo de requisições simultâneas deste lote
+                        (o ritmo por host fica com o limitador de _requisitar)
     
     Returns:
         dict mapeando nft_id -> status de lance
     """
-    import time
+    from concurrent.futures import ThreadPoolExecutor
     
     results = {}
     
-    for i, nft_id in enumerate(nft_ids):
-        if i > 0 and i % 10 == 0:
-            print(f"[WEMIXPLAY] Processando NFT {i+1}/{len(nft_ids)}...")
-            time.sleep(1)  # Rate limiting
-        
-        status = buscar_status_lance_wemixplay(nft_id)
-        if status:
-            results[nft_id] = status
-        
-        time.sleep(0.3)  # Pequeno delay entre requisições
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrent)) as executor:
+        for i, (nft_id, status) in enumerate(zip(nft_ids, executor.map(buscar_status_lance_wemixplay, nft_ids))):
+            if i > 0 and i % 10 == 0:
+                print(f"[WEMIXPLAY] Processando NFT {i+1}/{len(nft_ids)}...")
+            if status:
+                results[nft_id] = status
     
     return results
 
@@ -709,12 +1169,11 @@ def buscar_status_lances_batch(nft_ids, max_concurrent=5):
 def buscar_contas_com_bid_wemixplay():
     """
     Busca contas com lances ativos diretamente da API do wemixplay.
-    Retorna lista de NFT IDs (tid) que estão com bid ativo.
+    Retorna a lista das contas com bid ativo, ou None se a busca falhar
+    (lista vazia significa que não há leilões com lance).
     
     Baseado no código do cliente que descobriu o endpoint.
     """
-    import requests
-    
     url = "https://api.wemixplay.com/market/explore/v3/nfts"
     
     headers = {
@@ -734,7 +1193,7 @@ def buscar_contas_com_bid_wemixplay():
     }
     
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = _requisitar("POST", url, headers=headers, json=payload, timeout=30)
         
         if response.status_code == 200:
             data = response.json()
@@ -802,11 +1261,11 @@ def buscar_contas_com_bid_wemixplay():
                 return ongoing_bids
         
         print(f"[WEMIXPLAY API] Erro: {response.status_code}")
-        return []
+        return None
         
     except Exception as e:
         print(f"[WEMIXPLAY API] Erro ao buscar: {e}")
-        return []
+        return None
 
 
 def obter_nft_ids_com_bid():
@@ -814,7 +1273,7 @@ def obter_nft_ids_com_bid():
     Retorna um set com os nftIDs que têm bid ativo.
     Útil para verificação rápida.
     """
-    contas = buscar_contas_com_bid_wemixplay()
+    contas = buscar_contas_com_bid_wemixplay() or []
     return {conta['nftID'] for conta in contas}
 
 
@@ -823,7 +1282,8 @@ _cache_contas_bid = {
     "data": [],
     "nft_ids": set(),
     "timestamp": 0,
-    "ttl": 1800  # 30 minutos em segundos
+    "ttl": 1800,  # 30 minutos em segundos
+    "ttl_maximo": 7200  # até 2 horas a lista anterior é servida enquanto atualiza
 }
 
 
@@ -849,16 +1309,36 @@ def obter_contas_com_bid_cached(force_refresh=False):
         print(f"[CACHE BID] Usando cache (idade: {int(cache_age)}s)")
         return _cache_contas_bid["data"], _cache_contas_bid["nft_ids"], True
     
-    # Atualizar cache
+    # Lista velha: servir agora e atualizar em segundo plano
+    if not force_refresh and cache_age < _cache_contas_bid["ttl_maximo"] and _cache_contas_bid["data"]:
+        print(f"[CACHE BID] Usando cache velho (idade: {int(cache_age)}s), atualizando em segundo plano")
+        agendar_revalidacao("contas_com_bid_wemixplay", _atualizar_cache_contas_bid)
+        return _cache_contas_bid["data"], _cache_contas_bid["nft_ids"], True
+    
+    # Atualizar cache (chamadas concorrentes aguardam a mesma atualização)
     print(f"[CACHE BID] Atualizando cache... (force={force_refresh}, valid={cache_valid})")
+    contas, nft_ids = executar_unico("contas_com_bid_wemixplay", _atualizar_cache_contas_bid)
+    
+    return contas, nft_ids, False
+
+
+def _atualizar_cache_contas_bid():
+    """
+    Busca as contas com bid no wemixplay e atualiza _cache_contas_bid. Se a busca
+    falhar, a lista anterior (e seu timestamp) continua valendo.
+    """
+    import time
     contas = buscar_contas_com_bid_wemixplay()
+    if contas is None:
+        print(f"[CACHE BID] Atualização falhou, mantendo lista anterior ({len(_cache_contas_bid['data'])} contas)")
+        return _cache_contas_bid["data"], _cache_contas_bid["nft_ids"]
     nft_ids = {c['nftID'] for c in contas}
     
     _cache_contas_bid["data"] = contas
     _cache_contas_bid["nft_ids"] = nft_ids
-    _cache_contas_bid["timestamp"] = now
+    _cache_contas_bid["timestamp"] = time.time()
     
-    return contas, nft_ids, False
+    return contas, nft_ids
 
 
 def verificar_conta_ainda_ativa(nft_id):
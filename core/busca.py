@@ -0,0 +1,425 @@
+"""
+Índice colunar das contas para os filtros numéricos de /buscar-contas
+
+Cada snapshot publicado ganha um IndiceContas: uma coluna NumPy por campo
+filtrável, na mesma ordem das contas do snapshot (linha = índice da conta).
+Itens do inventário e espíritos têm índices invertidos (nome -> linhas) e cada
+ordenação da busca tem as posições das linhas pré-calculadas.
+A rota calcula a máscara de todos esses filtros de uma vez e só decodifica as
+contas que passam nela; os filtros restantes (nome, status, habilidades)
+continuam em Python sobre essas contas.
+"""
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from core.constants import NOMES_BLOQUEADOS
+from core.filters import formatar_valor
+
+# Colunas numéricas (float64) e como cada uma é lida da conta
+COLUNAS_NUMERICAS = (
+    "power", "level", "price", "mina", "codex", "potencial",
+    "equip_lendarios", "equip_lend_trade", "equip_epic_trade",
+    "pets_lendarios", "pets_misticos", "habs_lendarias",
+    "constituicao", "muscular", "noveyin", "noveyang", "sapo"
+)
+
+# Filtro -> coluna; filtros com valor vazio ou 0 são ignorados, como na rota
+FILTROS_MINIMO = {
+    "power_min": "power",
+    "level_min": "level",
+    "price_min": "price",
+    "mina_min": "mina",
+    "codex_min": "codex",
+    "itens_comercio_min": "equip_lendarios",
+    "equip_lend_trade_min": "equip_lend_trade",
+    "equip_epic_trade_min": "equip_epic_trade",
+}
+FILTROS_MAXIMO = {
+    "power_max": "power",
+    "level_max": "level",
+    "price_max": "price",
+}
+# Só aplicados para usuários premium
+FILTROS_MINIMO_PREMIUM = {
+    "pets_lendarios_min": "pets_lendarios",
+    "treino_constituicao": "constituicao",
+    "constituicao_min": "constituicao",
+    "treino_muscular": "muscular",
+    "treino_noveyin": "noveyin",
+    "treino_noveyang": "noveyang",
+    "treino_sapo": "sapo",
+    "habs_lendarias_min": "habs_lendarias",
+    "pets_misticos_min": "pets_misticos",
+    "potencial_min": "potencial",
+}
+
+# Ordenações da busca por status: nome da ordenação -> trecho do nome do status
+ORDENACOES_STATUS = {
+    "critico": "CRÍTICO",
+    "evasao": "EVASÃO",
+    "ataque_fisico": "ATAQUE FÍSICO",
+    "ataque_magico": "ATAQUE DE FEITIÇO",
+    "precisao": "PRECISÃO",
+    "derrubada": "AUMENTO DA PROBABILIDADE DE SUCESSO DE DERRUBAR",
+    "evasao_critico": "EVASÃO DE CRÍTICO",
+    "atk_habilidade": "AUMENTO DE ATK DE HABILIDADE",
+    "aceleramento": "ACELERAMENTO DE TEMPO DE MINERAÇÃO",
+    "aconegro": "AUMENTO DE GANHO DE AÇO NEGRO",
+}
+# Todas as ordenações (cada uma é uma coluna do índice, com as posições pré-ordenadas)
+ORDENACOES = ("power", "price", "level", "codex", "mina", "constituicao") + tuple(ORDENACOES_STATUS)
+
+# Cache LRU de resultados: quantas consultas (linhas filtradas e ordenadas) guardar; 0 desativa
+BUSCA_CACHE_CONSULTAS = int(os.environ.get('BUSCA_CACHE_CONSULTAS', 256))
+
+_indices = {}  # cache_key -> IndiceContas do último snapshot visto
+_indices_lock = threading.Lock()
+_versao_indices = 0  # incrementada a cada índice montado (versão do snapshot nas chaves do cache)
+_resultados = OrderedDict()  # (cache_key, versão, consulta) -> linhas ordenadas (mais recente no fim)
+_resultados_lock = threading.Lock()
+
+
+def _numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def montar_registro_busca(conta):
+    """
+    Registro de busca da conta ("busca"): valores derivados que só mudam quando a
+    conta é recarregada — contagens de equipamentos, status já convertidos por
+    formatar_valor, quantidade de cada item do inventário e nomes em minúsculas.
+    Montado pelo loader junto com a conta completa.
+    """
+    basic = conta.get("basic") or {}
+    equipamentos = [e for e in conta.get("equip") or [] if isinstance(e, dict)]
+
+    stats = {}
+    for stat in conta.get("stats") or []:
+        if isinstance(stat, dict):
+            stats[stat.get("statName", "")] = formatar_valor(stat.get("statValue", "0"))
+
+    itens = {}
+    for item in conta.get("inven_all") or []:
+        if isinstance(item, dict):
+            nome_item = item.get("name", "")
+            quantidade = item.get("count", 1)
+            if quantidade == 0:
+                quantidade = 1
+            itens[nome_item] = itens.get(nome_item, 0) + quantidade
+
+    # Os dois nomes que o filtro de nome do jogador confere
+    nomes = {
+        str(conta.get("name", basic.get("name", "")) or "").lower(),
+        str(basic.get("name", conta.get("name", "")) or "").lower()
+    }
+
+    return {
+        "nomes": sorted(nomes),
+        "equip_lendarios": sum(1 for e in equipamentos if e.get("grade", 0) == 5),
+        "equip_lend_trade": sum(1 for e in equipamentos if e.get("trade") and e.get("grade") == 5),
+        "equip_epic_trade": sum(1 for e in equipamentos if e.get("trade") and e.get("grade") == 4),
+        "stats": stats,
+        "itens": itens,
+        "espiritos": [
+            str(s.get("name", "")).lower() for s in conta.get("spirit_list") or [] if isinstance(s, dict)
+        ],
+    }
+
+
+def valor_status(conta, trecho):
+    """
+    Chave da ordenação por status: o primeiro status da conta cujo nome contém o
+    trecho, sem vírgulas e "%" (0 se não houver ou não for número). Não usa os
+    valores de formatar_valor do registro de busca, para manter a ordem de sempre.
+    """
+    trecho = trecho.upper()
+    for stat in conta.get("stats") or []:
+        if isinstance(stat, dict) and trecho in (stat.get("statName", "") or "").upper():
+            valor = stat.get("statValue", "0")
+            if isinstance(valor, str):
+                valor = valor.replace(",", "").replace("%", "")
+            try:
+                return float(valor)
+            except (TypeError, ValueError):
+                return 0
+    return 0
+
+
+def registro_busca(conta):
+    """Registro de busca da conta; montado na hora para contas sem ele (fora do snapshot)"""
+    return conta.get("busca") or montar_registro_busca(conta)
+
+
+def _valores_da_conta(conta, registro):
+    """Valores de COLUNAS_NUMERICAS de uma conta (mesmas leituras da rota)"""
+    basic = conta.get("basic") or {}
+    spirit = conta.get("spirit") or {}
+    skills = conta.get("skills") or {}
+    training = conta.get("training") or {}
+
+    return (
+        _numero(conta.get("powerScore", basic.get("powerScore", 0))),
+        _numero(conta.get("level", basic.get("level", 0))),
+        _numero(conta.get("price", 0)),
+        _numero((conta.get("building") or {}).get("mina", 0)),
+        _numero(conta.get("codex", 0)),
+        _numero(conta.get("potencial", 0)),
+        registro["equip_lendarios"],
+        registro["equip_lend_trade"],
+        registro["equip_epic_trade"],
+        _numero(spirit.get("lendarios", 0)),
+        _numero(spirit.get("grade6", 0)),
+        _numero(skills.get("lendarias", 0)),
+        _numero(training.get("constituicao", 0)),
+        _numero(training.get("muscular", 0)),
+        _numero(training.get("noveyin", 0)),
+        _numero(training.get("noveyang", 0)),
+        _numero(training.get("sapo", 0)),
+    )
+
+
+class IndiceContas:
+    """
+    Colunas de um snapshot de contas. origem é o objeto (SnapshotContas ou
+    lista) a que o índice corresponde: um índice só vale para a mesma origem.
+    """
+
+    def __init__(self, contas, origem=None):
+        global _versao_indices
+
+        self.origem = contas if origem is None else origem
+        with _indices_lock:
+            _versao_indices += 1
+            self.versao = _versao_indices
+
+        valores = []
+        valores_status = []
+        classes, mundos, nft_ids, nomes, bloqueados = [], [], [], [], []
+        itens = {}  # nome do item -> ([linhas], [quantidades])
+        espiritos = {}  # nome do espírito em minúsculas -> [linhas]
+        for linha, conta in enumerate(contas):
+            basic = conta.get("basic") or {}
+            registro = registro_busca(conta)
+            for nome_item, quantidade in registro["itens"].items():
+                linhas_item, quantidades = itens.setdefault(nome_item, ([], []))
+                linhas_item.append(linha)
+                quantidades.append(quantidade)
+            for nome_espirito in set(registro["espiritos"]):
+                espiritos.setdefault(nome_espirito, []).append(linha)
+            valores.append(_valores_da_conta(conta, registro))
+            valores_status.append([valor_status(conta, trecho) for trecho in ORDENACOES_STATUS.values()])
+            classes.append(str(conta.get("class", "1")))
+            mundos.append(str(conta.get("worldName", basic.get("worldName", "")) or ""))
+            nft_ids.append(str(conta.get("nftID", "")))
+            nome = basic.get("name", conta.get("name", ""))
+            bloqueados.append(nome in NOMES_BLOQUEADOS)
+            # Nome usado no cruzamento com as contas com lance do wemixplay
+            nomes.append((basic.get("name", "") or conta.get("name", "") or "").strip().lower())
+
+        self.total = len(valores)
+        matriz = np.array(valores, dtype=np.float64).reshape(self.total, len(COLUNAS_NUMERICAS))
+        self.colunas = {
+            nome: np.ascontiguousarray(matriz[:, i]) for i, nome in enumerate(COLUNAS_NUMERICAS)
+        }
+        matriz_status = np.array(valores_status, dtype=np.float64).reshape(self.total, len(ORDENACOES_STATUS))
+        for i, nome in enumerate(ORDENACOES_STATUS):
+            self.colunas[nome] = np.ascontiguousarray(matriz_status[:, i])
+        self.classe = np.array(classes, dtype=str)
+        self.mundo = np.array(mundos, dtype=str)
+        self.nft_id = np.array(nft_ids, dtype=str)
+        self.bloqueado = np.array(bloqueados, dtype=bool)
+        self.nomes = np.array(nomes, dtype=str)
+        # Índices invertidos: linhas (crescentes) de cada item, com as quantidades, e de cada espírito
+        self.itens = {
+            nome: (np.array(linhas_item, dtype=np.int32), np.array(quantidades, dtype=np.float64))
+            for nome, (linhas_item, quantidades) in itens.items()
+        }
+        self.espiritos = {nome: np.array(linhas, dtype=np.int32) for nome, linhas in espiritos.items()}
+
+        # Posição de cada linha em cada ordenação, crescente e decrescente. A ordem é
+        # estável (empates na ordem do snapshot), como a do list.sort que substitui.
+        self.posicoes = {}
+        for nome in ORDENACOES:
+            for desc in (False, True):
+                ordem = np.argsort(-self.colunas[nome] if desc else self.colunas[nome], kind="stable")
+                posicoes = np.empty(self.total, dtype=np.int32)
+                posicoes[ordem] = np.arange(self.total, dtype=np.int32)
+                self.posicoes[(nome, desc)] = posicoes
+
+    def __len__(self):
+        return self.total
+
+    def primeiras(self, mascara, k, ordenar_por=None, desc=True):
+        """
+        As k primeiras linhas da máscara na ordenação, já ordenadas (sem ordenação
+        conhecida, na ordem do snapshot). argpartition sobre as posições
+        pré-calculadas: o custo da ordenação depende de k, não do total filtrado.
+        """
+        linhas = np.flatnonzero(mascara)
+        posicoes = self.posicoes.get((ordenar_por, desc))
+        if posicoes is None or k <= 0:
+            return linhas[:max(k, 0)]
+
+        posicoes_linhas = posicoes[linhas]
+        if len(linhas) > k:
+            escolhidas = np.argpartition(posicoes_linhas, k - 1)[:k]
+            linhas, posicoes_linhas = linhas[escolhidas], posicoes_linhas[escolhidas]
+        return linhas[np.argsort(posicoes_linhas)]
+
+    def ordenar(self, mascara, ordenar_por=None, desc=True):
+        """Todas as linhas da máscara na ordenação (sem ordenação conhecida, na ordem do snapshot)"""
+        linhas = np.flatnonzero(mascara)
+        posicoes = self.posicoes.get((ordenar_por, desc))
+        if posicoes is None:
+            return linhas
+        return linhas[np.argsort(posicoes[linhas])]
+
+    def linhas_com_itens(self, itens_minimos):
+        """Linhas que têm todos os itens {nome: quantidade mínima} (interseção das listas)"""
+        linhas = None
+        for nome_item, qtd_min in itens_minimos.items():
+            linhas_item, quantidades = self.itens.get(nome_item, (np.empty(0, np.int32), np.empty(0)))
+            linhas_item = linhas_item[quantidades >= qtd_min]
+            linhas = linhas_item if linhas is None else np.intersect1d(linhas, linhas_item, assume_unique=True)
+            if not len(linhas):
+                break
+        return linhas
+
+    def linhas_com_espiritos(self, espiritos):
+        """
+        Linhas que têm um espírito contendo cada termo (busca parcial): união das
+        listas dos nomes que contêm o termo, interseção entre os termos
+        """
+        linhas = None
+        for termo in espiritos:
+            listas = [linhas_nome for nome, linhas_nome in self.espiritos.items() if termo in nome]
+            linhas_termo = np.unique(np.concatenate(listas)) if listas else np.empty(0, np.int32)
+            linhas = linhas_termo if linhas is None else np.intersect1d(linhas, linhas_termo, assume_unique=True)
+            if not len(linhas):
+                break
+        return linhas
+
+    def mascara(self, filtros, is_premium=False, servidores_regiao=None, nft_ids_com_bid=None,
+                itens_minimos=None, espiritos=None):
+        """
+        Máscara booleana das contas que passam nos filtros colunares (contas
+        bloqueadas ficam de fora). status_lance "bidding" usa nft_ids_com_bid;
+        itens_minimos ({nome: quantidade}) e espiritos (termos em minúsculas) são
+        filtros premium resolvidos pelos índices invertidos.
+        """
+        mascara = ~self.bloqueado
+
+        classe = filtros.get("classe")
+        if classe and classe != "0":
+            mascara &= self.classe == classe
+
+        if filtros.get("status_lance") == "bidding":
+            mascara &= np.isin(self.nft_id, list(nft_ids_com_bid or ()))
+
+        if filtros.get("servidor"):
+            mascara &= self.mundo == filtros["servidor"]
+        elif filtros.get("regiao") and servidores_regiao:
+            mascara &= np.isin(self.mundo, list(servidores_regiao))
+
+        minimos = dict(FILTROS_MINIMO, **(FILTROS_MINIMO_PREMIUM if is_premium else {}))
+        for filtro, coluna in minimos.items():
+            if filtros.get(filtro):
+                mascara &= self.colunas[coluna] >= filtros[filtro]
+        for filtro, coluna in FILTROS_MAXIMO.items():
+            if filtros.get(filtro):
+                mascara &= self.colunas[coluna] <= filtros[filtro]
+
+        if is_premium:
+            for linhas in (
+                self.linhas_com_itens(itens_minimos) if itens_minimos else None,
+                self.linhas_com_espiritos(espiritos) if espiritos else None
+            ):
+                if linhas is not None:
+                    selecionadas = np.zeros(self.total, dtype=bool)
+                    selecionadas[linhas] = True
+                    mascara &= selecionadas
+
+        return mascara
+
+
+def registrar_indice(cache_key, contas, origem=None):
+    """
+    Monta o índice das contas publicadas em cache_key e o deixa pronto para a
+    rota. origem é o objeto que as requisições vão receber (o SnapshotContas
+    aberto logo após a gravação); as contas em si podem ser a lista em memória.
+    """
+    inicio = time.perf_counter()
+    indice = IndiceContas(contas, origem)
+    with _indices_lock:
+        _indices[cache_key] = indice
+    _descartar_resultados(cache_key)
+    print(f"[BUSCA] Índice de {cache_key}: {indice.total} contas em {(time.perf_counter() - inicio) * 1000:.0f}ms")
+    return indice
+
+
+def descartar_indice(cache_key):
+    """Remove o índice de uma chave que deixou de ser publicada"""
+    with _indices_lock:
+        _indices.pop(cache_key, None)
+    _descartar_resultados(cache_key)
+
+
+def obter_indice(cache_key, contas):
+    """
+    Índice das contas de cache_key para a rota: o registrado na publicação, se
+    for da mesma origem; senão (outro worker do gunicorn, snapshot restaurado
+    ou trocado) é montado agora, uma única vez entre requisições simultâneas.
+    """
+    with _indices_lock:
+        indice = _indices.get(cache_key)
+    if indice is not None and indice.origem is contas:
+        return indice
+
+    from core.cache import executar_unico
+    return executar_unico(f"indice_{cache_key}_{id(contas)}", registrar_indice, cache_key, contas)
+
+
+def chave_consulta(filtros, ordenar_por, desc, is_premium, *extras):
+    """
+    Forma canônica de uma consulta: filtros preenchidos em JSON com chaves
+    ordenadas, ordenação, premium e extras (ex.: assinatura dos lances ativos)
+    """
+    preenchidos = {chave: valor for chave, valor in filtros.items() if valor not in (None, "", {})}
+    return (json.dumps(preenchidos, sort_keys=True, ensure_ascii=False), ordenar_por, desc, is_premium) + extras
+
+
+def ler_resultado(cache_key, indice, consulta):
+    """Linhas ordenadas guardadas para a consulta no snapshot do índice (ou None)"""
+    chave = (cache_key, indice.versao, consulta)
+    with _resultados_lock:
+        linhas = _resultados.get(chave)
+        if linhas is not None:
+            _resultados.move_to_end(chave)
+        return linhas
+
+
+def guardar_resultado(cache_key, indice, consulta, linhas):
+    """Guarda as linhas ordenadas da consulta, descartando as menos usadas além de BUSCA_CACHE_CONSULTAS"""
+    if BUSCA_CACHE_CONSULTAS <= 0:
+        return
+    linhas.setflags(write=False)
+    with _resultados_lock:
+        _resultados[(cache_key, indice.versao, consulta)] = linhas
+        _resultados.move_to_end((cache_key, indice.versao, consulta))
+        while len(_resultados) > BUSCA_CACHE_CONSULTAS:
+            _resultados.popitem(last=False)
+
+
+def _descartar_resultados(cache_key):
+    """Remove os resultados guardados de cache_key (um snapshot novo foi publicado)"""
+    with _resultados_lock:
+        for chave in [chave for chave in _resultados if chave[0] == cache_key]:
+            del _resultados[chave]
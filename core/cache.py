@@ -4,13 +4,43 @@ Funções de cache do sistema
 import os
 import json
 import glob
+import pickle
 import shutil
+import struct
+import threading
+import time
+import zlib
+import mmap
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+from core.cache_metricas import registrar, observar_latencia
+
 CACHE_DIR = "xdraco_cache_status"
 CACHE_DIR_DETALHES = os.path.join(CACHE_DIR, "detalhes")
 CACHE_EXPIRY_MINUTES = 720
 
+# Orçamento (em bytes) do cache em memória que fica na frente dos arquivos.
+# O custo de cada entrada é o tamanho do payload descomprimido (JSON ou pickle)
+# multiplicado por CACHE_MEMORIA_FATOR, já que os objetos Python parseados ocupam
+# bem mais que a forma serializada.
+CACHE_MEMORIA_MAX_BYTES = int(os.environ.get('CACHE_MEMORIA_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_MEMORIA_FATOR = float(os.environ.get('CACHE_MEMORIA_FATOR', 4))
+
+# Número de arquivos de segmento do armazém de detalhes de contas
+DETALHES_NUM_SEGMENTOS = 8
+
+# Backend do cache: "arquivo" (arquivos em CACHE_DIR) ou "sqlite" (ver core/cache_sqlite.py)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'arquivo')
+
+# Algoritmo de compressão: vazio respeita COMPRESSAO_POR_CHAVE, "nenhum" desativa,
+# "gzip" ou "zstd" (pacote zstandard, opcional) substitui o algoritmo configurado
+CACHE_COMPRESSAO = os.environ.get('CACHE_COMPRESSAO', '')
+
+# Nível zlib dos registros do armazém de detalhes (0 desativa)
+DETALHES_COMPRESSAO_NIVEL = int(os.environ.get('DETALHES_COMPRESSAO_NIVEL', 1))
+
 # Criar diretórios de cache se não existirem
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
@@ -18,6 +48,81 @@ if not os.path.exists(CACHE_DIR_DETALHES):
     os.makedirs(CACHE_DIR_DETALHES)
 
 
+# Última leitura de cada chave (epoch), usada pela faxina para escolher o que remover
+_ultimos_acessos = {}
+
+
+# ==================== CACHE EM MEMÓRIA (LRU) ====================
+# key -> {"mtime": ..., "size": ..., "custo": ..., "entry": cache_entry já parseado}
+_cache_memoria = OrderedDict()
+_cache_memoria_bytes = 0
+_cache_memoria_lock = threading.Lock()
+
+
+def _memoria_obter(key, mtime, size):
+    """Retorna a entrada em memória se o arquivo não mudou desde a leitura"""
+    with _cache_memoria_lock:
+        item = _cache_memoria.get(key)
+        if item is None:
+            return None
+        if item["mtime"] != mtime or item["size"] != size:
+            _memoria_remover(key)
+            return None
+        _cache_memoria.move_to_end(key)
+        return item["entry"]
+
+
+def _memoria_guardar(key, mtime, size, entry, tamanho_payload):
+    """
+    Guarda uma entrada parseada, removendo as menos usadas se passar do orçamento.
+    mtime e size validam a entrada; tamanho_payload (bytes descomprimidos) define o custo.
+    """
+    global _cache_memoria_bytes
+    
+    custo = int(tamanho_payload * CACHE_MEMORIA_FATOR)
+    if custo > CACHE_MEMORIA_MAX_BYTES:
+        return
+    
+    with _cache_memoria_lock:
+        _memoria_remover(key)
+        _cache_memoria[key] = {"mtime": mtime, "size": size, "custo": custo, "entry": entry}
+        _cache_memoria_bytes += custo
+        
+        while _cache_memoria_bytes > CACHE_MEMORIA_MAX_BYTES and _cache_memoria:
+            _, item = _cache_memoria.popitem(last=False)
+            _cache_memoria_bytes -= item["custo"]
+
+
+def _memoria_remover(key):
+    """Remove uma chave do cache em memória (chamar com o lock adquirido)"""
+    global _cache_memoria_bytes
+    item = _cache_memoria.pop(key, None)
+    if item is not None:
+        _cache_memoria_bytes -= item["custo"]
+
+
+def invalidar_cache_memoria(key=None):
+    """Invalida uma chave do cache em memória (ou todas, se key for None)"""
+    global _cache_memoria_bytes
+    with _cache_memoria_lock:
+        if key is None:
+            _cache_memoria.clear()
+            _cache_memoria_bytes = 0
+        else:
+            _memoria_remover(key)
+
+
+def get_status_cache_memoria():
+    """Retorna ocupação do cache em memória"""
+    with _cache_memoria_lock:
+        return {
+            "entradas": len(_cache_memoria),
+            "bytes": _cache_memoria_bytes,
+            "max_bytes": CACHE_MEMORIA_MAX_BYTES,
+            "fator": CACHE_MEMORIA_FATOR
+        }
+
+
 def get_cache_key(*args):
     """Gera uma chave de cache a partir dos argumentos"""
     import hashlib
@@ -25,33 +130,470 @@ def get_cache_key(*args):
     return hashlib.md5(key_string.encode()).hexdigest()
 
 
-def save_to_cache(key, data, expiry_minutes=CACHE_EXPIRY_MINUTES):
-    """Salva dados no cache"""
-    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+# ==================== SINGLE-FLIGHT ====================
+# chave -> {"evento": threading.Event, "resultado": ..., "erro": ..., "aguardando": n}
+_em_andamento = {}
+_em_andamento_lock = threading.Lock()
+
+
+def executar_unico(chave, funcao, *args, **kwargs):
+    """
+    Executa funcao(*args, **kwargs) uma única vez por chave entre chamadas concorrentes.
+
+    A primeira thread que pede a chave executa a função; as que chegam enquanto ela
+    roda esperam e recebem o mesmo resultado (ou a mesma exceção). Nada fica guardado
+    depois que a execução termina: o cache de verdade continua sendo responsabilidade
+    de quem chama.
+    """
+    with _em_andamento_lock:
+        voo = _em_andamento.get(chave)
+        lider = voo is None
+        if lider:
+            voo = {"evento": threading.Event(), "resultado": None, "erro": None, "aguardando": 0}
+            _em_andamento[chave] = voo
+        else:
+            voo["aguardando"] += 1
+
+    if not lider:
+        voo["evento"].wait()
+        if voo["erro"] is not None:
+            raise voo["erro"]
+        return voo["resultado"]
+
+    try:
+        voo["resultado"] = funcao(*args, **kwargs)
+        return voo["resultado"]
+    except Exception as e:
+        voo["erro"] = e
+        raise
+    finally:
+        with _em_andamento_lock:
+            _em_andamento.pop(chave, None)
+        if voo["aguardando"]:
+            print(f"[CACHE] {voo['aguardando']} chamada(s) aguardaram '{chave}' em andamento")
+        voo["evento"].set()
+
+
+# ==================== COMPRESSÃO ====================
+# id gravado no cabeçalho -> algoritmo. 0 = sem compressão.
+COMPRESSORES = {
+    "gzip": 1,
+    "zstd": 2
+}
+
+
+def _algoritmo_disponivel(algoritmo):
+    """Troca zstd por gzip quando o pacote zstandard não está instalado"""
+    if algoritmo == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            print("[CACHE] zstandard não instalado, usando gzip")
+            return "gzip"
+    return algoritmo
+
+
+def _abrir_compressor(f, algoritmo, nivel):
+    """Stream de escrita que comprime para f (fechar o stream não fecha f)"""
+    if algoritmo == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=nivel).stream_writer(f, closefd=False)
+    import gzip
+    return gzip.GzipFile(fileobj=f, mode='wb', compresslevel=nivel, mtime=0)
+
+
+def _abrir_descompressor(f, algoritmo):
+    """Stream de leitura que descomprime a partir da posição atual de f"""
+    if algoritmo == "zstd":
+        import io
+        import zstandard
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=False))
+    import gzip
+    return gzip.GzipFile(fileobj=f, mode='rb')
+
+
+def _comprimir_bloco(dados, algoritmo, nivel):
+    if algoritmo == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=nivel).compress(dados)
+    return zlib.compress(dados, nivel)
+
+
+def _descomprimir_bloco(dados, algoritmo):
+    if algoritmo == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(dados)
+    return zlib.decompress(dados)
+
+
+# ==================== FORMATOS DE SERIALIZAÇÃO ====================
+def _escrever_pickle(f, data, compressao):
+    """Um único pickle; comprimido em stream quando há compressão"""
+    if not compressao:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return
+    with _abrir_compressor(f, *compressao) as z:
+        pickle.dump(data, z, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _ler_pickle(f, cabecalho):
+    """
+    Desserializa direto do stream (descomprimido sob demanda, sem cópia intermediária).
+    Anota em cabecalho["tamanho_payload"] quantos bytes descomprimidos foram lidos.
+    """
+    if not cabecalho["compressao"]:
+        inicio = f.tell()
+        data = pickle.load(f)
+        cabecalho["tamanho_payload"] = f.tell() - inicio
+        return data
+    with _abrir_descompressor(f, cabecalho["compressao"]) as z:
+        data = pickle.load(z)
+        cabecalho["tamanho_payload"] = z.tell()
+        return data
+
+
+def _escrever_registros(f, itens, compressao):
+    """
+    Grava cada item como um pickle independente seguido da tabela de offsets.
+    Com compressão, cada item é comprimido separadamente (mantém o acesso aleatório).
+    """
+    inicio = f.tell()
+    offsets = array("Q")
+    for item in itens:
+        offsets.append(f.tell() - inicio)
+        if compressao:
+            f.write(_comprimir_bloco(pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL), *compressao))
+        else:
+            pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+    offsets.append(f.tell() - inicio)
+    f.write(offsets.tobytes())
+
+
+def _ler_registros(f, cabecalho):
+    """
+    Lê todos os registros gravados por _escrever_registros.
+    Anota em cabecalho["tamanho_payload"] o total de bytes descomprimidos.
+    """
+    payload = memoryview(f.read())
+    tamanho_tabela = (cabecalho["count"] + 1) * 8
+    offsets = payload[len(payload) - tamanho_tabela:].cast("Q")
+    algoritmo = cabecalho["compressao"]
+    if algoritmo:
+        itens = []
+        tamanho_payload = 0
+        for i in range(cabecalho["count"]):
+            bloco = _descomprimir_bloco(payload[offsets[i]:offsets[i + 1]], algoritmo)
+            tamanho_payload += len(bloco)
+            itens.append(pickle.loads(bloco))
+        cabecalho["tamanho_payload"] = tamanho_payload
+        return itens
+    cabecalho["tamanho_payload"] = len(payload) - tamanho_tabela
+    return [pickle.loads(payload[offsets[i]:offsets[i + 1]]) for i in range(cabecalho["count"])]
+
+
+# Serializadores binários disponíveis (id gravado no cabeçalho -> funções).
+# "escrever" grava o payload no arquivo aberto (compressao: (algoritmo, nível) ou None);
+# "ler" lê a partir do fim do cabeçalho.
+# O diretório de cache é privado da aplicação, por isso pickle é aceitável aqui.
+SERIALIZADORES = {
+    "pickle": {
+        "id": 1,
+        "escrever": _escrever_pickle,
+        "ler": _ler_pickle
+    },
+    # Lista com um pickle por item + tabela de offsets: permite abrir com mmap e
+    # decodificar só os itens necessários (ver SnapshotContas)
+    "registros": {
+        "id": 2,
+        "escrever": _escrever_registros,
+        "ler": _ler_registros
+    }
+}
+
+# Formato usado por prefixo de chave; chaves sem regra continuam em JSON
+FORMATO_POR_CHAVE = {
+    "contas_completas": "registros",
+    "contas_teste": "registros"
+}
+
+# Compressão por prefixo de chave: (algoritmo, nível). Só vale para formatos binários.
+COMPRESSAO_POR_CHAVE = {
+    "contas_completas": ("gzip", 1),
+    "contas_teste": ("gzip", 1)
+}
+
+# Cabeçalho fixo do formato binário:
+# magic, versão, id do serializador, id da compressão, nível da compressão,
+# timestamp (epoch), expiry_minutes, hard_expiry_minutes, quantidade de itens.
+# A versão 1 não tinha hard_expiry_minutes (equivale a hard_expiry_minutes ==
+# expiry_minutes) nem compressão, e continua sendo lida.
+_CABECALHO_MAGIC = b"MHC1"
+_CABECALHO_VERSAO = 2
+_CABECALHO = struct.Struct("<4sBBBBdddI")
+_CABECALHO_V1 = struct.Struct("<4sBB2xddI")
+
+
+def _formato_para(key):
+    """Retorna o formato configurado para a chave ("json" ou um serializador binário)"""
+    for prefixo, formato in FORMATO_POR_CHAVE.items():
+        if key.startswith(prefixo):
+            return formato
+    return "json"
+
+
+def _compressao_para(key):
+    """Retorna (algoritmo, nível) configurado para a chave, ou None"""
+    if CACHE_COMPRESSAO == "nenhum":
+        return None
+    for prefixo, compressao in COMPRESSAO_POR_CHAVE.items():
+        if key.startswith(prefixo):
+            algoritmo, nivel = compressao
+            return CACHE_COMPRESSAO or algoritmo, nivel
+    return None
+
+
+def _caminho_cache(key, formato):
+    """Caminho do arquivo de cache para a chave no formato informado"""
+    extensao = "json" if formato == "json" else "bin"
+    return os.path.join(CACHE_DIR, f"{key}.{extensao}")
+
+
+def _localizar_cache(key):
+    """Retorna o caminho do arquivo existente para a chave (binário tem prioridade)"""
+    for formato in ("bin", "json"):
+        cache_path = _caminho_cache(key, formato)
+        if os.path.exists(cache_path):
+            return cache_path
+    return None
+
+
+def _ler_cabecalho_binario(f):
+    """Lê o cabeçalho fixo de um arquivo binário já aberto, deixando o arquivo no início do payload"""
+    cabecalho = _decodificar_cabecalho(f.read(_CABECALHO.size))
+    f.seek(cabecalho["tamanho_cabecalho"])
+    return cabecalho
+
+
+def _decodificar_cabecalho(bruto):
+    """Decodifica os bytes do cabeçalho fixo (versão atual ou 1)"""
+    versao = bruto[4] if len(bruto) > 4 else None
+    formato_cabecalho = _CABECALHO_V1 if versao == 1 else _CABECALHO
+    if len(bruto) < formato_cabecalho.size:
+        raise ValueError("cabeçalho incompleto")
+    
+    if versao == 1:
+        magic, versao, serializador_id, timestamp, expiry_minutes, count = _CABECALHO_V1.unpack_from(bruto)
+        compressao_id, nivel, hard_expiry_minutes = 0, 0, expiry_minutes
+    else:
+        (magic, versao, serializador_id, compressao_id, nivel,
+         timestamp, expiry_minutes, hard_expiry_minutes, count) = _CABECALHO.unpack_from(bruto)
+    if magic != _CABECALHO_MAGIC or versao not in (1, _CABECALHO_VERSAO):
+        raise ValueError(f"cabeçalho inválido ({magic!r}, versão {versao})")
+    
+    compressao = None
+    if compressao_id:
+        for algoritmo, algoritmo_id in COMPRESSORES.items():
+            if algoritmo_id == compressao_id:
+                compressao = algoritmo
+                break
+        else:
+            raise ValueError(f"compressão desconhecida: {compressao_id}")
+    
+    for nome, serializador in SERIALIZADORES.items():
+        if serializador["id"] == serializador_id:
+            break
+    else:
+        raise ValueError(f"serializador desconhecido: {serializador_id}")
+    
+    return {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+        "expiry_minutes": expiry_minutes,
+        "hard_expiry_minutes": hard_expiry_minutes,
+        "count": count,
+        "formato": nome,
+        "compressao": compressao,
+        "nivel": nivel,
+        "tamanho_cabecalho": formato_cabecalho.size
+    }
+
+
+def ler_cabecalho_cache(key):
+    """
+    Retorna os metadados de uma entrada (timestamp, expiry_minutes,
+    hard_expiry_minutes, count, formato, expirado) sem desserializar o payload.
+    Entradas JSON legadas não têm cabeçalho separado e precisam ser lidas inteiras.
+    """
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        linha = cache_sqlite.ler_cabecalho(key)
+        if not linha:
+            return None
+        timestamp, expira_em, expira_maximo_em, quantidade, _ = linha
+        return {
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "expiry_minutes": (expira_em - timestamp) / 60,
+            "hard_expiry_minutes": (expira_maximo_em - timestamp) / 60,
+            "count": quantidade,
+            "formato": "sqlite",
+            "expirado": datetime.now().timestamp() > expira_em
+        }
+    
+    cache_path = _localizar_cache(key)
+    if not cache_path:
+        return None
+    
+    try:
+        if cache_path.endswith(".bin"):
+            with open(cache_path, 'rb') as f:
+                cabecalho = _ler_cabecalho_binario(f)
+        else:
+            cache_entry = _memoria_obter(key, *_assinatura_arquivo(cache_path))
+            if cache_entry is None:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    cache_entry = json.load(f)
+            data = cache_entry.get("data")
+            expiry_minutes = cache_entry.get("expiry_minutes", CACHE_EXPIRY_MINUTES)
+            cabecalho = {
+                "timestamp": cache_entry["timestamp"],
+                "expiry_minutes": expiry_minutes,
+                "hard_expiry_minutes": cache_entry.get("hard_expiry_minutes", expiry_minutes),
+                "count": len(data) if isinstance(data, list) else 1,
+                "formato": "json"
+            }
+        
+        cabecalho["expirado"], _ = _entrada_expirada(cabecalho)
+        return cabecalho
+    except Exception as e:
+        print(f"[CACHE] Erro ao ler cabeçalho {key}: {e}")
+        return None
+
+
+def _assinatura_arquivo(cache_path):
+    """(mtime, tamanho) usados para validar o cache em memória"""
+    file_stat = os.stat(cache_path)
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+def _entrada_expirada(cache_entry):
+    """Retorna (expirado, idade_em_minutos) de uma entrada (pelo TTL normal)"""
+    cache_time = datetime.fromisoformat(cache_entry["timestamp"])
+    expiry_minutes = cache_entry.get("expiry_minutes", CACHE_EXPIRY_MINUTES)
+    age_minutes = (datetime.now() - cache_time).total_seconds() / 60
+    return datetime.now() - cache_time > timedelta(minutes=expiry_minutes), age_minutes
+
+
+def _entrada_vencida(cache_entry):
+    """True se a entrada passou do TTL máximo e não pode mais ser servida nem como velha"""
+    cache_time = datetime.fromisoformat(cache_entry["timestamp"])
+    expiry_minutes = cache_entry.get("expiry_minutes", CACHE_EXPIRY_MINUTES)
+    hard_expiry_minutes = cache_entry.get("hard_expiry_minutes", expiry_minutes)
+    return datetime.now() - cache_time > timedelta(minutes=max(expiry_minutes, hard_expiry_minutes))
+
+
+def _remover_arquivos_cache(key):
+    """Remove os arquivos da chave em todos os formatos"""
+    invalidar_cache_memoria(key)
+    removidos = 0
+    for formato in ("bin", "json"):
+        cache_path = _caminho_cache(key, formato)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+            removidos += 1
+    return removidos
+
+
+def remover_do_cache(key):
+    """Remove uma entrada do cache (memória e disco/SQLite)"""
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        cache_sqlite.remover_entradas(key)
+        invalidar_cache_memoria(key)
+        return
+    _remover_arquivos_cache(key)
+
+
+def save_to_cache(key, data, expiry_minutes=CACHE_EXPIRY_MINUTES, formato=None, hard_expiry_minutes=None,
+                  compressao=None):
+    """
+    Salva dados no cache.
+    
+    O formato vem de FORMATO_POR_CHAVE (ou do parâmetro formato): "json" grava o
+    formato legado; os serializadores binários gravam cabeçalho fixo + payload.
+    A compressão ((algoritmo, nível)) vem de COMPRESSAO_POR_CHAVE (ou do
+    parâmetro compressao) e fica registrada no cabeçalho; o JSON nunca é comprimido.
+    
+    Depois de expiry_minutes a entrada fica "velha": read_from_cache deixa de
+    retorná-la, mas ler_cache_com_estado / obter_com_revalidacao ainda a servem
+    até hard_expiry_minutes (padrão: igual a expiry_minutes, sem janela).
+    """
+    if hard_expiry_minutes is None or hard_expiry_minutes < expiry_minutes:
+        hard_expiry_minutes = expiry_minutes
+    
+    inicio = time.perf_counter()
+    try:
+        if CACHE_BACKEND == "sqlite":
+            return _save_to_sqlite(key, data, expiry_minutes, hard_expiry_minutes)
+        return _salvar_cache_arquivo(key, data, expiry_minutes, formato, hard_expiry_minutes, compressao)
+    finally:
+        observar_latencia(key, "escrita", time.perf_counter() - inicio)
+
+
+def _salvar_cache_arquivo(key, data, expiry_minutes, formato, hard_expiry_minutes, compressao):
+    """save_to_cache para o backend de arquivos"""
+    
+    formato = formato or _formato_para(key)
+    cache_path = _caminho_cache(key, formato)
     
     # Garantir que o diretório existe
     if not os.path.exists(CACHE_DIR):
         os.makedirs(CACHE_DIR)
         print(f"[CACHE] Diretório criado: {CACHE_DIR}")
     
-    cache_entry = {
-        "timestamp": datetime.now().isoformat(),
-        "expiry_minutes": expiry_minutes,
-        "data": data
-    }
+    data_count = len(data) if isinstance(data, list) else 1
+    agora = datetime.now()
+    
     try:
         # Usar arquivo temporário para evitar corrupção
         import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', dir=CACHE_DIR, delete=False, encoding='utf-8') as tmp:
-            json.dump(cache_entry, tmp, ensure_ascii=False)
-            temp_path = tmp.name
+        if formato == "json":
+            cache_entry = {
+                "timestamp": agora.isoformat(),
+                "expiry_minutes": expiry_minutes,
+                "hard_expiry_minutes": hard_expiry_minutes,
+                "data": data
+            }
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', dir=CACHE_DIR, delete=False, encoding='utf-8') as tmp:
+                json.dump(cache_entry, tmp, ensure_ascii=False)
+                temp_path = tmp.name
+        else:
+            serializador = SERIALIZADORES[formato]
+            compressao = compressao or _compressao_para(key)
+            if compressao:
+                compressao = (_algoritmo_disponivel(compressao[0]), compressao[1])
+            cabecalho = _CABECALHO.pack(
+                _CABECALHO_MAGIC, _CABECALHO_VERSAO, serializador["id"],
+                COMPRESSORES[compressao[0]] if compressao else 0, compressao[1] if compressao else 0,
+                agora.timestamp(), float(expiry_minutes), float(hard_expiry_minutes), data_count
+            )
+            with tempfile.NamedTemporaryFile(mode='wb', suffix='.bin', dir=CACHE_DIR, delete=False) as tmp:
+                tmp.write(cabecalho)
+                serializador["escrever"](tmp, data, compressao)
+                temp_path = tmp.name
         
         # Mover arquivo temporário para o destino final
-        import shutil
         shutil.move(temp_path, cache_path)
+        invalidar_cache_memoria(key)
         
-        data_count = len(data) if isinstance(data, list) else 1
-        print(f"[CACHE] Salvo com sucesso: {key} ({data_count} itens)")
+        # Remover arquivo da mesma chave em outro formato (ex.: JSON legado)
+        outro_path = _caminho_cache(key, "bin" if formato == "json" else "json")
+        if os.path.exists(outro_path):
+            os.remove(outro_path)
+        
+        registrar(key, "escritas")
+        registrar(key, "bytes_escritos", os.path.getsize(cache_path))
+        
+        descricao = formato if formato == "json" or not compressao else f"{formato}+{compressao[0]}"
+        print(f"[CACHE] Salvo com sucesso: {key} ({data_count} itens, {descricao})")
         return True
     except Exception as e:
         print(f"[CACHE] Erro ao salvar cache {key}: {e}")
@@ -60,69 +602,847 @@ def save_to_cache(key, data, expiry_minutes=CACHE_EXPIRY_MINUTES):
         return False
 
 def read_from_cache(key):
-    """Lê dados do cache"""
-    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+    """
+    Lê dados do cache.
     
-    if not os.path.exists(cache_path):
-        print(f"[CACHE] Arquivo não existe: {cache_path}")
+    Lê tanto o formato binário quanto o JSON legado. No binário a validade é
+    verificada só pelo cabeçalho, sem desserializar o payload.
+    
+    Entradas já lidas ficam parseadas em memória enquanto o arquivo não mudar
+    (mesmo mtime e tamanho), então o retorno é compartilhado entre chamadas:
+    não altere o objeto retornado, faça uma cópia antes.
+    """
+    data, estado = ler_cache_com_estado(key)
+    if estado == "velho":
         return None
+    return data
+
+
+def ler_cache_com_estado(key):
+    """
+    Como read_from_cache, mas também serve entradas velhas (entre expiry_minutes e
+    hard_expiry_minutes). Retorna (data, estado) com estado "fresco" ou "velho";
+    (None, None) se a entrada não existe, está corrompida ou passou do TTL máximo.
+    """
+    inicio = time.perf_counter()
+    try:
+        if CACHE_BACKEND == "sqlite":
+            return _read_from_sqlite(key)
+        return _ler_cache_arquivo(key)
+    finally:
+        observar_latencia(key, "leitura", time.perf_counter() - inicio)
+
+
+def _ler_cache_arquivo(key):
+    """ler_cache_com_estado para o backend de arquivos"""
+    cache_path = _localizar_cache(key)
+    
+    if not cache_path:
+        invalidar_cache_memoria(key)
+        registrar(key, "misses")
+        print(f"[CACHE] Arquivo não existe: {_caminho_cache(key, _formato_para(key))}")
+        return None, None
     
     try:
-        file_size = os.path.getsize(cache_path)
-        print(f"[CACHE] Lendo {key} ({file_size} bytes)...")
+        mtime, file_size = _assinatura_arquivo(cache_path)
+        cache_entry = _memoria_obter(key, mtime, file_size)
+        origem = "memória"
         
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            cache_entry = json.load(f)
+        if cache_entry is None:
+            print(f"[CACHE] Lendo {key} ({file_size} bytes)...")
+            
+            if cache_path.endswith(".bin"):
+                with open(cache_path, 'rb') as f:
+                    cache_entry = _ler_cabecalho_binario(f)
+                    
+                    if _entrada_vencida(cache_entry):
+                        _, age_minutes = _entrada_expirada(cache_entry)
+                        registrar(key, "expiracoes")
+                        registrar(key, "misses")
+                        print(f"[CACHE] Cache {key} expirado (idade: {age_minutes:.1f}min, expira: {cache_entry['hard_expiry_minutes']}min)")
+                        return None, None
+                    
+                    cache_entry["data"] = SERIALIZADORES[cache_entry["formato"]]["ler"](f, cache_entry)
+            else:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    cache_entry = json.load(f)
+            
+            # JSON não tem compressão: o arquivo inteiro é o payload
+            _memoria_guardar(key, mtime, file_size, cache_entry, cache_entry.get("tamanho_payload", file_size))
+            origem = "disco"
+            registrar(key, "bytes_lidos", file_size)
         
-        cache_time = datetime.fromisoformat(cache_entry["timestamp"])
+        expirado, age_minutes = _entrada_expirada(cache_entry)
         expiry_minutes = cache_entry.get("expiry_minutes", CACHE_EXPIRY_MINUTES)
         
-        age_minutes = (datetime.now() - cache_time).total_seconds() / 60
-        
-        if datetime.now() - cache_time > timedelta(minutes=expiry_minutes):
+        if _entrada_vencida(cache_entry):
+            registrar(key, "expiracoes")
+            registrar(key, "misses")
             print(f"[CACHE] Cache {key} expirado (idade: {age_minutes:.1f}min, expira: {expiry_minutes}min)")
-            return None
+            invalidar_cache_memoria(key)
+            return None, None
         
         data = cache_entry["data"]
+        _ultimos_acessos[key] = datetime.now().timestamp()
+        if expirado:
+            registrar(key, "velhos")
+            print(f"[CACHE] Cache {key} velho (idade: {age_minutes:.1f}min, expira: {expiry_minutes}min)")
+            return data, "velho"
+        
+        registrar(key, "hits")
+        registrar(key, "hits_memoria" if origem == "memória" else "hits_disco")
         data_count = len(data) if isinstance(data, list) else 1
-        print(f"[CACHE] Lido com sucesso: {key} ({data_count} itens, idade: {age_minutes:.1f}min)")
-        return data
-    except json.JSONDecodeError as e:
+        print(f"[CACHE] Lido com sucesso: {key} ({data_count} itens, idade: {age_minutes:.1f}min, {origem})")
+        return data, "fresco"
+    except (json.JSONDecodeError, pickle.UnpicklingError, EOFError, ValueError) as e:
+        registrar(key, "corrompidos")
+        registrar(key, "misses")
         print(f"[CACHE] Arquivo corrompido {key}: {e}")
+        invalidar_cache_memoria(key)
         print(f"[CACHE] Deletando cache corrompido: {cache_path}")
         try:
             os.remove(cache_path)
             print(f"[CACHE] Cache {key} deletado com sucesso")
         except Exception as del_err:
             print(f"[CACHE] Erro ao deletar cache: {del_err}")
-        return None
+        return None, None
     except Exception as e:
+        registrar(key, "misses")
         print(f"[CACHE] Erro ao ler cache {key}: {e}")
         import traceback
         traceback.print_exc()
+        return None, None
+
+
+# ==================== STALE-WHILE-REVALIDATE ====================
+# Threads que atualizam entradas velhas em segundo plano. As chaves pendentes são
+# limitadas para que uma onda de entradas vencendo juntas não vire uma fila sem fim.
+CACHE_REVALIDACAO_WORKERS = int(os.environ.get('CACHE_REVALIDACAO_WORKERS', 2))
+CACHE_REVALIDACAO_MAX_PENDENTES = int(os.environ.get('CACHE_REVALIDACAO_MAX_PENDENTES', 200))
+
+_revalidacao_executor = None
+_revalidacoes_pendentes = set()
+_revalidacao_lock = threading.Lock()
+
+
+def agendar_revalidacao(chave, funcao, *args, **kwargs):
+    """
+    Agenda funcao(*args, **kwargs) em segundo plano, no máximo uma vez por chave
+    ao mesmo tempo. Retorna False se a chave já está pendente ou a fila está cheia.
+    """
+    global _revalidacao_executor
+    
+    with _revalidacao_lock:
+        if chave in _revalidacoes_pendentes:
+            return False
+        if len(_revalidacoes_pendentes) >= CACHE_REVALIDACAO_MAX_PENDENTES:
+            print(f"[CACHE] Fila de revalidação cheia, ignorando '{chave}'")
+            return False
+        if _revalidacao_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _revalidacao_executor = ThreadPoolExecutor(
+                max_workers=CACHE_REVALIDACAO_WORKERS, thread_name_prefix="revalidacao"
+            )
+        _revalidacoes_pendentes.add(chave)
+    
+    def tarefa():
+        try:
+            executar_unico(chave, funcao, *args, **kwargs)
+        except Exception as e:
+            print(f"[CACHE] Erro ao revalidar '{chave}': {e}")
+        finally:
+            with _revalidacao_lock:
+                _revalidacoes_pendentes.discard(chave)
+    
+    _revalidacao_executor.submit(tarefa)
+    return True
+
+
+def obter_com_revalidacao(key, buscar, expiry_minutes=CACHE_EXPIRY_MINUTES, hard_expiry_minutes=None, formato=None):
+    """
+    Lê key do cache com stale-while-revalidate.
+    
+    buscar() (sem argumentos) retorna o valor novo, ou None se falhar (nesse caso
+    nada é gravado). Entrada fresca: retorna direto. Entrada velha: retorna na hora
+    e agenda buscar() em segundo plano. Sem entrada: chama buscar() agora, com
+    chamadas concorrentes compartilhando a mesma busca.
+    """
+    data, estado = ler_cache_com_estado(key)
+    if estado == "fresco":
+        return data
+    
+    def atualizar():
+        novo = buscar()
+        if novo is not None:
+            save_to_cache(key, novo, expiry_minutes, formato=formato, hard_expiry_minutes=hard_expiry_minutes)
+        return novo
+    
+    if estado == "velho":
+        agendar_revalidacao(key, atualizar)
+        return data
+    
+    return executar_unico(key, atualizar)
+
+
+# ==================== SNAPSHOT SOMENTE LEITURA (MMAP) ====================
+
+class SnapshotContas:
+    """
+    Visão somente leitura de uma entrada no formato "registros" via mmap.
+    
+    Funciona como uma sequência: len() vem do cabeçalho e cada item só é
+    desserializado quando acessado, então várias requisições compartilham as
+    mesmas páginas do arquivo em vez de cada uma manter sua cópia da lista.
+    """
+    
+    def __init__(self, cache_path):
+        with open(cache_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        self.cabecalho = _decodificar_cabecalho(self._mmap[:_CABECALHO.size])
+        if self.cabecalho["formato"] != "registros":
+            raise ValueError(f"formato {self.cabecalho['formato']} não suporta snapshot")
+        
+        self._total = self.cabecalho["count"]
+        self._compressao = self.cabecalho["compressao"]
+        self._dados = memoryview(self._mmap)[self.cabecalho["tamanho_cabecalho"]:]
+        tamanho_tabela = (self._total + 1) * 8
+        self._offsets = self._dados[len(self._dados) - tamanho_tabela:].cast("Q")
+    
+    def __len__(self):
+        return self._total
+    
+    def __getitem__(self, indice):
+        if indice < 0:
+            indice += self._total
+        if not 0 <= indice < self._total:
+            raise IndexError(indice)
+        bloco = self._dados[self._offsets[indice]:self._offsets[indice + 1]]
+        if self._compressao:
+            bloco = _descomprimir_bloco(bloco, self._compressao)
+        return pickle.loads(bloco)
+    
+    def __iter__(self):
+        for indice in range(self._total):
+            yield self[indice]
+    
+    @property
+    def expirado(self):
+        expirado, _ = _entrada_expirada(self.cabecalho)
+        return expirado
+
+
+_snapshots_abertos = {}  # key -> (assinatura do arquivo, SnapshotContas)
+_snapshots_lock = threading.Lock()
+
+
+def abrir_snapshot_contas(key):
+    """
+    Retorna um SnapshotContas da entrada (ou None se não existir, estiver expirada
+    ou não estiver no formato "registros"). O mapeamento é reaproveitado enquanto
+    o arquivo não mudar; um save_to_cache novo substitui o arquivo e as
+    requisições em andamento continuam usando o mapeamento antigo.
+    """
+    if CACHE_BACKEND == "sqlite":
+        return None
+    
+    cache_path = _caminho_cache(key, "bin")
+    try:
+        file_stat = os.stat(cache_path)
+    except FileNotFoundError:
+        registrar(key, "misses")
         return None
+    assinatura = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+    
+    origem = "hits_memoria"
+    with _snapshots_lock:
+        aberto = _snapshots_abertos.get(key)
+        if aberto is None or aberto[0] != assinatura:
+            try:
+                aberto = (assinatura, SnapshotContas(cache_path))
+            except Exception as e:
+                print(f"[CACHE] Erro ao abrir snapshot {key}: {e}")
+                _snapshots_abertos.pop(key, None)
+                registrar(key, "corrompidos")
+                registrar(key, "misses")
+                return None
+            _snapshots_abertos[key] = aberto
+            origem = "hits_disco"
+    
+    snapshot = aberto[1]
+    if snapshot.expirado:
+        registrar(key, "expiracoes")
+        registrar(key, "misses")
+        return None
+    registrar(key, "hits")
+    registrar(key, origem)
+    _ultimos_acessos[key] = datetime.now().timestamp()
+    return snapshot
+
+
+def _save_to_sqlite(key, data, expiry_minutes, hard_expiry_minutes):
+    """save_to_cache para o backend SQLite"""
+    from core import cache_sqlite
+    try:
+        cache_sqlite.salvar_entrada(key, data, expiry_minutes, hard_expiry_minutes)
+        invalidar_cache_memoria(key)
+        registrar(key, "escritas")
+        data_count = len(data) if isinstance(data, list) else 1
+        print(f"[CACHE] Salvo com sucesso: {key} ({data_count} itens, sqlite)")
+        return True
+    except Exception as e:
+        print(f"[CACHE] Erro ao salvar cache {key} no SQLite: {e}")
+        return False
+
+
+def _read_from_sqlite(key):
+    """ler_cache_com_estado para o backend SQLite (validade vem das colunas, sem ler o payload)"""
+    from core import cache_sqlite
+    try:
+        linha = cache_sqlite.ler_cabecalho(key)
+        if not linha:
+            registrar(key, "misses")
+            print(f"[CACHE] Entrada não existe: {key}")
+            return None, None
+        
+        timestamp, expira_em, expira_maximo_em, quantidade, tamanho = linha
+        agora = datetime.now().timestamp()
+        age_minutes = (agora - timestamp) / 60
+        if agora > expira_maximo_em:
+            registrar(key, "expiracoes")
+            registrar(key, "misses")
+            print(f"[CACHE] Cache {key} expirado (idade: {age_minutes:.1f}min)")
+            invalidar_cache_memoria(key)
+            return None, None
+        
+        cache_entry = _memoria_obter(key, timestamp, tamanho)
+        origem = "memória"
+        if cache_entry is None:
+            cache_entry = {
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                "expiry_minutes": (expira_em - timestamp) / 60,
+                "hard_expiry_minutes": (expira_maximo_em - timestamp) / 60,
+                "data": cache_sqlite.ler_entrada(key)
+            }
+            # O blob no SQLite é o pickle sem compressão
+            _memoria_guardar(key, timestamp, tamanho, cache_entry, tamanho)
+            origem = "sqlite"
+            registrar(key, "bytes_lidos", tamanho)
+        
+        if agora > expira_em:
+            registrar(key, "velhos")
+            print(f"[CACHE] Cache {key} velho (idade: {age_minutes:.1f}min)")
+            return cache_entry["data"], "velho"
+        
+        registrar(key, "hits")
+        registrar(key, "hits_memoria" if origem == "memória" else "hits_disco")
+        print(f"[CACHE] Lido com sucesso: {key} ({quantidade} itens, idade: {age_minutes:.1f}min, {origem})")
+        return cache_entry["data"], "fresco"
+    except Exception as e:
+        registrar(key, "misses")
+        print(f"[CACHE] Erro ao ler cache {key} do SQLite: {e}")
+        return None, None
+
+
+# ==================== ARMAZÉM DE DETALHES (SEGMENTOS + ÍNDICE) ====================
+# Os detalhes de cada conta são anexados a um de DETALHES_NUM_SEGMENTOS arquivos
+# (escolhido por crc32 do seq). Um índice seq -> (segmento, offset, tamanho, timestamp,
+# expiry_minutes, hard_expiry_minutes) permite ler uma conta com um único seek, e a
+# varredura sequencial dos segmentos monta o conjunto de busca sem abrir milhares de arquivos.
+#
+# Registro: magic, tamanho do seq, tamanho do payload, timestamp, expiry_minutes,
+# hard_expiry_minutes, seq (utf-8) e payload (pickle; comprimido com zlib quando o
+# magic é "MHZ2"). Registros "MHD1" (sem hard_expiry_minutes) continuam sendo lidos.
+_REGISTRO_MAGIC = b"MHD2"
+_REGISTRO_MAGIC_ZLIB = b"MHZ2"
+_REGISTRO = struct.Struct("<4sHIddd")
+_REGISTRO_MAGIC_V1 = b"MHD1"
+_REGISTRO_V1 = struct.Struct("<4sHIdd")
+_DETALHES_INDICE_PATH = os.path.join(CACHE_DIR_DETALHES, "indice.json")
+_DETALHES_INDICE_SALVAR_A_CADA = 100
+
+# Janela (minutos) em que detalhes vencidos ainda podem ser servidos enquanto são
+# atualizados em segundo plano
+DETALHES_JANELA_VELHO_MINUTOS = int(os.environ.get('DETALHES_JANELA_VELHO_MINUTOS', 720))
+
+_indice_detalhes = None  # seq -> [segmento, offset, tamanho, timestamp, expiry_minutes, hard_expiry_minutes]
+_indice_fim_segmentos = {}  # segmento -> offset até onde o índice cobre
+_indice_alteracoes = 0
+_detalhes_lock = threading.RLock()
+
+
+def _caminho_segmento(segmento):
+    return os.path.join(CACHE_DIR_DETALHES, f"segmento_{segmento:02d}.dat")
+
+
+def _segmento_para(seq):
+    return zlib.crc32(str(seq).encode()) % DETALHES_NUM_SEGMENTOS
+
+
+def _ler_registro(f):
+    """
+    Lê um registro na posição atual do arquivo.
+    Retorna (seq, timestamp, expiry, hard_expiry, payload, comprimido) ou None
+    """
+    bruto = f.read(_REGISTRO_V1.size)
+    if len(bruto) < _REGISTRO_V1.size:
+        return None
+    
+    if bruto[:4] == _REGISTRO_MAGIC_V1:
+        _, tam_seq, tam_payload, timestamp, expiry_minutes = _REGISTRO_V1.unpack(bruto)
+        hard_expiry_minutes = expiry_minutes
+    elif bruto[:4] in (_REGISTRO_MAGIC, _REGISTRO_MAGIC_ZLIB):
+        bruto += f.read(_REGISTRO.size - _REGISTRO_V1.size)
+        if len(bruto) < _REGISTRO.size:
+            return None
+        _, tam_seq, tam_payload, timestamp, expiry_minutes, hard_expiry_minutes = _REGISTRO.unpack(bruto)
+    else:
+        raise ValueError("registro de detalhes inválido")
+    
+    seq = f.read(tam_seq).decode("utf-8")
+    payload = f.read(tam_payload)
+    if len(payload) < tam_payload:
+        return None
+    return seq, timestamp, expiry_minutes, hard_expiry_minutes, payload, bruto[:4] == _REGISTRO_MAGIC_ZLIB
+
+
+def _desserializar_registro(registro):
+    """Detalhes (dict) a partir de um registro lido por _ler_registro"""
+    payload = registro[4]
+    if registro[5]:
+        payload = zlib.decompress(payload)
+    return pickle.loads(payload)
+
+
+def _varrer_segmento(segmento, inicio=0):
+    """Percorre um segmento a partir de um offset, atualizando o índice em memória"""
+    cache_path = _caminho_segmento(segmento)
+    if not os.path.exists(cache_path):
+        _indice_fim_segmentos[segmento] = 0
+        return
+    
+    with open(cache_path, 'rb') as f:
+        f.seek(inicio)
+        offset = inicio
+        while True:
+            try:
+                registro = _ler_registro(f)
+            except ValueError:
+                registro = None
+            if registro is None:
+                break
+            seq, timestamp, expiry_minutes, hard_expiry_minutes = registro[:4]
+            fim = f.tell()
+            _indice_detalhes[seq] = [segmento, offset, fim - offset, timestamp, expiry_minutes, hard_expiry_minutes]
+            offset = fim
+    
+    # Registro incompleto no final (queda durante escrita): descartar
+    if offset < os.path.getsize(cache_path):
+        print(f"[DETALHES] Truncando final incompleto do segmento {segmento} em {offset} bytes")
+        with open(cache_path, 'r+b') as f:
+            f.truncate(offset)
+    _indice_fim_segmentos[segmento] = offset
+
+
+def _carregar_indice_detalhes():
+    """Carrega o índice do disco (uma vez) e completa com registros mais novos que ele"""
+    global _indice_detalhes, _indice_fim_segmentos
+    
+    if _indice_detalhes is not None:
+        return
+    
+    _indice_detalhes = {}
+    _indice_fim_segmentos = {}
+    
+    if os.path.exists(_DETALHES_INDICE_PATH):
+        try:
+            with open(_DETALHES_INDICE_PATH, 'r', encoding='utf-8') as f:
+                indice = json.load(f)
+            _indice_detalhes = indice.get("contas", {})
+            # Índices antigos não tinham hard_expiry_minutes
+            for entrada in _indice_detalhes.values():
+                if len(entrada) == 5:
+                    entrada.append(entrada[4])
+            _indice_fim_segmentos = {int(k): v for k, v in indice.get("segmentos", {}).items()}
+        except Exception as e:
+            print(f"[DETALHES] Índice corrompido, reconstruindo a partir dos segmentos: {e}")
+            _indice_detalhes = {}
+            _indice_fim_segmentos = {}
+    
+    for segmento in range(DETALHES_NUM_SEGMENTOS):
+        _varrer_segmento(segmento, _indice_fim_segmentos.get(segmento, 0))
+    
+    print(f"[DETALHES] Índice carregado: {len(_indice_detalhes)} contas")
+
+
+def salvar_indice_detalhes():
+    """Grava o índice do armazém de detalhes no disco"""
+    global _indice_alteracoes
+    
+    if CACHE_BACKEND == "sqlite":
+        return True
+    
+    with _detalhes_lock:
+        if _indice_detalhes is None:
+            return False
+        try:
+            os.makedirs(CACHE_DIR_DETALHES, exist_ok=True)
+            import tempfile
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', dir=CACHE_DIR_DETALHES, delete=False, encoding='utf-8') as tmp:
+                json.dump({"segmentos": _indice_fim_segmentos, "contas": _indice_detalhes}, tmp)
+                temp_path = tmp.name
+            os.replace(temp_path, _DETALHES_INDICE_PATH)
+            _indice_alteracoes = 0
+            return True
+        except Exception as e:
+            print(f"[DETALHES] Erro ao salvar índice: {e}")
+            return False
+
+
+def salvar_detalhes_conta(seq, detalhes, expiry_minutes=CACHE_EXPIRY_MINUTES, hard_expiry_minutes=None):
+    """
+    Anexa os detalhes de uma conta ao seu segmento e atualiza o índice.
+    hard_expiry_minutes padrão: expiry_minutes + DETALHES_JANELA_VELHO_MINUTOS.
+    """
+    global _indice_alteracoes
+    
+    if hard_expiry_minutes is None:
+        hard_expiry_minutes = expiry_minutes + DETALHES_JANELA_VELHO_MINUTOS
+    hard_expiry_minutes = max(expiry_minutes, hard_expiry_minutes)
+    inicio = time.perf_counter()
+    
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        try:
+            cache_sqlite.salvar_detalhes_conta(seq, detalhes, expiry_minutes, hard_expiry_minutes)
+            registrar("detalhes", "escritas")
+            observar_latencia("detalhes", "escrita", time.perf_counter() - inicio)
+            return True
+        except Exception as e:
+            print(f"[DETALHES] Erro ao salvar detalhes da conta {seq} no SQLite: {e}")
+            return False
+    
+    seq = str(seq)
+    seq_bytes = seq.encode("utf-8")
+    payload = pickle.dumps(detalhes, protocol=pickle.HIGHEST_PROTOCOL)
+    magic = _REGISTRO_MAGIC
+    if DETALHES_COMPRESSAO_NIVEL > 0:
+        payload = zlib.compress(payload, DETALHES_COMPRESSAO_NIVEL)
+        magic = _REGISTRO_MAGIC_ZLIB
+    timestamp = datetime.now().timestamp()
+    registro = _REGISTRO.pack(
+        magic, len(seq_bytes), len(payload), timestamp,
+        float(expiry_minutes), float(hard_expiry_minutes)
+    ) + seq_bytes + payload
+    
+    try:
+        with _detalhes_lock:
+            _carregar_indice_detalhes()
+            os.makedirs(CACHE_DIR_DETALHES, exist_ok=True)
+            
+            segmento = _segmento_para(seq)
+            with open(_caminho_segmento(segmento), 'ab') as f:
+                offset = f.tell()
+                f.write(registro)
+            
+            _indice_detalhes[seq] = [
+                segmento, offset, len(registro), timestamp, float(expiry_minutes), float(hard_expiry_minutes)
+            ]
+            _indice_fim_segmentos[segmento] = offset + len(registro)
+            
+            _indice_alteracoes += 1
+            if _indice_alteracoes >= _DETALHES_INDICE_SALVAR_A_CADA:
+                salvar_indice_detalhes()
+        registrar("detalhes", "escritas")
+        registrar("detalhes", "bytes_escritos", len(registro))
+        observar_latencia("detalhes", "escrita", time.perf_counter() - inicio)
+        return True
+    except Exception as e:
+        print(f"[DETALHES] Erro ao salvar detalhes da conta {seq}: {e}")
+        return False
+
+
+def _detalhes_expirado(entrada):
+    """True se passou do TTL normal (a entrada ainda pode ser servida como velha)"""
+    return datetime.now().timestamp() - entrada[3] > entrada[4] * 60
+
+
+def _detalhes_vencido(entrada):
+    """True se passou do TTL máximo e a entrada pode ser descartada"""
+    return datetime.now().timestamp() - entrada[3] > entrada[5] * 60
+
+
+def ler_detalhes_conta(seq):
+    """Lê os detalhes de uma conta (um seek no segmento). Retorna None se ausente ou expirado"""
+    detalhes, estado = ler_detalhes_conta_com_estado(seq)
+    if estado == "velho":
+        return None
+    return detalhes
+
+
+def ler_detalhes_conta_com_estado(seq):
+    """
+    Como ler_detalhes_conta, mas também serve detalhes velhos (até o TTL máximo).
+    Retorna (detalhes, "fresco"|"velho") ou (None, None).
+    """
+    inicio = time.perf_counter()
+    detalhes, estado = _ler_detalhes_conta(str(seq))
+    
+    if estado == "fresco":
+        registrar("detalhes", "hits")
+        registrar("detalhes", "hits_disco")
+    elif estado == "velho":
+        registrar("detalhes", "velhos")
+    else:
+        registrar("detalhes", "misses")
+    observar_latencia("detalhes", "leitura", time.perf_counter() - inicio)
+    return detalhes, estado
+
+
+def seqs_detalhes_expirados(seqs):
+    """Dos seqs informados, os que não têm detalhes frescos (ausentes ou além do TTL), sem ler os registros"""
+    seqs = {str(seq) for seq in seqs}
+    
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        try:
+            return seqs - cache_sqlite.seqs_detalhes_frescos()
+        except Exception as e:
+            print(f"[DETALHES] Erro ao consultar validade no SQLite: {e}")
+            return seqs
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        return {
+            seq for seq in seqs
+            if seq not in _indice_detalhes or _detalhes_expirado(_indice_detalhes[seq])
+        }
+
+
+def _ler_detalhes_conta(seq):
+    """ler_detalhes_conta_com_estado sem as métricas"""
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        try:
+            detalhes, estado = cache_sqlite.ler_detalhes_conta_com_estado(seq)
+            if detalhes is None:
+                detalhes = _migrar_detalhes_legado(seq)
+                estado = "fresco" if detalhes else None
+            return detalhes, estado
+        except Exception as e:
+            print(f"[DETALHES] Erro ao ler conta {seq} do SQLite: {e}")
+            return None, None
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        entrada = _indice_detalhes.get(seq)
+    
+    if entrada is None:
+        detalhes = _migrar_detalhes_legado(seq)
+        return detalhes, ("fresco" if detalhes else None)
+    
+    # A leitura do segmento é feita sem o lock. Se falhar e o índice não tiver
+    # mais a mesma entrada (compactação ou gravação mais nova no meio), tenta de
+    # novo com a entrada atual; só descarta a entrada se foi ela que falhou.
+    for _ in range(3):
+        if _detalhes_vencido(entrada):
+            registrar("detalhes", "expiracoes")
+            return None, None
+        
+        segmento, offset = entrada[0], entrada[1]
+        try:
+            with open(_caminho_segmento(segmento), 'rb') as f:
+                f.seek(offset)
+                registro = _ler_registro(f)
+            if registro is None or registro[0] != seq:
+                raise ValueError("índice aponta para registro diferente")
+            registrar("detalhes", "bytes_lidos", entrada[2])
+            return _desserializar_registro(registro), ("velho" if _detalhes_expirado(entrada) else "fresco")
+        except Exception as e:
+            with _detalhes_lock:
+                atual = _indice_detalhes.get(seq)
+                if atual is entrada:
+                    _indice_detalhes.pop(seq, None)
+            if atual is entrada:
+                registrar("detalhes", "corrompidos")
+                print(f"[DETALHES] Erro ao ler conta {seq}: {e}")
+                return None, None
+            if atual is None:
+                return None, None
+            entrada = atual
+    
+    return None, None
+
+
+def _migrar_detalhes_legado(seq):
+    """Move um arquivo legado detalhes_{seq}_equip.json para o armazém, se existir"""
+    cache_key = f"detalhes_{seq}_equip"
+    if not _localizar_cache(cache_key):
+        return None
+    
+    detalhes = read_from_cache(cache_key)
+    if detalhes:
+        salvar_detalhes_conta(seq, detalhes)
+    _remover_arquivos_cache(cache_key)
+    return detalhes
+
+
+def iterar_detalhes_contas(incluir_expirados=False):
+    """
+    Percorre sequencialmente todos os segmentos, gerando (seq, detalhes) das
+    versões mais recentes de cada conta.
+    """
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        yield from cache_sqlite.iterar_detalhes_contas(incluir_expirados)
+        return
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        por_segmento = {}
+        for seq, entrada in _indice_detalhes.items():
+            if incluir_expirados or not _detalhes_expirado(entrada):
+                por_segmento.setdefault(entrada[0], []).append((entrada[1], seq))
+    
+    for segmento in sorted(por_segmento):
+        offsets = sorted(por_segmento[segmento])
+        try:
+            with open(_caminho_segmento(segmento), 'rb') as f:
+                for offset, seq in offsets:
+                    f.seek(offset)
+                    registro = _ler_registro(f)
+                    if registro is None or registro[0] != seq:
+                        continue
+                    yield seq, _desserializar_registro(registro)
+        except Exception as e:
+            print(f"[DETALHES] Erro ao varrer segmento {segmento}: {e}")
+
+
+def total_detalhes_contas():
+    """Quantidade de contas no índice do armazém"""
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        return cache_sqlite.total_detalhes_contas()
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        return len(_indice_detalhes)
+
+
+def compactar_detalhes():
+    """Reescreve os segmentos mantendo só a versão atual de cada conta (descarta as vencidas)"""
+    if CACHE_BACKEND == "sqlite":
+        return 0
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        
+        bytes_antes = sum(_indice_fim_segmentos.values())
+        novo_indice = {}
+        novo_fim = {}
+        
+        for segmento in range(DETALHES_NUM_SEGMENTOS):
+            origem = _caminho_segmento(segmento)
+            if not os.path.exists(origem):
+                continue
+            
+            vivos = sorted(
+                (entrada[1], seq) for seq, entrada in _indice_detalhes.items()
+                if entrada[0] == segmento and not _detalhes_vencido(entrada)
+            )
+            
+            temp_path = origem + ".tmp"
+            with open(origem, 'rb') as f_origem, open(temp_path, 'wb') as f_destino:
+                for offset, seq in vivos:
+                    entrada = _indice_detalhes[seq]
+                    f_origem.seek(offset)
+                    novo_offset = f_destino.tell()
+                    f_destino.write(f_origem.read(entrada[2]))
+                    novo_indice[seq] = [segmento, novo_offset] + entrada[2:]
+                novo_fim[segmento] = f_destino.tell()
+            os.replace(temp_path, origem)
+        
+        _indice_detalhes.clear()
+        _indice_detalhes.update(novo_indice)
+        _indice_fim_segmentos.clear()
+        _indice_fim_segmentos.update(novo_fim)
+        salvar_indice_detalhes()
+        
+        bytes_depois = sum(novo_fim.values())
+        print(f"[DETALHES] Compactação: {bytes_antes} -> {bytes_depois} bytes ({len(novo_indice)} contas)")
+        return bytes_antes - bytes_depois
+
+
+def limpar_detalhes_contas():
+    """Remove segmentos e índice do armazém de detalhes"""
+    global _indice_detalhes, _indice_alteracoes
+    
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        cache_sqlite.limpar_detalhes_contas()
+        return
+    
+    with _detalhes_lock:
+        if os.path.exists(CACHE_DIR_DETALHES):
+            for nome in os.listdir(CACHE_DIR_DETALHES):
+                os.remove(os.path.join(CACHE_DIR_DETALHES, nome))
+        _indice_detalhes = None
+        _indice_fim_segmentos.clear()
+        _indice_alteracoes = 0
+
+
+def contas_alteradas_desde(timestamp):
+    """Retorna [(seq, timestamp)] das contas cujos detalhes foram gravados depois de timestamp (epoch)"""
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        return cache_sqlite.contas_alteradas_desde(timestamp)
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        alteradas = [(seq, entrada[3]) for seq, entrada in _indice_detalhes.items() if entrada[3] > timestamp]
+    return sorted(alteradas, key=lambda x: x[1])
+
+
+def expirar_cache():
+    """Remove entradas expiradas do backend. Retorna a quantidade removida"""
+    if CACHE_BACKEND == "sqlite":
+        from core import cache_sqlite
+        entradas, contas = cache_sqlite.expirar_entradas()
+        invalidar_cache_memoria()
+        print(f"[CACHE] Expiradas {entradas} entradas e {contas} contas no SQLite")
+        return entradas + contas
+    
+    with _detalhes_lock:
+        _carregar_indice_detalhes()
+        expiradas = sum(1 for entrada in _indice_detalhes.values() if _detalhes_vencido(entrada))
+    if expiradas:
+        compactar_detalhes()
+    return expiradas
+
 
 def limpar_cache_contas():
     """Limpa apenas os arquivos de cache relacionados a contas"""
     try:
+        if CACHE_BACKEND == "sqlite":
+            from core import cache_sqlite
+            cache_sqlite.remover_entradas(
+                "contas_completas", "contas_teste", "status_disponiveis",
+                "detalhes_%_equip", "lista_contas_page_%"
+            )
+            invalidar_cache_memoria()
+        
         # Arquivos principais de contas
         cache_files = ["contas_completas", "contas_teste", "status_disponiveis"]
         for cache_key in cache_files:
-            cache_path = os.path.join(CACHE_DIR, f"{cache_key}.json")
-            if os.path.exists(cache_path):
-                os.remove(cache_path)
-                print(f"[CACHE] Arquivo {cache_key}.json removido")
-        
-        # Limpa cache de detalhes de contas
-        detalhes_files = glob.glob(os.path.join(CACHE_DIR, "detalhes_*_equip.json"))
-        for file_path in detalhes_files:
-            os.remove(file_path)
-            
-        # Limpa cache de lista de contas
-        lista_files = glob.glob(os.path.join(CACHE_DIR, "lista_contas_page_*.json"))
-        for file_path in lista_files:
-            os.remove(file_path)
-            
+            if _remover_arquivos_cache(cache_key):
+                print(f"[CACHE] Arquivo {cache_key} removido")
+        
+        # Limpa cache de detalhes de contas e de lista de contas
+        for padrao in ("detalhes_*_equip.*", "lista_contas_page_*.*"):
+            for file_path in glob.glob(os.path.join(CACHE_DIR, padrao)):
+                _remover_arquivos_cache(os.path.splitext(os.path.basename(file_path))[0])
+        
+        limpar_detalhes_contas()
         return True
     except Exception as e:
         print(f"[ERRO] Erro ao limpar cache de contas: {e}")
@@ -132,12 +1452,212 @@ def limpar_cache_contas():
 def limpar_todo_cache():
     """Limpa todo o cache incluindo WEMIX"""
     try:
+        invalidar_cache_memoria()
+        limpar_detalhes_contas()
+        if CACHE_BACKEND == "sqlite":
+            from core import cache_sqlite
+            cache_sqlite.fechar_conexoes()
         if os.path.exists(CACHE_DIR):
             shutil.rmtree(CACHE_DIR)
             os.makedirs(CACHE_DIR)
+            os.makedirs(CACHE_DIR_DETALHES)
             print("[CACHE] Todo o cache foi limpo")
             return True
         return False
     except Exception as e:
         print(f"[ERRO] Erro ao limpar todo o cache: {e}")
         return False
+
+
+# ==================== FAXINA EM SEGUNDO PLANO ====================
+# Remove entradas vencidas e temporários órfãos e mantém CACHE_DIR dentro de um
+# orçamento de bytes, removendo primeiro as vencidas e depois as lidas há mais tempo.
+CACHE_DISCO_MAX_BYTES = int(os.environ.get('CACHE_DISCO_MAX_BYTES', 1024 * 1024 * 1024))
+CACHE_FAXINA_INTERVALO = int(os.environ.get('CACHE_FAXINA_INTERVALO', 900))  # segundos
+
+# Temporários mais novos que isso podem ser de uma escrita em andamento
+_FAXINA_IDADE_TEMPORARIO = 15 * 60
+
+# Chaves que a faxina só remove quando vencem (nunca por orçamento)
+_FAXINA_PRESERVAR = ("contas_completas", "contas_teste", "status_disponiveis")
+
+_faxina_ativa = False
+_faxina_thread = None
+_faxina_lock = threading.Lock()
+_faxina_status = {
+    "execucoes": 0,
+    "ultima_execucao": None,
+    "bytes_recuperados": 0,
+    "arquivos_removidos": 0,
+    "vencidos_removidos": 0,
+    "removidos_por_orcamento": 0,
+    "temporarios_removidos": 0,
+    "bytes_em_disco": 0,
+    "ultimo_erro": None
+}
+
+
+def _faxina_remover_temporarios(agora):
+    """Remove temporários de escritas interrompidas. Retorna (arquivos, bytes)"""
+    padroes = (
+        os.path.join(CACHE_DIR, "tmp*"),
+        os.path.join(CACHE_DIR_DETALHES, "tmp*"),
+        os.path.join(CACHE_DIR_DETALHES, "*.tmp"),
+    )
+    arquivos, liberados = 0, 0
+    for padrao in padroes:
+        for file_path in glob.glob(padrao):
+            try:
+                file_stat = os.stat(file_path)
+                if agora - file_stat.st_mtime < _FAXINA_IDADE_TEMPORARIO:
+                    continue
+                os.remove(file_path)
+                arquivos += 1
+                liberados += file_stat.st_size
+            except OSError:
+                pass
+    return arquivos, liberados
+
+
+def _faxina_entradas():
+    """Lista [(key, caminho, tamanho, vencida)] das entradas de cache em CACHE_DIR"""
+    entradas = []
+    for file_path in glob.glob(os.path.join(CACHE_DIR, "*.bin")) + glob.glob(os.path.join(CACHE_DIR, "*.json")):
+        nome = os.path.basename(file_path)
+        if nome.startswith("tmp"):
+            continue
+        key = os.path.splitext(nome)[0]
+        try:
+            tamanho = os.path.getsize(file_path)
+            if file_path.endswith(".bin"):
+                with open(file_path, 'rb') as f:
+                    cache_entry = _ler_cabecalho_binario(f)
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    cache_entry = json.load(f)
+                # Arquivos de estado (ex.: status_carregamento.json) não são entradas de cache
+                if "data" not in cache_entry or "timestamp" not in cache_entry:
+                    continue
+            entradas.append((key, file_path, tamanho, _entrada_vencida(cache_entry)))
+        except (OSError, ValueError, KeyError):
+            # Corrompido ou ilegível: tratar como vencido
+            entradas.append((key, file_path, os.path.getsize(file_path) if os.path.exists(file_path) else 0, True))
+    return entradas
+
+
+def _tamanho_detalhes():
+    return sum(
+        os.path.getsize(file_path)
+        for file_path in glob.glob(os.path.join(CACHE_DIR_DETALHES, "*"))
+        if os.path.isfile(file_path)
+    )
+
+
+def faxina_cache():
+    """Executa uma passada da faxina. Retorna o resumo da passada"""
+    agora = datetime.now().timestamp()
+    resumo = {"vencidos": 0, "por_orcamento": 0, "temporarios": 0, "bytes": 0}
+    
+    with _faxina_lock:
+        temporarios, liberados = _faxina_remover_temporarios(agora)
+        resumo["temporarios"] += temporarios
+        resumo["bytes"] += liberados
+        
+        if CACHE_BACKEND == "sqlite":
+            resumo["vencidos"] += expirar_cache()
+        else:
+            # 1) Entradas vencidas (além do TTL máximo)
+            vivas = []
+            for key, file_path, tamanho, vencida in _faxina_entradas():
+                if vencida:
+                    _remover_arquivos_cache(key)
+                    _ultimos_acessos.pop(key, None)
+                    resumo["vencidos"] += 1
+                    resumo["bytes"] += tamanho
+                else:
+                    vivas.append((key, file_path, tamanho))
+            
+            # Detalhes vencidos: a compactação reescreve os segmentos sem eles
+            with _detalhes_lock:
+                _carregar_indice_detalhes()
+                detalhes_vencidos = sum(1 for entrada in _indice_detalhes.values() if _detalhes_vencido(entrada))
+            if detalhes_vencidos:
+                resumo["vencidos"] += detalhes_vencidos
+                resumo["bytes"] += max(0, compactar_detalhes())
+            
+            # 2) Orçamento: remover as lidas há mais tempo (mtime se nunca foi lida neste processo)
+            total = sum(tamanho for _, _, tamanho in vivas) + _tamanho_detalhes()
+            candidatas = sorted(
+                (e for e in vivas if not e[0].startswith(_FAXINA_PRESERVAR)),
+                key=lambda e: _ultimos_acessos.get(e[0]) or os.path.getmtime(e[1])
+            )
+            for key, _, tamanho in candidatas:
+                if total <= CACHE_DISCO_MAX_BYTES:
+                    break
+                _remover_arquivos_cache(key)
+                _ultimos_acessos.pop(key, None)
+                total -= tamanho
+                resumo["por_orcamento"] += 1
+                resumo["bytes"] += tamanho
+            
+            if total > CACHE_DISCO_MAX_BYTES:
+                print(f"[FAXINA] Ainda acima do orçamento: {total} > {CACHE_DISCO_MAX_BYTES} bytes (só restam entradas preservadas)")
+            _faxina_status["bytes_em_disco"] = total
+        
+        _faxina_status["execucoes"] += 1
+        _faxina_status["ultima_execucao"] = datetime.now().isoformat()
+        _faxina_status["bytes_recuperados"] += resumo["bytes"]
+        _faxina_status["arquivos_removidos"] += resumo["vencidos"] + resumo["por_orcamento"] + resumo["temporarios"]
+        _faxina_status["vencidos_removidos"] += resumo["vencidos"]
+        _faxina_status["removidos_por_orcamento"] += resumo["por_orcamento"]
+        _faxina_status["temporarios_removidos"] += resumo["temporarios"]
+    
+    if resumo["bytes"] or resumo["vencidos"]:
+        print(f"[FAXINA] {resumo['vencidos']} vencidos, {resumo['por_orcamento']} por orçamento, "
+              f"{resumo['temporarios']} temporários ({resumo['bytes']} bytes liberados)")
+    return resumo
+
+
+def _loop_faxina():
+    import time
+    print(f"[FAXINA] Iniciada - intervalo {CACHE_FAXINA_INTERVALO}s, orçamento {CACHE_DISCO_MAX_BYTES} bytes")
+    while _faxina_ativa:
+        try:
+            faxina_cache()
+            _faxina_status["ultimo_erro"] = None
+        except Exception as e:
+            print(f"[FAXINA] Erro: {e}")
+            _faxina_status["ultimo_erro"] = str(e)
+        
+        for _ in range(max(1, CACHE_FAXINA_INTERVALO // 5)):
+            if not _faxina_ativa:
+                break
+            time.sleep(5)
+
+
+def iniciar_faxina_cache():
+    """Inicia a faxina periódica em background"""
+    global _faxina_ativa, _faxina_thread
+    
+    if _faxina_ativa:
+        return False
+    
+    _faxina_ativa = True
+    _faxina_thread = threading.Thread(target=_loop_faxina, daemon=True)
+    _faxina_thread.start()
+    return True
+
+
+def parar_faxina_cache():
+    global _faxina_ativa
+    _faxina_ativa = False
+
+
+def get_status_faxina_cache():
+    """Contadores da faxina"""
+    return dict(
+        _faxina_status,
+        ativa=_faxina_ativa,
+        intervalo_segundos=CACHE_FAXINA_INTERVALO,
+        max_bytes=CACHE_DISCO_MAX_BYTES
+    )
@@ -0,0 +1,127 @@
+"""
+Métricas do cache em memória do processo (por prefixo de chave)
+
+Contadores de hits/misses/expirações/corrupções, bytes lidos e gravados e
+histogramas de latência de leitura e escrita. Tudo fica em dicionários
+protegidos por um lock; exportado como JSON ou texto no formato do Prometheus.
+"""
+import re
+import threading
+
+# Limites superiores (segundos) dos buckets dos histogramas de latência
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Eventos contados por prefixo
+EVENTOS = (
+    "hits", "hits_memoria", "hits_disco", "velhos", "misses",
+    "expiracoes", "corrompidos", "escritas", "bytes_lidos", "bytes_escritos"
+)
+
+_HASH_MD5 = re.compile(r"^[0-9a-f]{32}$")
+
+_contadores = {}   # prefixo -> {evento: valor}
+_histogramas = {}  # (prefixo, operacao) -> {"buckets": [...], "soma": s, "total": n}
+_lock = threading.Lock()
+
+
+def prefixo_da_chave(key):
+    """
+    Agrupa chaves por prefixo: tudo até o primeiro trecho com dígitos
+    (lista_contas_page_3 -> lista_contas_page, detalhes_123_equip -> detalhes).
+    Chaves geradas por get_cache_key (md5) viram "hash".
+    """
+    if _HASH_MD5.match(key):
+        return "hash"
+    partes = []
+    for parte in key.split("_"):
+        if any(c.isdigit() for c in parte):
+            break
+        partes.append(parte)
+    return "_".join(partes) or "outros"
+
+
+def registrar(key, evento, quantidade=1):
+    """Soma quantidade ao contador do evento no prefixo da chave"""
+    prefixo = prefixo_da_chave(key)
+    with _lock:
+        contadores = _contadores.get(prefixo)
+        if contadores is None:
+            contadores = _contadores[prefixo] = dict.fromkeys(EVENTOS, 0)
+        contadores[evento] += quantidade
+
+
+def observar_latencia(key, operacao, segundos):
+    """Registra a duração de uma operação ("leitura" ou "escrita")"""
+    chave = (prefixo_da_chave(key), operacao)
+    with _lock:
+        histograma = _histogramas.get(chave)
+        if histograma is None:
+            histograma = _histogramas[chave] = {
+                "buckets": [0] * len(BUCKETS_LATENCIA), "soma": 0.0, "total": 0
+            }
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if segundos <= limite:
+                histograma["buckets"][i] += 1
+                break
+        histograma["soma"] += segundos
+        histograma["total"] += 1
+
+
+def get_metricas():
+    """Retorna as métricas como dict (buckets cumulativos, como no Prometheus)"""
+    with _lock:
+        prefixos = {}
+        for prefixo, contadores in _contadores.items():
+            consultas = contadores["hits"] + contadores["velhos"] + contadores["misses"]
+            prefixos[prefixo] = dict(
+                contadores,
+                taxa_hit=round((contadores["hits"] + contadores["velhos"]) / consultas, 4) if consultas else None
+            )
+
+        latencias = {}
+        for (prefixo, operacao), histograma in _histogramas.items():
+            acumulado, buckets = 0, {}
+            for limite, quantidade in zip(BUCKETS_LATENCIA, histograma["buckets"]):
+                acumulado += quantidade
+                buckets[str(limite)] = acumulado
+            buckets["+Inf"] = histograma["total"]
+            latencias.setdefault(prefixo, {})[operacao] = {
+                "total": histograma["total"],
+                "soma_segundos": round(histograma["soma"], 6),
+                "media_ms": round(histograma["soma"] / histograma["total"] * 1000, 3) if histograma["total"] else None,
+                "buckets": buckets
+            }
+
+    return {"prefixos": prefixos, "latencias": latencias}
+
+
+def metricas_prometheus():
+    """Retorna as métricas no formato de texto do Prometheus"""
+    metricas = get_metricas()
+    linhas = [
+        "# HELP mirhunter_cache_eventos_total Eventos do cache por prefixo de chave",
+        "# TYPE mirhunter_cache_eventos_total counter"
+    ]
+    for prefixo, contadores in sorted(metricas["prefixos"].items()):
+        for evento in EVENTOS:
+            linhas.append(f'mirhunter_cache_eventos_total{{prefixo="{prefixo}",evento="{evento}"}} {contadores[evento]}')
+
+    linhas += [
+        "# HELP mirhunter_cache_latencia_segundos Latência de leitura e escrita do cache",
+        "# TYPE mirhunter_cache_latencia_segundos histogram"
+    ]
+    for prefixo, operacoes in sorted(metricas["latencias"].items()):
+        for operacao, histograma in sorted(operacoes.items()):
+            rotulos = f'prefixo="{prefixo}",operacao="{operacao}"'
+            for limite, quantidade in histograma["buckets"].items():
+                linhas.append(f'mirhunter_cache_latencia_segundos_bucket{{{rotulos},le="{limite}"}} {quantidade}')
+            linhas.append(f'mirhunter_cache_latencia_segundos_sum{{{rotulos}}} {histograma["soma_segundos"]}')
+            linhas.append(f'mirhunter_cache_latencia_segundos_count{{{rotulos}}} {histograma["total"]}')
+
+    return "\n".join(linhas) + "\n"
+
+
+def resetar_metricas():
+    with _lock:
+        _contadores.clear()
+        _histogramas.clear()
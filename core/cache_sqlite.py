@@ -0,0 +1,244 @@
+"""
+Backend SQLite do cache (ativado com CACHE_BACKEND=sqlite)
+
+Usado por core.cache por trás de save_to_cache / read_from_cache e das funções
+do armazém de detalhes. Roda em modo WAL para que as threads do gunicorn leiam
+enquanto o loader escreve.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+
+from core.cache import CACHE_DIR
+
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', os.path.join(CACHE_DIR, "cache.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entradas (
+    chave TEXT PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    expira_em REAL NOT NULL,
+    expira_maximo_em REAL,
+    quantidade INTEGER NOT NULL DEFAULT 1,
+    dados BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_entradas_expira_em ON cache_entradas (expira_em);
+
+CREATE TABLE IF NOT EXISTS contas_detalhes (
+    seq TEXT PRIMARY KEY,
+    nftID TEXT,
+    price REAL,
+    powerScore INTEGER,
+    class TEXT,
+    worldName TEXT,
+    updated_at REAL NOT NULL,
+    expira_em REAL NOT NULL,
+    expira_maximo_em REAL,
+    dados BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_contas_detalhes_updated_at ON contas_detalhes (updated_at);
+CREATE INDEX IF NOT EXISTS idx_contas_detalhes_expira_em ON contas_detalhes (expira_em);
+CREATE INDEX IF NOT EXISTS idx_contas_detalhes_nftid ON contas_detalhes (nftID);
+"""
+
+# Colunas acrescentadas depois da primeira versão do schema (tabela -> [(coluna, tipo)])
+_COLUNAS_NOVAS = {
+    "cache_entradas": [("expira_maximo_em", "REAL")],
+    "contas_detalhes": [("expira_maximo_em", "REAL")],
+}
+
+# Uma conexão por thread; a geração muda quando o arquivo é apagado (limpar_todo_cache)
+_local = threading.local()
+_geracao = 0
+
+
+def _conexao():
+    """Retorna a conexão da thread atual, criando o banco/schema se necessário"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "geracao", None) == _geracao:
+        return conn
+
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    os.makedirs(os.path.dirname(CACHE_SQLITE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(CACHE_SQLITE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _migrar_schema(conn)
+
+    _local.conn = conn
+    _local.geracao = _geracao
+    return conn
+
+
+def _migrar_schema(conn):
+    """Adiciona colunas novas em bancos criados por versões anteriores"""
+    for tabela, colunas in _COLUNAS_NOVAS.items():
+        existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+        for coluna, tipo in colunas:
+            if coluna not in existentes:
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+
+def fechar_conexoes():
+    """Força todas as threads a reabrirem a conexão (usar antes de apagar o arquivo)"""
+    global _geracao
+    _geracao += 1
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# ==================== ENTRADAS GENÉRICAS ====================
+
+def salvar_entrada(key, data, expiry_minutes, hard_expiry_minutes=None):
+    """Grava (ou substitui) uma entrada genérica"""
+    agora = datetime.now().timestamp()
+    quantidade = len(data) if isinstance(data, list) else 1
+    hard_expiry_minutes = max(expiry_minutes, hard_expiry_minutes or 0)
+    conn = _conexao()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entradas "
+            "(chave, timestamp, expira_em, expira_maximo_em, quantidade, dados) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, agora, agora + expiry_minutes * 60, agora + hard_expiry_minutes * 60, quantidade,
+             pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+
+
+def ler_cabecalho(key):
+    """Retorna (timestamp, expira_em, expira_maximo_em, quantidade, tamanho) sem ler o payload"""
+    return _conexao().execute(
+        "SELECT timestamp, expira_em, COALESCE(expira_maximo_em, expira_em), quantidade, length(dados) "
+        "FROM cache_entradas WHERE chave = ?",
+        (key,)
+    ).fetchone()
+
+
+def ler_entrada(key):
+    """Retorna os dados desserializados de uma entrada (sem verificar validade)"""
+    linha = _conexao().execute(
+        "SELECT dados FROM cache_entradas WHERE chave = ?", (key,)
+    ).fetchone()
+    return pickle.loads(linha[0]) if linha else None
+
+
+def remover_entradas(*padroes):
+    """Remove entradas cuja chave casa com algum dos padrões LIKE"""
+    conn = _conexao()
+    removidas = 0
+    with conn:
+        for padrao in padroes:
+            removidas += conn.execute(
+                "DELETE FROM cache_entradas WHERE chave LIKE ?", (padrao,)
+            ).rowcount
+    return removidas
+
+
+# ==================== DETALHES DE CONTAS ====================
+
+def salvar_detalhes_conta(seq, detalhes, expiry_minutes, hard_expiry_minutes=None):
+    """Upsert dos detalhes de uma conta, com as colunas usadas em consultas"""
+    agora = datetime.now().timestamp()
+    hard_expiry_minutes = max(expiry_minutes, hard_expiry_minutes or 0)
+    basic = detalhes.get("basic", {}) if isinstance(detalhes, dict) else {}
+    conn = _conexao()
+    with conn:
+        conn.execute(
+            "INSERT INTO contas_detalhes "
+            "(seq, nftID, price, powerScore, class, worldName, updated_at, expira_em, expira_maximo_em, dados) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(seq) DO UPDATE SET "
+            "nftID = excluded.nftID, price = excluded.price, powerScore = excluded.powerScore, "
+            "class = excluded.class, worldName = excluded.worldName, "
+            "updated_at = excluded.updated_at, expira_em = excluded.expira_em, "
+            "expira_maximo_em = excluded.expira_maximo_em, dados = excluded.dados",
+            (str(seq), str(detalhes.get("nftID", "")), detalhes.get("price", 0),
+             basic.get("powerScore", 0), str(detalhes.get("classe", "1")),
+             basic.get("worldName", ""), agora, agora + expiry_minutes * 60,
+             agora + hard_expiry_minutes * 60, pickle.dumps(detalhes, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+
+
+def ler_detalhes_conta(seq):
+    """Lê os detalhes de uma conta ainda válida"""
+    linha = _conexao().execute(
+        "SELECT dados FROM contas_detalhes WHERE seq = ? AND expira_em > ?",
+        (str(seq), datetime.now().timestamp())
+    ).fetchone()
+    return pickle.loads(linha[0]) if linha else None
+
+
+def ler_detalhes_conta_com_estado(seq):
+    """Retorna (detalhes, "fresco"|"velho") ou (None, None) se ausente ou além do TTL máximo"""
+    agora = datetime.now().timestamp()
+    linha = _conexao().execute(
+        "SELECT dados, expira_em FROM contas_detalhes "
+        "WHERE seq = ? AND COALESCE(expira_maximo_em, expira_em) > ?",
+        (str(seq), agora)
+    ).fetchone()
+    if not linha:
+        return None, None
+    return pickle.loads(linha[0]), ("fresco" if linha[1] > agora else "velho")
+
+
+def seqs_detalhes_frescos():
+    """Conjunto dos seqs com detalhes dentro do TTL normal"""
+    return {
+        linha[0] for linha in _conexao().execute(
+            "SELECT seq FROM contas_detalhes WHERE expira_em > ?", (datetime.now().timestamp(),)
+        )
+    }
+
+
+def iterar_detalhes_contas(incluir_expirados=False):
+    """Gera (seq, detalhes) de todas as contas (válidas, por padrão)"""
+    limite = 0 if incluir_expirados else datetime.now().timestamp()
+    cursor = _conexao().execute(
+        "SELECT seq, dados FROM contas_detalhes WHERE expira_em > ? ORDER BY rowid", (limite,)
+    )
+    for seq, dados in cursor:
+        yield seq, pickle.loads(dados)
+
+
+def total_detalhes_contas():
+    return _conexao().execute("SELECT COUNT(*) FROM contas_detalhes").fetchone()[0]
+
+
+def contas_alteradas_desde(timestamp):
+    """Retorna [(seq, updated_at)] das contas atualizadas depois de timestamp (epoch)"""
+    return _conexao().execute(
+        "SELECT seq, updated_at FROM contas_detalhes WHERE updated_at > ? ORDER BY updated_at",
+        (timestamp,)
+    ).fetchall()
+
+
+def limpar_detalhes_contas():
+    conn = _conexao()
+    with conn:
+        conn.execute("DELETE FROM contas_detalhes")
+
+
+# ==================== MANUTENÇÃO ====================
+
+def expirar_entradas():
+    """Remove entradas e detalhes além do TTL máximo. Retorna (entradas, contas) removidas"""
+    agora = datetime.now().timestamp()
+    conn = _conexao()
+    with conn:
+        entradas = conn.execute(
+            "DELETE FROM cache_entradas WHERE COALESCE(expira_maximo_em, expira_em) <= ?", (agora,)
+        ).rowcount
+        contas = conn.execute(
+            "DELETE FROM contas_detalhes WHERE COALESCE(expira_maximo_em, expira_em) <= ?", (agora,)
+        ).rowcount
+    return entradas, contas
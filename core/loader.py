@@ -4,17 +4,21 @@ Funções de carregamento de contas com threading
 import os
 import json
 import time
+import queue
 import threading
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 from core.api import buscar_todas_contas, buscar_detalhes_conta
 from core.cache import (
-    CACHE_DIR, CACHE_DIR_DETALHES, 
-    save_to_cache, read_from_cache, limpar_cache_contas
+    CACHE_DIR, save_to_cache, read_from_cache, remover_do_cache, limpar_cache_contas,
+    abrir_snapshot_contas, ler_detalhes_conta, ler_detalhes_conta_com_estado, iterar_detalhes_contas,
+    seqs_detalhes_expirados,
+    salvar_indice_detalhes, compactar_detalhes
 )
 from core.filters import hash_status
 from core.constants import NOMES_BLOQUEADOS, STATUS_DISPONIVEIS
+from core.busca import registrar_indice, descartar_indice, montar_registro_busca
 
 # Variáveis globais para controle de carregamento
 contas_detalhadas_global = []
@@ -25,13 +29,44 @@ lock = threading.Lock()
 
 # Controle de auto-renovação
 AUTO_RENOVACAO_INTERVALO = 3 * 60 * 60  # 3 horas em segundos
+# Renovação completa (recarrega os detalhes de todas as contas); nas demais é incremental
+AUTO_RENOVACAO_COMPLETA_INTERVALO = int(os.environ.get('AUTO_RENOVACAO_COMPLETA_HORAS', 24)) * 60 * 60
 auto_renovacao_ativa = False
 auto_renovacao_thread = None
 ultima_renovacao = None
+ultima_renovacao_completa = None
+
+# Pool de threads compartilhado pelos carregamentos (teste, completo e renovação)
+LOADER_WORKERS = int(os.environ.get('LOADER_WORKERS', 8))
+# Contas enviadas ao pool e ainda não processadas (limita a fila)
+LOADER_FILA_MAX = int(os.environ.get('LOADER_FILA_MAX', LOADER_WORKERS * 4))
+_pool_contas = None
+_pool_contas_lock = threading.Lock()
+
+# Checkpoint do carregamento completo: listagem buscada até agora e seqs já concluídos.
+# Um carregamento interrompido (restart do worker/container) continua de onde parou.
+CHECKPOINT_LISTAGEM_PATH = os.path.join(CACHE_DIR, "checkpoint_listagem.json")
+CHECKPOINT_CONCLUIDAS_PATH = os.path.join(CACHE_DIR, "checkpoint_concluidas.txt")
+CHECKPOINT_MAX_HORAS = float(os.environ.get('CHECKPOINT_MAX_HORAS', 6))
+
+# Publicação parcial do carregamento completo: a cada N segundos as contas já carregadas
+# viram um snapshot próprio, servido por /buscar-contas até o carregamento terminar (0 desativa)
+PUBLICACAO_PARCIAL_SEGUNDOS = float(os.environ.get('PUBLICACAO_PARCIAL_SEGUNDOS', 30))
+PUBLICACAO_PARCIAL_CHAVE = "contas_completas_parcial"
+PUBLICACAO_PARCIAL_PATH = os.path.join(CACHE_DIR, "publicacao_parcial.json")
+publicacao_parcial = None  # {"carregadas", "total"} enquanto contas_detalhadas_global é parcial
+_contas_antes_parcial = None  # o que era servido antes da primeira publicação parcial
+
+# Prioridade dos detalhes a buscar: funcao(conta, fim_leilao) -> chave de ordenação (menor primeiro).
+# fim_leilao mapeia seq -> auctionEndTime das contas com lance ativo no wemixplay.
+_prioridade_contas = None
 
 
 def get_contas():
-    """Retorna as contas carregadas globalmente"""
+    """
+    Retorna as contas carregadas globalmente.
+    Depois de publicadas é um SnapshotContas (sequência lida sob demanda do mmap).
+    """
     global contas_detalhadas_global
     return contas_detalhadas_global
 
@@ -47,7 +82,8 @@ def get_progresso():
     global progresso_carregamento, cache_carregando
     return {
         **progresso_carregamento,
-        "em_andamento": cache_carregando
+        "em_andamento": cache_carregando,
+        "parcial": publicacao_parcial
     }
 
 
@@ -66,8 +102,478 @@ def limpar_memoria_global():
     print("[LOADER] Memória global limpa")
 
 
+def _montar_conta_completa(conta_info, detalhes):
+    """Mescla os dados da listagem com os detalhes no formato usado pela busca"""
+    if "ttl_grupos" in detalhes:
+        # Histórico do TTL adaptativo fica só no armazém de detalhes
+        detalhes = {chave: valor for chave, valor in detalhes.items() if chave != "ttl_grupos"}
+    conta = {
+        "seq": conta_info.get("seq"),
+        "name": detalhes.get("basic", {}).get("name", conta_info.get("characterName")),
+        "worldName": detalhes.get("basic", {}).get("worldName", ""),
+        "class": detalhes.get("classe", conta_info.get("class", "1")),
+        "level": detalhes.get("basic", {}).get("level", 0),
+        "powerScore": detalhes.get("basic", {}).get("powerScore", 0),
+        "price": detalhes.get("price", 0),
+        **detalhes
+    }
+    # Valores derivados usados pelos filtros da busca, calculados uma vez por carga
+    conta["busca"] = montar_registro_busca(conta)
+    return conta
+
+
+def _publicar_contas(cache_key, contas):
+    """
+    Grava o snapshot das contas (formato "registros") e retorna a visão via mmap,
+    para que a lista completa não precise ficar na memória do processo.
+    O índice colunar da busca (core.busca) é montado aqui, a partir da lista.
+    """
+    save_to_cache(cache_key, contas, expiry_minutes=720)
+    publicadas = abrir_snapshot_contas(cache_key) or contas
+    registrar_indice(cache_key, contas, origem=publicadas)
+    return publicadas
+
+
+def _publicar_parcial(contas, total):
+    """
+    Publica as contas carregadas até agora como snapshot parcial. Numa renovação a
+    lista completa anterior continua valendo até a parcial ficar maior que ela.
+    """
+    global contas_detalhadas_global, publicacao_parcial, _contas_antes_parcial
+    
+    if not contas:
+        return
+    if publicacao_parcial is None and len(contas) <= len(contas_detalhadas_global):
+        return
+    if publicacao_parcial is None:
+        _contas_antes_parcial = contas_detalhadas_global
+    
+    save_to_cache(PUBLICACAO_PARCIAL_CHAVE, list(contas), expiry_minutes=60)
+    publicadas = abrir_snapshot_contas(PUBLICACAO_PARCIAL_CHAVE) or tuple(contas)
+    registrar_indice(PUBLICACAO_PARCIAL_CHAVE, contas, origem=publicadas)
+    marcador = {"carregadas": len(contas), "total": total}
+    
+    try:
+        with open(PUBLICACAO_PARCIAL_PATH, 'w', encoding='utf-8') as f:
+            json.dump({**marcador, "timestamp": datetime.now().isoformat()}, f)
+    except Exception as e:
+        print(f"[PARCIAL] Erro ao gravar marcador: {e}")
+    
+    with lock:
+        contas_detalhadas_global = publicadas
+        publicacao_parcial = marcador
+    
+    print(f"[PARCIAL] Publicadas {len(contas)} de {total} contas")
+
+
+def _encerrar_publicacao_parcial():
+    """Descarta o snapshot parcial depois que a lista completa foi publicada"""
+    global publicacao_parcial, _contas_antes_parcial
+    
+    publicacao_parcial = None
+    _contas_antes_parcial = None
+    try:
+        os.remove(PUBLICACAO_PARCIAL_PATH)
+    except OSError:
+        pass
+    remover_do_cache(PUBLICACAO_PARCIAL_CHAVE)
+    descartar_indice(PUBLICACAO_PARCIAL_CHAVE)
+
+
+def _abandonar_publicacao_parcial():
+    """
+    Carregamento falhou depois de publicar parciais: volta a servir o que havia antes
+    e descarta o snapshot parcial. O progresso continua no checkpoint, e a retomada
+    republica de imediato as contas já concluídas.
+    """
+    global contas_detalhadas_global
+    
+    if publicacao_parcial is None:
+        return
+    
+    print(f"[PARCIAL] Carregamento interrompido, descartando publicação parcial ({publicacao_parcial['carregadas']} de {publicacao_parcial['total']})")
+    with lock:
+        contas_detalhadas_global = _contas_antes_parcial if _contas_antes_parcial is not None else []
+    _encerrar_publicacao_parcial()
+
+
+def abrir_publicacao_parcial():
+    """
+    Retorna (contas, {"carregadas", "total"}) do carregamento completo em andamento,
+    ou (None, None). Lê do disco, então vale para qualquer worker do gunicorn.
+    """
+    if not os.path.exists(PUBLICACAO_PARCIAL_PATH):
+        return None, None
+    
+    try:
+        with open(PUBLICACAO_PARCIAL_PATH, 'r', encoding='utf-8') as f:
+            marcador = json.load(f)
+        contas = abrir_snapshot_contas(PUBLICACAO_PARCIAL_CHAVE) or read_from_cache(PUBLICACAO_PARCIAL_CHAVE)
+        if not contas:
+            return None, None
+        return contas, {"carregadas": marcador.get("carregadas", len(contas)), "total": marcador.get("total", 0)}
+    except Exception as e:
+        print(f"[PARCIAL] Erro ao abrir publicação parcial: {e}")
+        return None, None
+
+
+def _salvar_status_carregamento(total_contas, hash_contas, **extras):
+    """Grava status_carregamento.json (usado por restaurar_do_cache)"""
+    status = {
+        "timestamp": datetime.now().isoformat(),
+        "total_contas": total_contas,
+        "hash": hash_contas,
+        **extras
+    }
+    
+    status_path = os.path.join(CACHE_DIR, "status_carregamento.json")
+    with open(status_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+
+
+def prioridade_padrao(conta, fim_leilao):
+    """
+    Leilões com lance ativo primeiro (os que terminam antes na frente), depois as
+    demais pela razão preço/powerScore (mais barato por poder primeiro)
+    """
+    try:
+        power = float(conta.get("powerScore") or 0)
+        price = float(str(conta.get("price") or 0).replace(',', ''))
+    except (TypeError, ValueError):
+        power, price = 0, 0
+    razao = price / power if power > 0 else float("inf")
+    
+    fim = fim_leilao.get(str(conta.get("seq")))
+    if fim is not None:
+        try:
+            return (0, float(fim), razao)
+        except (TypeError, ValueError):
+            return (0, float("inf"), razao)
+    return (1, 0.0, razao)
+
+
+def definir_prioridade_contas(funcao):
+    """Troca a função de prioridade dos carregamentos (None volta para prioridade_padrao)"""
+    global _prioridade_contas
+    _prioridade_contas = funcao
+
+
+def _fim_leilao_por_seq():
+    """seq -> auctionEndTime das contas com lance ativo (lista em cache do wemixplay)"""
+    try:
+        from core.api import obter_contas_com_bid_cached
+        contas_bid, _, _ = obter_contas_com_bid_cached()
+        return {str(c["seq"]): c.get("auctionEndTime") for c in contas_bid if c.get("seq")}
+    except Exception as e:
+        print(f"[PRIORIDADE] Sem dados de leilão do wemixplay: {e}")
+        return {}
+
+
+def _ordenar_por_prioridade(contas):
+    """Ordena as contas pela prioridade configurada (a ordem da listagem desempata)"""
+    if len(contas) < 2:
+        return list(contas)
+    
+    prioridade = _prioridade_contas or prioridade_padrao
+    fim_leilao = _fim_leilao_por_seq()
+    return sorted(contas, key=lambda conta: prioridade(conta, fim_leilao))
+
+
+def _get_pool_contas():
+    """Pool de LOADER_WORKERS threads que carregam detalhes de contas (criado no primeiro uso)"""
+    global _pool_contas
+    
+    with _pool_contas_lock:
+        if _pool_contas is None:
+            _pool_contas = ThreadPoolExecutor(max_workers=LOADER_WORKERS, thread_name_prefix="loader")
+        return _pool_contas
+
+
+def _carregar_detalhes_contas(contas, rotulo, ao_concluir=None, publicar_parcial=None):
+    """
+    Carrega os detalhes de uma lista de contas no pool compartilhado, atualizando o
+    progresso a cada conta. As contas entram no pool conforme as anteriores terminam
+    (no máximo LOADER_FILA_MAX pendentes), sem esperar lotes.
+    ao_concluir(conta_completa) é chamada, nesta thread, a cada conta carregada;
+    publicar_parcial(resultados) a cada PUBLICACAO_PARCIAL_SEGUNDOS.
+    As contas são enviadas na ordem de _ordenar_por_prioridade.
+    Retorna (contas completas, nomes de status coletados).
+    """
+    global progresso_carregamento
+    
+    contas = _ordenar_por_prioridade(contas)
+    total = len(contas)
+    progresso_carregamento = {"atual": 0, "total": total, "percentual": 0}
+    
+    print(f"{rotulo} Carregando detalhes de {total} contas...")
+    
+    resultados = []
+    status_coletados = set()
+    
+    pool = _get_pool_contas()
+    vagas = threading.BoundedSemaphore(max(1, LOADER_FILA_MAX))
+    concluidos = queue.Queue()
+    ultima_publicacao = [time.monotonic()]
+    
+    def concluir(future):
+        vagas.release()
+        concluidos.put(future)
+    
+    def processar(future):
+        try:
+            resultado = future.result()
+            if resultado:
+                detalhes = resultado.get("detalhes", {})
+                conta_info = resultado.get("conta", {})
+                
+                # Mesclar detalhes com dados da conta
+                conta_completa = _montar_conta_completa(conta_info, detalhes)
+                resultados.append(conta_completa)
+                
+                # Coletar status
+                for stat in detalhes.get("stats", []):
+                    if isinstance(stat, dict) and stat.get("statName"):
+                        status_coletados.add(stat["statName"])
+                
+                if ao_concluir:
+                    ao_concluir(conta_completa)
+                        
+        except Exception as e:
+            print(f"{rotulo} Erro ao carregar conta: {e}")
+        
+        progresso_carregamento["atual"] += 1
+        progresso_carregamento["percentual"] = int(progresso_carregamento["atual"] / total * 100)
+        
+        if (publicar_parcial and PUBLICACAO_PARCIAL_SEGUNDOS > 0
+                and time.monotonic() - ultima_publicacao[0] >= PUBLICACAO_PARCIAL_SEGUNDOS):
+            publicar_parcial(resultados)
+            ultima_publicacao[0] = time.monotonic()
+    
+    for conta in contas:
+        vagas.acquire()
+        pool.submit(carregar_detalhes_com_cache, conta).add_done_callback(concluir)
+        
+        while not concluidos.empty():
+            processar(concluidos.get())
+    
+    while progresso_carregamento["atual"] < total:
+        processar(concluidos.get())
+    
+    return resultados, status_coletados
+
+
+def _campos_da_listagem(info):
+    """Preço e tradeType da listagem, normalizados como em buscar_detalhes_conta"""
+    campos = {}
+    try:
+        price_str = str(info.get("price", "")).replace(',', '').strip()
+        if price_str:
+            campos["price"] = float(price_str)
+    except ValueError:
+        pass
+    try:
+        if info.get("tradeType") is not None:
+            campos["tradeType"] = int(info["tradeType"])
+    except (TypeError, ValueError):
+        pass
+    return campos
+
+
+def _renovar_incremental(contas):
+    """
+    Compara a listagem nova com o snapshot atual por seq: contas que saíram da
+    listagem são descartadas, as que continuam recebem preço/tradeType da listagem
+    e só as novas, e as mantidas cujos detalhes venceram pelo TTL adaptativo (só os
+    grupos vencidos são buscados de novo), passam pelo carregamento de detalhes.
+    Retorna (contas completas, nomes de status coletados).
+    """
+    listagem = {str(c.get("seq")): c for c in contas if c.get("seq")}
+    
+    mantidas = []
+    vistos = set()
+    removidas = 0
+    atualizadas = 0
+    
+    for conta in contas_detalhadas_global:
+        seq = str(conta.get("seq"))
+        info = listagem.get(seq)
+        if info is None or seq in vistos:
+            removidas += 1
+            continue
+        vistos.add(seq)
+        
+        alteracoes = {
+            campo: valor for campo, valor in _campos_da_listagem(info).items()
+            if conta.get(campo) != valor
+        }
+        if alteracoes:
+            conta = {**conta, **alteracoes}
+            atualizadas += 1
+        mantidas.append(conta)
+    
+    novas = [conta for seq, conta in listagem.items() if seq not in vistos]
+    
+    vencidas = seqs_detalhes_expirados(vistos)
+    if vencidas:
+        mantidas = [conta for conta in mantidas if str(conta.get("seq")) not in vencidas]
+    
+    print(f"[INCREMENTAL] {len(mantidas)} mantidas ({atualizadas} atualizadas), "
+          f"{removidas} removidas, {len(novas)} novas, {len(vencidas)} com detalhes vencidos")
+    
+    a_carregar = novas + [listagem[seq] for seq in vencidas]
+    resultados_novas, status_coletados = _carregar_detalhes_contas(a_carregar, "[INCREMENTAL]")
+    status_coletados.update(read_from_cache("status_disponiveis") or [])
+    
+    return mantidas + resultados_novas, status_coletados
+
+
+def _ler_checkpoint():
+    """
+    Retorna o checkpoint {"iniciado_em", "pagina", "contas", "listagem_completa", "concluidas"}
+    do carregamento interrompido, ou None se não houver (ou for mais velho que CHECKPOINT_MAX_HORAS)
+    """
+    if not os.path.exists(CHECKPOINT_LISTAGEM_PATH):
+        return None
+    
+    try:
+        with open(CHECKPOINT_LISTAGEM_PATH, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        
+        iniciado_em = datetime.fromisoformat(checkpoint["iniciado_em"])
+        if (datetime.now() - iniciado_em).total_seconds() > CHECKPOINT_MAX_HORAS * 3600:
+            print("[CHECKPOINT] Checkpoint muito antigo, descartando")
+            remover_checkpoint()
+            return None
+        
+        concluidas = set()
+        if os.path.exists(CHECKPOINT_CONCLUIDAS_PATH):
+            with open(CHECKPOINT_CONCLUIDAS_PATH, 'r', encoding='utf-8') as f:
+                # Uma linha por seq; a última pode estar incompleta se o processo morreu escrevendo
+                concluidas = {linha[:-1] for linha in f if linha.endswith("\n")}
+        checkpoint["concluidas"] = concluidas
+        return checkpoint
+        
+    except Exception as e:
+        print(f"[CHECKPOINT] Checkpoint ilegível, descartando: {e}")
+        remover_checkpoint()
+        return None
+
+
+def _salvar_checkpoint_listagem(checkpoint):
+    """Grava a parte da listagem do checkpoint (arquivo temporário + os.replace)"""
+    import tempfile
+    
+    dados = {chave: valor for chave, valor in checkpoint.items() if chave != "concluidas"}
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', dir=CACHE_DIR, delete=False, encoding='utf-8') as tmp:
+            json.dump(dados, tmp, ensure_ascii=False)
+            temp_path = tmp.name
+        os.replace(temp_path, CHECKPOINT_LISTAGEM_PATH)
+    except Exception as e:
+        print(f"[CHECKPOINT] Erro ao salvar checkpoint: {e}")
+
+
+def remover_checkpoint():
+    """Descarta o checkpoint do carregamento completo"""
+    for caminho in (CHECKPOINT_LISTAGEM_PATH, CHECKPOINT_CONCLUIDAS_PATH):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+def tem_checkpoint_carregamento():
+    """True se há um carregamento completo interrompido para retomar"""
+    return _ler_checkpoint() is not None
+
+
+def _iniciar_checkpoint(retomar=True):
+    """Retorna o checkpoint a retomar ou começa um novo (descartando o anterior)"""
+    checkpoint = _ler_checkpoint() if retomar else None
+    
+    if checkpoint is not None:
+        print(f"[CHECKPOINT] Retomando carregamento de {checkpoint['iniciado_em']}: "
+              f"{len(checkpoint['contas'])} contas listadas (página {checkpoint['pagina']}), "
+              f"{len(checkpoint['concluidas'])} concluídas")
+        return checkpoint
+    
+    remover_checkpoint()
+    return {
+        "iniciado_em": datetime.now().isoformat(),
+        "pagina": 0,
+        "contas": [],
+        "listagem_completa": False,
+        "concluidas": set()
+    }
+
+
+def _listagem_com_checkpoint(checkpoint):
+    """Busca a listagem a partir da última página gravada no checkpoint"""
+    if not checkpoint["listagem_completa"]:
+        def ao_buscar_pagina(pagina, contas):
+            checkpoint["pagina"] = pagina
+            checkpoint["contas"] = contas
+            _salvar_checkpoint_listagem(checkpoint)
+        
+        checkpoint["contas"] = buscar_todas_contas(
+            pagina_inicial=checkpoint["pagina"] + 1,
+            contas_iniciais=checkpoint["contas"],
+            ao_buscar_pagina=ao_buscar_pagina
+        )
+        checkpoint["listagem_completa"] = True
+        _salvar_checkpoint_listagem(checkpoint)
+    
+    return checkpoint["contas"]
+
+
+def _carregar_detalhes_com_checkpoint(checkpoint, contas, rotulo):
+    """
+    Como _carregar_detalhes_contas, mas as contas já concluídas no checkpoint são
+    montadas direto do armazém de detalhes e cada conta nova é registrada nele.
+    O progresso é publicado como snapshot parcial (ver _publicar_parcial).
+    """
+    concluidas = checkpoint["concluidas"]
+    prontas = []
+    status_coletados = set()
+    restantes = []
+    
+    for conta in contas:
+        detalhes = None
+        if str(conta.get("seq")) in concluidas:
+            detalhes, _ = ler_detalhes_conta_com_estado(conta.get("seq"))
+        if not detalhes or detalhes.get("incompleto"):
+            restantes.append(conta)
+            continue
+        prontas.append(_montar_conta_completa(conta, detalhes))
+        for stat in detalhes.get("stats", []):
+            if isinstance(stat, dict) and stat.get("statName"):
+                status_coletados.add(stat["statName"])
+    
+    if prontas:
+        print(f"{rotulo} {len(prontas)} contas recuperadas do checkpoint, {len(restantes)} restantes")
+        if PUBLICACAO_PARCIAL_SEGUNDOS > 0 and restantes:
+            _publicar_parcial(prontas, len(contas))
+    
+    with open(CHECKPOINT_CONCLUIDAS_PATH, 'a', encoding='utf-8') as registro:
+        def ao_concluir(conta_completa):
+            # Conta incompleta não entra no checkpoint: numa retomada é buscada de novo
+            if conta_completa.get("incompleto"):
+                return
+            registro.write(f"{conta_completa.get('seq')}\n")
+            registro.flush()
+        
+        def publicar_parcial(resultados):
+            _publicar_parcial(prontas + resultados, len(contas))
+        
+        resultados, status_novos = _carregar_detalhes_contas(restantes, rotulo, ao_concluir, publicar_parcial)
+    
+    status_coletados.update(status_novos)
+    return prontas + resultados, status_coletados
+
+
 def carregar_detalhes_com_cache(conta):
-    """Carrega detalhes de uma conta com cache"""
+    """Carrega detalhes de uma conta com cache (armazém de detalhes por seq)"""
     seq = conta.get("seq")
     transport_id = conta.get("transportID")
     
@@ -75,15 +581,14 @@ def carregar_detalhes_com_cache(conta):
         return None
     
     # Verificar cache
-    cache_key = f"detalhes_{seq}_equip"
-    cached = read_from_cache(cache_key)
+    cached = ler_detalhes_conta(seq)
     
     # Verificar se o cache tem os campos necessários
     # tradeType, nftID: necessários para filtro "Com Lance"
     # inven_all: precisa ter TODOS os itens com campo "trade" para busca funcionar
     # spirit: precisa ter contagem de espíritos lendários
     cache_valido = False
-    if cached and "tradeType" in cached and "nftID" in cached:
+    if cached and "tradeType" in cached and "nftID" in cached and not cached.get("incompleto"):
         inven_all = cached.get("inven_all", [])
         spirit = cached.get("spirit", {})
         # Verifica se inven_all tem a nova estrutura com campo "trade"
@@ -100,12 +605,11 @@ def carregar_detalhes_com_cache(conta):
             "detalhes": cached
         }
     
-    # Buscar detalhes da API (cache inexistente ou incompleto)
-    detalhes = buscar_detalhes_conta(seq, transport_id)
+    # Buscar detalhes da API (cache inexistente, vencido ou incompleto).
+    # buscar_detalhes_conta já grava o resultado no armazém de detalhes.
+    detalhes = buscar_detalhes_conta(seq, transport_id, permitir_velho=False)
     
     if detalhes:
-        # Salvar no cache para próximas consultas
-        save_to_cache(cache_key, detalhes, expiry_minutes=720)
         return {
             "conta": conta,
             "detalhes": detalhes
@@ -119,7 +623,7 @@ def carregar_contas_teste():
     Carrega contas apenas da primeira página (para teste rápido).
     Ideal para desenvolvimento e debugging.
     """
-    global contas_detalhadas_global, cache_carregando, progresso_carregamento
+    global contas_detalhadas_global, cache_carregando
     
     if cache_carregando:
         print("[AVISO] Carregamento já em andamento")
@@ -142,53 +646,14 @@ def carregar_contas_teste():
         # Filtrar contas bloqueadas
         contas = [c for c in contas if c.get("characterName", "") not in NOMES_BLOQUEADOS]
         
-        total = len(contas)
-        progresso_carregamento = {"atual": 0, "total": total, "percentual": 0}
-        
-        print(f"[TESTE] Carregando detalhes de {total} contas...")
-        
-        resultados = []
-        status_coletados = set()
+        resultados, status_coletados = _carregar_detalhes_contas(contas, "[TESTE]")
         
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(carregar_detalhes_com_cache, conta): conta for conta in contas}
-            
-            for i, future in enumerate(as_completed(futures)):
-                try:
-                    resultado = future.result(timeout=30)
-                    if resultado:
-                        detalhes = resultado.get("detalhes", {})
-                        
-                        # Mesclar detalhes com dados da conta
-                        conta_info = resultado.get("conta", {})
-                        conta_completa = {
-                            "seq": conta_info.get("seq"),
-                            "name": detalhes.get("basic", {}).get("name", conta_info.get("characterName")),
-                            "worldName": detalhes.get("basic", {}).get("worldName", ""),
-                            "class": detalhes.get("classe", conta_info.get("class", "1")),
-                            "level": detalhes.get("basic", {}).get("level", 0),
-                            "powerScore": detalhes.get("basic", {}).get("powerScore", 0),
-                            "price": detalhes.get("price", 0),
-                            **detalhes
-                        }
-                        resultados.append(conta_completa)
-                        
-                        # Coletar status para cache
-                        for stat in detalhes.get("stats", []):
-                            if isinstance(stat, dict) and stat.get("statName"):
-                                status_coletados.add(stat["statName"])
-                                
-                except Exception as e:
-                    print(f"[ERRO] Erro ao carregar conta: {e}")
-                
-                progresso_carregamento["atual"] = i + 1
-                progresso_carregamento["percentual"] = int((i + 1) / total * 100)
+        # Salvar no cache
+        publicadas = _publicar_contas("contas_teste", resultados)
+        salvar_indice_detalhes()
         
         with lock:
-            contas_detalhadas_global = resultados
-        
-        # Salvar no cache
-        save_to_cache("contas_teste", resultados, expiry_minutes=720)
+            contas_detalhadas_global = publicadas
         
         # Salvar status disponíveis
         status_lista = list(status_coletados)
@@ -212,7 +677,7 @@ def carregar_contas_completas(force=False):
     Args:
         force: Se True, força recarregamento mesmo se já houver contas em cache
     """
-    global contas_detalhadas_global, cache_carregando, progresso_carregamento, ultimo_hash_contas
+    global contas_detalhadas_global, cache_carregando, ultimo_hash_contas
     
     if cache_carregando:
         print("[AVISO] Carregamento já em andamento")
@@ -222,11 +687,13 @@ def carregar_contas_completas(force=False):
     print("[COMPLETO] Iniciando carregamento completo de contas...")
     
     try:
-        # Buscar todas as contas
-        contas = buscar_todas_contas()
+        # Buscar todas as contas (retomando a listagem de um carregamento interrompido)
+        checkpoint = _iniciar_checkpoint(retomar=not force)
+        contas = _listagem_com_checkpoint(checkpoint)
         
         if not contas:
             print("[ERRO] Nenhuma conta encontrada")
+            remover_checkpoint()
             cache_carregando = False
             return
         
@@ -235,6 +702,7 @@ def carregar_contas_completas(force=False):
         
         if not force and novo_hash == ultimo_hash_contas and len(contas_detalhadas_global) > 0:
             print("[CACHE] Lista de contas não mudou, usando cache existente")
+            remover_checkpoint()
             cache_carregando = False
             return
         
@@ -243,77 +711,24 @@ def carregar_contas_completas(force=False):
             print("[LIMPEZA] Forçando limpeza de cache...")
             limpar_cache_contas()
         
-        total = len(contas)
-        progresso_carregamento = {"atual": 0, "total": total, "percentual": 0}
-        
-        print(f"[COMPLETO] Carregando detalhes de {total} contas...")
+        resultados, status_coletados = _carregar_detalhes_com_checkpoint(checkpoint, contas, "[COMPLETO]")
         
-        resultados = []
-        status_coletados = set()
-        lote_tamanho = 10
-        
-        for i in range(0, total, lote_tamanho):
-            lote = contas[i:i + lote_tamanho]
-            
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = {executor.submit(carregar_detalhes_com_cache, conta): conta for conta in lote}
-                
-                for future in as_completed(futures):
-                    try:
-                        resultado = future.result(timeout=30)
-                        if resultado:
-                            detalhes = resultado.get("detalhes", {})
-                            conta_info = resultado.get("conta", {})
-                            
-                            # Mesclar detalhes com dados da conta
-                            conta_completa = {
-                                "seq": conta_info.get("seq"),
-                                "name": detalhes.get("basic", {}).get("name", conta_info.get("characterName")),
-                                "worldName": detalhes.get("basic", {}).get("worldName", ""),
-                                "class": detalhes.get("classe", conta_info.get("class", "1")),
-                                "level": detalhes.get("basic", {}).get("level", 0),
-                                "powerScore": detalhes.get("basic", {}).get("powerScore", 0),
-                                "price": detalhes.get("price", 0),
-                                **detalhes
-                            }
-                            resultados.append(conta_completa)
-                            
-                            # Coletar status
-                            for stat in detalhes.get("stats", []):
-                                if isinstance(stat, dict) and stat.get("statName"):
-                                    status_coletados.add(stat["statName"])
-                                    
-                    except Exception as e:
-                        print(f"[ERRO] Erro ao carregar conta: {e}")
-            
-            progresso_carregamento["atual"] = min(i + lote_tamanho, total)
-            progresso_carregamento["percentual"] = int(progresso_carregamento["atual"] / total * 100)
-            
-            # Pequena pausa entre lotes
-            if i + lote_tamanho < total:
-                time.sleep(0.3)
+        # Salvar no cache
+        publicadas = _publicar_contas("contas_completas", resultados)
+        compactar_detalhes()
         
         with lock:
-            contas_detalhadas_global = resultados
+            contas_detalhadas_global = publicadas
             ultimo_hash_contas = novo_hash
-        
-        # Salvar no cache
-        save_to_cache("contas_completas", resultados, expiry_minutes=720)
+        _encerrar_publicacao_parcial()
         
         # Salvar status disponíveis
         status_lista = list(status_coletados)
         save_to_cache("status_disponiveis", status_lista, expiry_minutes=720)
         
         # Salvar status do carregamento
-        status = {
-            "timestamp": datetime.now().isoformat(),
-            "total_contas": len(resultados),
-            "hash": novo_hash
-        }
-        
-        status_path = os.path.join(CACHE_DIR, "status_carregamento.json")
-        with open(status_path, 'w', encoding='utf-8') as f:
-            json.dump(status, f, ensure_ascii=False, indent=2)
+        _salvar_status_carregamento(len(resultados), novo_hash)
+        remover_checkpoint()
         
         print(f"[COMPLETO] Carregamento concluído: {len(resultados)} contas")
         
@@ -322,6 +737,7 @@ def carregar_contas_completas(force=False):
         import traceback
         traceback.print_exc()
     finally:
+        _abandonar_publicacao_parcial()
         cache_carregando = False
 
 
@@ -364,42 +780,33 @@ def restaurar_do_cache():
         # Restaurar hash
         ultimo_hash_contas = status.get("hash", "")
         
-        # Tentar restaurar contas dos arquivos de detalhes
-        if os.path.exists(CACHE_DIR_DETALHES):
-            contas_restauradas = []
-            
-            for filename in os.listdir(CACHE_DIR_DETALHES):
-                if filename.startswith("detalhes_") and filename.endswith(".json"):
-                    filepath = os.path.join(CACHE_DIR_DETALHES, filename)
-                    try:
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            cache_entry = json.load(f)
-                        
-                        detalhes = cache_entry.get("data")
-                        if detalhes:
-                            # Reconstruir entrada mínima de conta
-                            seq = filename.replace("detalhes_", "").replace("_equip.json", "")
-                            conta = {
-                                "seq": seq,
-                                "characterName": detalhes.get("basic", {}).get("name", ""),
-                                "class": detalhes.get("classe", "1"),
-                                "lv": detalhes.get("basic", {}).get("level", 0),
-                                "powerScore": detalhes.get("basic", {}).get("powerScore", 0),
-                                "price": detalhes.get("price", 0)
-                            }
-                            
-                            contas_restauradas.append({
-                                "conta": conta,
-                                "detalhes": detalhes
-                            })
-                    except Exception as e:
-                        print(f"[CACHE] Erro ao restaurar {filename}: {e}")
-            
-            if contas_restauradas:
-                with lock:
-                    contas_detalhadas_global = contas_restauradas
-                print(f"[CACHE] Restauradas {len(contas_restauradas)} contas do cache")
-                return True
+        # Snapshot ainda válido: basta mapear o arquivo
+        snapshot = abrir_snapshot_contas("contas_completas")
+        if snapshot is not None and len(snapshot) > 0:
+            with lock:
+                contas_detalhadas_global = snapshot
+            print(f"[CACHE] Restauradas {len(snapshot)} contas do snapshot")
+            return True
+        
+        # Sem snapshot válido: varredura sequencial do armazém de detalhes
+        contas_restauradas = []
+        for seq, detalhes in iterar_detalhes_contas():
+            if not detalhes:
+                continue
+            conta = {
+                "seq": seq,
+                "characterName": detalhes.get("basic", {}).get("name", ""),
+                "class": detalhes.get("classe", "1")
+            }
+            contas_restauradas.append(_montar_conta_completa(conta, detalhes))
+        
+        if contas_restauradas:
+            # Remontar o conjunto de busca a partir do armazém
+            publicadas = _publicar_contas("contas_completas", contas_restauradas)
+            with lock:
+                contas_detalhadas_global = publicadas
+            print(f"[CACHE] Restauradas {len(contas_restauradas)} contas do cache")
+            return True
         
     except Exception as e:
         print(f"[CACHE] Erro ao restaurar do cache: {e}")
@@ -409,79 +816,64 @@ def restaurar_do_cache():
 
 # ========== SISTEMA DE AUTO-RENOVAÇÃO DO CACHE ==========
 
-def renovar_cache_em_background():
+def renovar_cache_em_background(modo="auto"):
     """
     Renova o cache carregando novos dados sem interromper o serviço.
     Os dados antigos continuam disponíveis até os novos estarem prontos.
+    
+    Args:
+        modo: "incremental" (só busca detalhes de contas novas, ver _renovar_incremental),
+              "completo" (recarrega os detalhes de todas as contas) ou "auto"
+              (completo a cada AUTO_RENOVACAO_COMPLETA_INTERVALO ou sem snapshot, senão incremental)
     """
-    global contas_detalhadas_global, cache_carregando, progresso_carregamento, ultimo_hash_contas, ultima_renovacao
+    global contas_detalhadas_global, cache_carregando, ultimo_hash_contas, ultima_renovacao, ultima_renovacao_completa
     
     if cache_carregando:
         print("[AUTO-RENOVAÇÃO] Carregamento já em andamento, pulando...")
         return False
     
-    print(f"[AUTO-RENOVAÇÃO] Iniciando renovação do cache... ({datetime.now().strftime('%H:%M:%S')})")
+    # Quantidade atual, para não trocar um cache bom por um resultado parcial
+    total_antigo = len(contas_detalhadas_global) if contas_detalhadas_global else 0
     
-    # Guardar dados antigos em caso de erro
-    dados_antigos = contas_detalhadas_global.copy() if contas_detalhadas_global else []
+    if modo == "auto":
+        completa_vencida = (
+            ultima_renovacao_completa is None
+            or (datetime.now() - ultima_renovacao_completa).total_seconds() >= AUTO_RENOVACAO_COMPLETA_INTERVALO
+        )
+        modo = "completo" if completa_vencida or tem_checkpoint_carregamento() else "incremental"
+    if modo == "incremental" and total_antigo == 0:
+        modo = "completo"
+    
+    print(f"[AUTO-RENOVAÇÃO] Iniciando renovação {modo} do cache... ({datetime.now().strftime('%H:%M:%S')})")
     
     cache_carregando = True
     
     try:
-        # Buscar todas as contas
-        contas = buscar_todas_contas()
+        # Buscar todas as contas (a renovação completa retoma um carregamento interrompido)
+        if modo == "completo":
+            checkpoint = _iniciar_checkpoint()
+            contas = _listagem_com_checkpoint(checkpoint)
+        else:
+            contas = buscar_todas_contas()
         
         if not contas:
             print("[AUTO-RENOVAÇÃO] Nenhuma conta encontrada, mantendo cache antigo")
+            if modo == "completo":
+                remover_checkpoint()
             cache_carregando = False
             return False
         
-        total = len(contas)
-        progresso_carregamento = {"atual": 0, "total": total, "percentual": 0}
-        
-        print(f"[AUTO-RENOVAÇÃO] Carregando detalhes de {total} contas...")
-        
-        resultados_novos = []
-        status_coletados = set()
-        lote_tamanho = 10
+        novo_hash = hash_status(str(contas))
         
-        for i in range(0, total, lote_tamanho):
-            lote = contas[i:i + lote_tamanho]
-            
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = {executor.submit(carregar_detalhes_com_cache, conta): conta for conta in lote}
-                
-                for future in as_completed(futures):
-                    try:
-                        resultado = future.result(timeout=30)
-                        if resultado:
-                            detalhes = resultado.get("detalhes", {})
-                            conta_info = resultado.get("conta", {})
-                            
-                            conta_completa = {
-                                "seq": conta_info.get("seq"),
-                                "name": detalhes.get("basic", {}).get("name", conta_info.get("characterName")),
-                                "worldName": detalhes.get("basic", {}).get("worldName", ""),
-                                "class": detalhes.get("classe", conta_info.get("class", "1")),
-                                "level": detalhes.get("basic", {}).get("level", 0),
-                                "powerScore": detalhes.get("basic", {}).get("powerScore", 0),
-                                "price": detalhes.get("price", 0),
-                                **detalhes
-                            }
-                            resultados_novos.append(conta_completa)
-                            
-                            for stat in detalhes.get("stats", []):
-                                if isinstance(stat, dict) and stat.get("statName"):
-                                    status_coletados.add(stat["statName"])
-                                    
-                    except Exception as e:
-                        print(f"[AUTO-RENOVAÇÃO] Erro ao carregar conta: {e}")
-            
-            progresso_carregamento["atual"] = min(i + lote_tamanho, total)
-            progresso_carregamento["percentual"] = int(progresso_carregamento["atual"] / total * 100)
-            
-            if i + lote_tamanho < total:
-                time.sleep(0.3)
+        if modo == "incremental":
+            if novo_hash == ultimo_hash_contas and not seqs_detalhes_expirados(c.get("seq") for c in contas):
+                print("[AUTO-RENOVAÇÃO] Listagem não mudou e nenhum detalhe venceu desde a última renovação")
+                ultima_renovacao = datetime.now()
+                return True
+            resultados_novos, status_coletados = _renovar_incremental(contas)
+        else:
+            resultados_novos, status_coletados = _carregar_detalhes_com_checkpoint(checkpoint, contas, "[AUTO-RENOVAÇÃO]")
+            remover_checkpoint()
         
         # Verificar se conseguiu carregar dados
         if len(resultados_novos) == 0:
@@ -490,34 +882,31 @@ def renovar_cache_em_background():
             return False
         
         # Só substituir se os novos dados são válidos
-        if len(resultados_novos) >= len(dados_antigos) * 0.5:  # Pelo menos 50% dos dados antigos
+        if len(resultados_novos) >= total_antigo * 0.5:  # Pelo menos 50% dos dados antigos
+            # Salvar no cache
+            publicadas = _publicar_contas("contas_completas", resultados_novos)
+            if modo == "completo":
+                compactar_detalhes()
+            
             with lock:
-                contas_detalhadas_global = resultados_novos
-                novo_hash = hash_status(str(contas))
+                contas_detalhadas_global = publicadas
                 ultimo_hash_contas = novo_hash
-            
-            # Salvar no cache
-            save_to_cache("contas_completas", resultados_novos, expiry_minutes=720)
+            _encerrar_publicacao_parcial()
             
             status_lista = list(status_coletados)
             save_to_cache("status_disponiveis", status_lista, expiry_minutes=720)
             
-            status = {
-                "timestamp": datetime.now().isoformat(),
-                "total_contas": len(resultados_novos),
-                "hash": novo_hash,
-                "renovacao_automatica": True
-            }
-            
-            status_path = os.path.join(CACHE_DIR, "status_carregamento.json")
-            with open(status_path, 'w', encoding='utf-8') as f:
-                json.dump(status, f, ensure_ascii=False, indent=2)
+            _salvar_status_carregamento(
+                len(resultados_novos), novo_hash, renovacao_automatica=True, modo=modo
+            )
             
             ultima_renovacao = datetime.now()
-            print(f"[AUTO-RENOVAÇÃO] Concluída com sucesso: {len(resultados_novos)} contas ({datetime.now().strftime('%H:%M:%S')})")
+            if modo == "completo":
+                ultima_renovacao_completa = ultima_renovacao
+            print(f"[AUTO-RENOVAÇÃO] Concluída com sucesso ({modo}): {len(resultados_novos)} contas ({datetime.now().strftime('%H:%M:%S')})")
             return True
         else:
-            print(f"[AUTO-RENOVAÇÃO] Poucos resultados ({len(resultados_novos)}), mantendo cache antigo ({len(dados_antigos)})")
+            print(f"[AUTO-RENOVAÇÃO] Poucos resultados ({len(resultados_novos)}), mantendo cache antigo ({total_antigo})")
             return False
         
     except Exception as e:
@@ -526,6 +915,7 @@ def renovar_cache_em_background():
         traceback.print_exc()
         return False
     finally:
+        _abandonar_publicacao_parcial()
         cache_carregando = False
 
 
@@ -604,5 +994,7 @@ def get_status_auto_renovacao():
         "ativo": auto_renovacao_ativa,
         "ultima_renovacao": ultima_renovacao.isoformat() if ultima_renovacao else None,
         "intervalo_horas": AUTO_RENOVACAO_INTERVALO / 3600,
+        "ultima_renovacao_completa": ultima_renovacao_completa.isoformat() if ultima_renovacao_completa else None,
+        "intervalo_completa_horas": AUTO_RENOVACAO_COMPLETA_INTERVALO / 3600,
         "proxima_em": proxima
     }
@@ -0,0 +1,97 @@
+"""
+TTL adaptativo dos detalhes de contas, por conta e por grupo de endpoints
+
+Cada grupo (resumo, stats, inventário, ...) guarda nos próprios detalhes, em
+"ttl_grupos", quando foi buscado, o intervalo até a próxima busca e quantas
+vezes mudou entre verificações. Grupo que mudou tem o intervalo reduzido à
+metade; grupo que veio igual tem o intervalo aumentado em 50%, dentro de
+[TTL_ADAPTATIVO_MIN_MINUTOS, TTL_ADAPTATIVO_MAX_MINUTOS].
+"""
+import os
+from datetime import datetime
+
+TTL_ADAPTATIVO_MIN_MINUTOS = float(os.environ.get('TTL_ADAPTATIVO_MIN_MINUTOS', 30))
+TTL_ADAPTATIVO_MAX_MINUTOS = float(os.environ.get('TTL_ADAPTATIVO_MAX_MINUTOS', 2880))
+
+# Grupo -> chaves de detalhes preenchidas por ele (usadas para detectar mudança).
+# O status de lance do wemixplay anda junto com o resumo (ambos mexem em tradeType).
+CHAVES_POR_GRUPO = {
+    "resumo": ("basic", "classe", "price", "tradeType", "sealedTS", "nftID", "equip", "bid_count"),
+    "stats": ("stats",),
+    "inventario": ("inven_all", "inven", "inven_total", "tickets", "crystals", "fragments"),
+    "codex": ("codex",),
+    "potencial": ("potencial",),
+    "espiritos": ("spirit_list", "spirit"),
+    "treinamento": ("training",),
+    "habilidades": ("skills_list", "skills"),
+    "mina": ("building",),
+}
+
+# Intervalo inicial (minutos) de cada grupo, antes de haver histórico
+TTL_INICIAL_POR_GRUPO = {
+    "resumo": 60,
+    "stats": 360,
+    "inventario": 360,
+    "codex": 720,
+    "potencial": 720,
+    "espiritos": 720,
+    "treinamento": 720,
+    "habilidades": 720,
+    "mina": 720,
+}
+
+
+def grupos_vencidos(detalhes, agora=None):
+    """Grupos que precisam ser buscados de novo (todos, se não houver histórico)"""
+    ttl_grupos = (detalhes or {}).get("ttl_grupos")
+    if not ttl_grupos:
+        return set(CHAVES_POR_GRUPO)
+
+    agora = agora or datetime.now().timestamp()
+    vencidos = set()
+    for grupo in CHAVES_POR_GRUPO:
+        info = ttl_grupos.get(grupo)
+        if info is None or agora >= info["buscado_em"] + info["intervalo"] * 60:
+            vencidos.add(grupo)
+    return vencidos
+
+
+def registrar_busca(detalhes, grupo, anterior, agora=None):
+    """
+    Atualiza o histórico do grupo em detalhes["ttl_grupos"] comparando os valores
+    novos (já mesclados em detalhes) com os da versão anterior (ou None)
+    """
+    agora = agora or datetime.now().timestamp()
+    ttl_grupos = detalhes.setdefault("ttl_grupos", {})
+    info = dict(ttl_grupos.get(grupo) or {
+        "intervalo": TTL_INICIAL_POR_GRUPO[grupo], "verificacoes": 0, "mudancas": 0
+    })
+
+    if anterior is not None and "buscado_em" in info:
+        chaves = CHAVES_POR_GRUPO[grupo]
+        mudou = any(anterior.get(chave) != detalhes.get(chave) for chave in chaves)
+        info["verificacoes"] += 1
+        if mudou:
+            info["mudancas"] += 1
+            info["intervalo"] = max(TTL_ADAPTATIVO_MIN_MINUTOS, info["intervalo"] / 2)
+        else:
+            info["intervalo"] = min(TTL_ADAPTATIVO_MAX_MINUTOS, info["intervalo"] * 1.5)
+
+    info["buscado_em"] = agora
+    ttl_grupos[grupo] = info
+
+
+def minutos_ate_vencer(detalhes, agora=None):
+    """
+    (minutos até o primeiro grupo vencer, minutos até o último) — usados como TTL
+    e TTL máximo do registro no armazém de detalhes
+    """
+    agora = agora or datetime.now().timestamp()
+    restantes = [
+        (info["buscado_em"] + info["intervalo"] * 60 - agora) / 60
+        for info in (detalhes.get("ttl_grupos") or {}).values()
+    ]
+    if not restantes:
+        return TTL_ADAPTATIVO_MIN_MINUTOS, TTL_ADAPTATIVO_MIN_MINUTOS
+    return max(1.0, min(restantes)), max(1.0, max(restantes))
+
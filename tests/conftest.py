@@ -0,0 +1,29 @@
+"""
+Configuração comum dos testes
+
+core.cache usa caminhos relativos (xdraco_cache_status/...) e cria os diretórios
+ao ser importado, então os testes rodam a partir de um diretório temporário.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.chdir(tempfile.mkdtemp(prefix="hunter_testes_"))
+
+
+@pytest.fixture
+def diretorio_cache(tmp_path, monkeypatch):
+    """Diretório de cache vazio para o teste (arquivos, memória e armazém de detalhes)"""
+    from core import cache
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(cache.CACHE_DIR_DETALHES)
+    cache.invalidar_cache_memoria()
+    cache.limpar_detalhes_contas()
+    yield tmp_path
+    cache.invalidar_cache_memoria()
+    cache.limpar_detalhes_contas()
@@ -0,0 +1,325 @@
+"""Testes das chamadas às APIs externas (core.api), sem rede"""
+import time
+
+import pytest
+import requests
+
+from core import api
+
+
+class RelogioFalso:
+    """Substitui o módulo time em core.api: monotonic() controlado e sleep() que só avança o relógio"""
+
+    def __init__(self):
+        self.agora = 1000.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.agora
+
+    def perf_counter(self):
+        return self.agora
+
+    def time(self):
+        return self.agora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.agora += max(0.0, segundos)
+
+
+class RespostaFalsa:
+    def __init__(self, status_code=200, dados=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.dados = dados
+        self.fechada = False
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return self.dados
+
+    def close(self):
+        self.fechada = True
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = RelogioFalso()
+    monkeypatch.setattr(api, "time", relogio)
+    return relogio
+
+
+@pytest.fixture
+def rede(monkeypatch):
+    """
+    session.request falso: responde com os itens de rede.respostas em ordem (o
+    último se repete); exceções são levantadas. Limitadores e memo começam vazios.
+    """
+    class Rede:
+        respostas = []
+        chamadas = []
+
+    def request(metodo, url, **kwargs):
+        Rede.chamadas.append((metodo, url))
+        resposta = Rede.respostas.pop(0) if len(Rede.respostas) > 1 else Rede.respostas[0]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    monkeypatch.setattr(api, "_limitadores", {})
+    monkeypatch.setattr(api, "_memo_respostas", {})
+    monkeypatch.setattr(api.session, "request", request)
+    return Rede
+
+
+# ==================== CONTAS COM LANCE (WEMIXPLAY) ====================
+
+LANCE = {
+    "tid": "123",
+    "nftName": "Conta",
+    "currentStatus": {"isBidOngoing": True},
+    "order": {"price": {"amount": str(5 * 10**18)}},
+    "metaData": {"external_url": "https://xdraco.com/nft/trade/42", "attributes": []},
+}
+
+
+@pytest.fixture
+def cache_bid(monkeypatch):
+    """Lista de lances velha (passou do TTL, dentro do TTL máximo) e revalidação síncrona"""
+    lista = [{"nftID": "999", "name": "Antiga"}]
+    timestamp = time.time() - api._cache_contas_bid["ttl"] - 60
+    monkeypatch.setitem(api._cache_contas_bid, "data", lista)
+    monkeypatch.setitem(api._cache_contas_bid, "nft_ids", {"999"})
+    monkeypatch.setitem(api._cache_contas_bid, "timestamp", timestamp)
+    monkeypatch.setattr(api, "agendar_revalidacao", lambda chave, funcao, *args: funcao(*args))
+    return lista, timestamp
+
+
+@pytest.mark.parametrize("falha", [
+    RespostaFalsa(503),
+    RespostaFalsa(200, {"erro": "formato inesperado"}),
+    requests.exceptions.Timeout("timeout"),
+    api.CircuitoAberto("circuito aberto"),
+])
+def test_revalidacao_com_falha_mantem_lista_velha(rede, cache_bid, falha):
+    lista, timestamp = cache_bid
+    rede.respostas = [falha]
+
+    assert api.buscar_contas_com_bid_wemixplay() is None
+    contas, nft_ids, do_cache = api.obter_contas_com_bid_cached()
+
+    assert (contas, nft_ids, do_cache) == (lista, {"999"}, True)
+    assert api._cache_contas_bid["data"] is lista
+    assert api._cache_contas_bid["timestamp"] == timestamp
+    # A próxima requisição continua recebendo a lista velha, sem busca síncrona
+    assert api.obter_contas_com_bid_cached()[0] is lista
+
+
+def test_revalidacao_com_sucesso_substitui_lista(rede, cache_bid):
+    rede.respostas = [RespostaFalsa(200, {"data": {"result": [LANCE]}})]
+
+    api.obter_contas_com_bid_cached()
+
+    assert api._cache_contas_bid["nft_ids"] == {"123"}
+    assert api._cache_contas_bid["data"][0]["seq"] == 42
+    assert api._cache_contas_bid["data"][0]["price"] == 5
+
+
+def test_sem_leiloes_ativos_e_lista_vazia(rede, cache_bid):
+    rede.respostas = [RespostaFalsa(200, {"data": {"result": []}})]
+
+    assert api.buscar_contas_com_bid_wemixplay() == []
+    api._atualizar_cache_contas_bid()
+    assert api._cache_contas_bid["data"] == []
+
+
+# ==================== CIRCUIT BREAKER E RETRY ====================
+
+URL = "https://api.exemplo.com/recurso"
+
+
+@pytest.fixture
+def circuito(monkeypatch, relogio, rede):
+    monkeypatch.setattr(api, "API_CIRCUITO_FALHAS", 3)
+    monkeypatch.setattr(api, "API_CIRCUITO_SEGUNDOS", 30)
+    monkeypatch.setattr(api, "API_RETRY_TENTATIVAS", 2)
+    return rede
+
+
+def _abrir_circuito(rede):
+    rede.respostas = [RespostaFalsa(503)]
+    for _ in range(api.API_CIRCUITO_FALHAS):
+        assert api._requisitar("GET", URL).status_code == 503
+
+
+def test_circuito_abre_depois_de_falhas_seguidas(circuito, relogio):
+    _abrir_circuito(circuito)
+    chamadas = len(circuito.chamadas)
+
+    with pytest.raises(api.CircuitoAberto):
+        api._requisitar("GET", URL)
+    assert len(circuito.chamadas) == chamadas
+    assert api.get_status_limitadores()["api.exemplo.com"]["circuito"] == "aberto"
+
+
+def test_sucesso_zera_falhas_seguidas(circuito):
+    circuito.respostas = [RespostaFalsa(503), RespostaFalsa(503), RespostaFalsa(200), RespostaFalsa(503)]
+    for _ in range(4):
+        api._requisitar("GET", URL)
+
+    assert api._limitador(URL).falhas_seguidas == 1
+
+
+def test_429_nao_conta_para_o_circuito(circuito):
+    circuito.respostas = [RespostaFalsa(429)]
+    for _ in range(api.API_CIRCUITO_FALHAS * 2):
+        assert api._requisitar("GET", URL).status_code == 429
+
+    assert api._limitador(URL).falhas_seguidas == 0
+    assert api.get_status_limitadores()["api.exemplo.com"]["circuito"] == "fechado"
+
+
+def test_meio_aberto_libera_um_unico_teste(circuito, relogio):
+    _abrir_circuito(circuito)
+    relogio.agora += api.API_CIRCUITO_SEGUNDOS
+    limitador = api._limitador(URL)
+
+    limitador.verificar_circuito()
+    with pytest.raises(api.CircuitoAberto):
+        limitador.verificar_circuito()
+
+
+def test_teste_com_sucesso_fecha_o_circuito(circuito, relogio):
+    _abrir_circuito(circuito)
+    relogio.agora += api.API_CIRCUITO_SEGUNDOS
+    circuito.respostas = [RespostaFalsa(200)]
+
+    assert api._requisitar("GET", URL).status_code == 200
+    assert api._limitador(URL).falhas_seguidas == 0
+    assert api._requisitar("GET", URL).status_code == 200
+
+
+def test_teste_com_falha_abre_o_circuito_de_novo(circuito, relogio):
+    _abrir_circuito(circuito)
+    relogio.agora += api.API_CIRCUITO_SEGUNDOS
+    circuito.respostas = [requests.exceptions.ConnectionError("recusada")]
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        api._requisitar("GET", URL)
+    with pytest.raises(api.CircuitoAberto):
+        api._requisitar("GET", URL)
+    assert api._limitador(URL).aberto_ate == relogio.agora + api.API_CIRCUITO_SEGUNDOS
+
+
+def test_get_repete_5xx_e_fecha_respostas_descartadas(circuito, relogio):
+    descartada = RespostaFalsa(502)
+    circuito.respostas = [descartada, RespostaFalsa(200)]
+
+    assert api._get(URL).status_code == 200
+    assert len(circuito.chamadas) == 2
+    assert descartada.fechada
+    assert len(relogio.esperas) == 1
+
+
+def test_get_devolve_a_ultima_resposta_depois_das_tentativas(circuito):
+    circuito.respostas = [RespostaFalsa(500)]
+
+    assert api._get(URL).status_code == 500
+    assert len(circuito.chamadas) == api.API_RETRY_TENTATIVAS + 1
+
+
+def test_get_nao_repete_circuito_aberto(circuito, relogio):
+    _abrir_circuito(circuito)
+    chamadas = len(circuito.chamadas)
+    relogio.esperas.clear()
+
+    with pytest.raises(api.CircuitoAberto):
+        api._get(URL)
+    assert len(circuito.chamadas) == chamadas
+    assert relogio.esperas == []
+
+
+# ==================== TOKEN BUCKET E AIMD ====================
+
+@pytest.fixture
+def limitador(monkeypatch, relogio):
+    monkeypatch.setattr(api, "API_MAX_REQUISICOES", 8)
+    monkeypatch.setattr(api, "API_CONCORRENCIA_INICIAL", 4)
+    monkeypatch.setattr(api, "API_CONCORRENCIA_MIN", 1)
+    monkeypatch.setattr(api, "API_LATENCIA_ALVO", 2.0)
+    monkeypatch.setattr(api, "API_TAXA_POR_SEGUNDO", 4.0)
+    monkeypatch.setattr(api, "API_RAJADA", 3)
+    return api._LimitadorHost("api.exemplo.com")
+
+
+def _requisicao(limitador, latencia=0.1, falhou=False, **kwargs):
+    limitador.entrar()
+    limitador.sair(latencia, falhou, **kwargs)
+
+
+def test_falha_corta_limite_pela_metade_uma_vez_por_janela(limitador, relogio):
+    _requisicao(limitador, falhou=True)
+    assert limitador.limite == 2
+
+    _requisicao(limitador, falhou=True)
+    assert limitador.limite == 2
+
+    relogio.agora += 1.0
+    _requisicao(limitador, falhou=True, indisponivel=True)
+    assert limitador.limite == 1
+
+    relogio.agora += 1.0
+    _requisicao(limitador, falhou=True)
+    assert limitador.limite == api.API_CONCORRENCIA_MIN
+    assert limitador.erros == 4
+
+
+def test_janela_de_reducao_acompanha_a_latencia(limitador, relogio):
+    _requisicao(limitador, latencia=5.0, falhou=True)
+    assert limitador.limite == 2
+
+    relogio.agora += 2.0
+    _requisicao(limitador, latencia=5.0, falhou=True)
+    assert limitador.limite == 2
+
+    relogio.agora += 3.0
+    _requisicao(limitador, latencia=5.0, falhou=True)
+    assert limitador.limite == 1
+
+
+def test_sucesso_rapido_soma_um_sobre_limite(limitador):
+    _requisicao(limitador)
+    assert limitador.limite == pytest.approx(4.25)
+
+    _requisicao(limitador, latencia=api.API_LATENCIA_ALVO + 1)
+    assert limitador.limite == pytest.approx(4.25)
+
+
+def test_limite_nao_passa_do_maximo(limitador):
+    for _ in range(200):
+        _requisicao(limitador)
+
+    assert limitador.limite == api.API_MAX_REQUISICOES
+    assert limitador.em_andamento == 0
+
+
+def test_retry_after_pausa_o_host(limitador, relogio):
+    _requisicao(limitador, falhou=True, retry_after=7)
+    assert limitador.pausado_ate == relogio.agora + 7
+    relogio.esperas.clear()
+
+    limitador.entrar()
+    assert relogio.esperas == [pytest.approx(7)]
+
+
+def test_tokens_esgotados_esperam_reposicao(limitador, relogio):
+    for _ in range(api.API_RAJADA):
+        _requisicao(limitador)
+    assert relogio.esperas == []
+
+    limitador.entrar()
+    assert relogio.esperas == [pytest.approx(1 / api.API_TAXA_POR_SEGUNDO)]
@@ -0,0 +1,253 @@
+"""
+Testes do índice colunar da busca (core.busca)
+
+As referências abaixo são os filtros e a ordenação de /buscar-contas em Python
+puro, como eram antes do índice; o índice tem que dar exatamente o mesmo resultado.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from core.busca import IndiceContas, ORDENACOES, ORDENACOES_STATUS, valor_status
+from core.constants import NOMES_BLOQUEADOS
+
+SERVIDORES = ["ASIA011", "ASIA012", "EU011", "NA051", ""]
+ESPIRITOS = ["Lobo Branco", "Tigre", "Fênix", "lobo"]
+ITENS = ["Adaga", "Abóbora Sinistra Épica", "Pedra"]
+NOMES_STATUS = ["CRÍTICO", "EVASÃO", "EVASÃO DE CRÍTICO", "ATAQUE FÍSICO", "HP",
+                "ACELERAMENTO DE TEMPO DE MINERAÇÃO"]
+VALORES_STATUS = ["0", "7", "12", "1,234", "3.5%", "12 s", "abc", "", 15, 2.5]
+
+
+def _conta_aleatoria(aleatorio, seq):
+    conta = {
+        "seq": seq,
+        "name": f"Conta{seq}",
+        "class": str(aleatorio.randint(1, 6)),
+        "price": aleatorio.choice([0, 10, 55.5, 300, 1200]),
+        "nftID": f"N{seq}",
+        "basic": {"name": f"Conta{seq}"},
+        "equip": [
+            {"grade": aleatorio.choice([3, 4, 5]), "trade": aleatorio.random() < .5}
+            for _ in range(aleatorio.randint(0, 8))
+        ],
+        "stats": [
+            {"statName": aleatorio.choice(NOMES_STATUS), "statValue": aleatorio.choice(VALORES_STATUS)}
+            for _ in range(aleatorio.randint(0, 6))
+        ],
+        "inven_all": [
+            {"name": aleatorio.choice(ITENS), "count": aleatorio.randint(0, 5)}
+            for _ in range(aleatorio.randint(0, 5))
+        ],
+        "spirit_list": [{"name": nome} for nome in aleatorio.sample(ESPIRITOS, aleatorio.randint(0, 2))],
+    }
+    # Campos que nem toda conta tem (contas fora do cache completo vêm sem eles)
+    if aleatorio.random() < .9:
+        conta["worldName"] = aleatorio.choice(SERVIDORES)
+    if aleatorio.random() < .9:
+        conta["powerScore"] = aleatorio.randint(1000, 500000)
+        conta["level"] = aleatorio.randint(50, 150)
+    else:
+        conta["basic"].update(powerScore=aleatorio.randint(1000, 500000), level=aleatorio.randint(50, 150))
+    if aleatorio.random() < .9:
+        conta["codex"] = aleatorio.randint(0, 900)
+        conta["potencial"] = aleatorio.randint(0, 80)
+        conta["building"] = {"mina": aleatorio.randint(0, 20)}
+        conta["spirit"] = {"lendarios": aleatorio.randint(0, 5), "grade6": aleatorio.randint(0, 2)}
+        conta["skills"] = {"lendarias": aleatorio.randint(0, 4)}
+        conta["training"] = {
+            chave: aleatorio.randint(0, 20) for chave in ("constituicao", "muscular", "noveyin", "noveyang", "sapo")
+        }
+    return conta
+
+
+@pytest.fixture(scope="module")
+def contas():
+    aleatorio = random.Random(7)
+    contas = [_conta_aleatoria(aleatorio, seq) for seq in range(300)]
+    if NOMES_BLOQUEADOS:
+        contas[3]["basic"]["name"] = NOMES_BLOQUEADOS[0]
+    return contas
+
+
+@pytest.fixture(scope="module")
+def indice(contas):
+    return IndiceContas(contas)
+
+
+# ==================== REFERÊNCIAS ====================
+
+def _passa_referencia(conta, filtros, is_premium, servidores_regiao, nft_ids_com_bid, itens_minimos, espiritos):
+    if conta.get("basic", {}).get("name", conta.get("name", "")) in NOMES_BLOQUEADOS:
+        return False
+    if filtros.get("classe") and filtros["classe"] != "0" and str(conta.get("class", "1")) != filtros["classe"]:
+        return False
+    if filtros.get("status_lance") == "bidding" and str(conta.get("nftID", "")) not in nft_ids_com_bid:
+        return False
+
+    world_name = conta.get("worldName", conta.get("basic", {}).get("worldName", ""))
+    if filtros.get("servidor"):
+        if world_name != filtros["servidor"]:
+            return False
+    elif filtros.get("regiao") and servidores_regiao and world_name not in servidores_regiao:
+        return False
+
+    equipamentos = conta.get("equip", [])
+    valores = {
+        "power": conta.get("powerScore", conta.get("basic", {}).get("powerScore", 0)),
+        "level": conta.get("level", conta.get("basic", {}).get("level", 0)),
+        "price": conta.get("price", 0),
+        "mina": conta.get("building", {}).get("mina", 0),
+        "codex": conta.get("codex", 0),
+        "itens_comercio": sum(1 for e in equipamentos if e.get("grade", 0) == 5),
+        "equip_lend_trade": sum(1 for e in equipamentos if e.get("trade") and e.get("grade") == 5),
+        "equip_epic_trade": sum(1 for e in equipamentos if e.get("trade") and e.get("grade") == 4),
+    }
+    if is_premium:
+        training = conta.get("training", {})
+        valores.update(
+            pets_lendarios=conta.get("spirit", {}).get("lendarios", 0),
+            treino_constituicao=training.get("constituicao", 0),
+            constituicao=training.get("constituicao", 0),
+            treino_muscular=training.get("muscular", 0),
+            treino_noveyin=training.get("noveyin", 0),
+            treino_noveyang=training.get("noveyang", 0),
+            treino_sapo=training.get("sapo", 0),
+            habs_lendarias=conta.get("skills", {}).get("lendarias", 0),
+            pets_misticos=conta.get("spirit", {}).get("grade6", 0),
+            potencial=conta.get("potencial", 0),
+        )
+    for chave, valor in valores.items():
+        if filtros.get(f"{chave}_min") and valor < filtros[f"{chave}_min"]:
+            return False
+        if chave.startswith("treino_") and filtros.get(chave) and valor < filtros[chave]:
+            return False
+        if filtros.get(f"{chave}_max") and valor > filtros[f"{chave}_max"]:
+            return False
+
+    if is_premium:
+        quantidades = {}
+        for item in conta.get("inven_all", []):
+            quantidades[item["name"]] = quantidades.get(item["name"], 0) + (item.get("count", 1) or 1)
+        for nome_item, qtd_min in itens_minimos.items():
+            if quantidades.get(nome_item, 0) < qtd_min:
+                return False
+        nomes_espiritos = [s.get("name", "").lower() for s in conta.get("spirit_list", [])]
+        for termo in espiritos:
+            if not any(termo in nome for nome in nomes_espiritos):
+                return False
+    return True
+
+
+def _status_referencia(conta, trecho):
+    for stat in conta.get("stats", []):
+        if isinstance(stat, dict) and trecho.upper() in stat.get("statName", "").upper():
+            try:
+                valor = stat.get("statValue", "0")
+                if isinstance(valor, str):
+                    valor = valor.replace(",", "").replace("%", "")
+                return float(valor)
+            except Exception:
+                return 0
+    return 0
+
+
+CHAVES_REFERENCIA = {
+    "power": lambda x: x.get("powerScore", x.get("basic", {}).get("powerScore", 0)),
+    "price": lambda x: x.get("price", 0),
+    "level": lambda x: x.get("level", x.get("basic", {}).get("level", 0)),
+    "codex": lambda x: x.get("codex", 0),
+    "mina": lambda x: x.get("building", {}).get("mina", 0),
+    "constituicao": lambda x: x.get("training", {}).get("constituicao", 0),
+    **{
+        nome: (lambda x, trecho=trecho: _status_referencia(x, trecho))
+        for nome, trecho in ORDENACOES_STATUS.items()
+    },
+}
+
+
+# ==================== MÁSCARA ====================
+
+FAIXAS = {
+    "power_min": (1000, 400000), "power_max": (1000, 500000), "level_min": (50, 150), "level_max": (50, 150),
+    "price_min": (0, 400), "price_max": (0, 1300), "codex_min": (0, 900), "mina_min": (0, 20),
+    "itens_comercio_min": (0, 4), "equip_lend_trade_min": (0, 3), "equip_epic_trade_min": (0, 3),
+    "pets_lendarios_min": (0, 5), "pets_misticos_min": (0, 2), "habs_lendarias_min": (0, 4),
+    "potencial_min": (0, 80), "treino_constituicao": (0, 20), "constituicao_min": (0, 20),
+    "treino_muscular": (0, 20), "treino_noveyin": (0, 20), "treino_noveyang": (0, 20), "treino_sapo": (0, 20),
+}
+
+
+def _consultas(quantidade, semente):
+    aleatorio = random.Random(semente)
+    for _ in range(quantidade):
+        filtros = {chave: aleatorio.randint(*FAIXAS[chave]) for chave in aleatorio.sample(list(FAIXAS), aleatorio.randint(0, 4))}
+        if aleatorio.random() < .3:
+            filtros["classe"] = str(aleatorio.randint(0, 6))
+        if aleatorio.random() < .2:
+            filtros["regiao"] = "ASIA"
+        if aleatorio.random() < .1:
+            filtros["servidor"] = aleatorio.choice(SERVIDORES[:-1])
+        if aleatorio.random() < .2:
+            filtros["status_lance"] = aleatorio.choice(["bidding", "listado"])
+        itens_minimos = {}
+        if aleatorio.random() < .3:
+            itens_minimos = {nome: aleatorio.randint(1, 6) for nome in aleatorio.sample(ITENS, aleatorio.randint(1, 2))}
+        espiritos = []
+        if aleatorio.random() < .3:
+            espiritos = aleatorio.choice([["lobo"], ["lobo", "tig"], ["fênix", ""], ["x"]])
+        yield filtros, aleatorio.random() < .5, itens_minimos, espiritos
+
+
+@pytest.mark.parametrize("filtros, is_premium, itens_minimos, espiritos", list(_consultas(200, 11)))
+def test_mascara_igual_ao_filtro_em_python(contas, indice, filtros, is_premium, itens_minimos, espiritos):
+    servidores_regiao = ["ASIA011", "ASIA012"] if filtros.get("regiao") else []
+    nft_ids_com_bid = {"N5", "N7", "N11", "N200", "N999"}
+
+    mascara = indice.mascara(
+        filtros, is_premium=is_premium, servidores_regiao=servidores_regiao,
+        nft_ids_com_bid=nft_ids_com_bid, itens_minimos=itens_minimos, espiritos=espiritos
+    )
+
+    esperadas = [
+        linha for linha, conta in enumerate(contas)
+        if _passa_referencia(conta, filtros, is_premium, servidores_regiao, nft_ids_com_bid, itens_minimos, espiritos)
+    ]
+    assert np.flatnonzero(mascara).tolist() == esperadas
+
+
+def test_mascara_sem_filtros_exclui_so_bloqueadas(contas, indice):
+    mascara = indice.mascara({})
+    bloqueadas = [linha for linha, conta in enumerate(contas) if conta["basic"]["name"] in NOMES_BLOQUEADOS]
+    assert np.flatnonzero(~mascara).tolist() == bloqueadas
+
+
+# ==================== ORDENAÇÃO ====================
+
+def test_valor_status_igual_a_chave_em_python(contas):
+    for conta in contas:
+        for trecho in ORDENACOES_STATUS.values():
+            assert valor_status(conta, trecho) == _status_referencia(conta, trecho)
+
+
+@pytest.mark.parametrize("ordenar_por", ORDENACOES)
+@pytest.mark.parametrize("desc", [False, True])
+def test_ordenacao_igual_ao_sort_em_python(contas, indice, ordenar_por, desc):
+    chave = CHAVES_REFERENCIA[ordenar_por]
+    for filtros, is_premium, itens_minimos, espiritos in _consultas(20, 23):
+        mascara = indice.mascara(filtros, is_premium=is_premium, itens_minimos=itens_minimos, espiritos=espiritos)
+        linhas = np.flatnonzero(mascara).tolist()
+        # list.sort é estável também com reverse=True: empates ficam na ordem do snapshot
+        esperadas = sorted(linhas, key=lambda linha: chave(contas[linha]), reverse=desc)
+
+        assert indice.ordenar(mascara, ordenar_por, desc).tolist() == esperadas
+        for k in (0, 1, 10, len(linhas) + 5):
+            assert indice.primeiras(mascara, k, ordenar_por, desc).tolist() == esperadas[:k]
+
+
+def test_ordenacao_desconhecida_mantem_ordem_do_snapshot(indice):
+    mascara = indice.mascara({"price_min": 50})
+    linhas = np.flatnonzero(mascara).tolist()
+    assert indice.ordenar(mascara, "xyz").tolist() == linhas
+    assert indice.primeiras(mascara, 5, "xyz").tolist() == linhas[:5]
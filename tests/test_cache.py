@@ -0,0 +1,259 @@
+"""Testes do cache em arquivos (core.cache)"""
+import pickle
+from datetime import datetime
+
+import pytest
+
+from core import cache
+
+
+CONTAS = [{"seq": i, "name": f"Conta{i}", "stats": [{"statName": "HP", "statValue": str(i)}]} for i in range(50)]
+
+
+# ==================== CACHE EM MEMÓRIA ====================
+
+def test_memoria_cobra_payload_descomprimido(diretorio_cache):
+    contas = [dict(conta, inven=["Pedra"] * 200) for conta in CONTAS]
+    cache.save_to_cache("contas_completas", contas, formato="pickle", compressao=("gzip", 9))
+    assert cache.read_from_cache("contas_completas") == contas
+
+    item = cache._cache_memoria["contas_completas"]
+    descomprimido = len(pickle.dumps(contas, protocol=pickle.HIGHEST_PROTOCOL))
+    assert item["size"] < descomprimido
+    assert item["custo"] == int(descomprimido * cache.CACHE_MEMORIA_FATOR)
+    assert cache.get_status_cache_memoria()["bytes"] == item["custo"]
+
+
+def test_memoria_respeita_orcamento(diretorio_cache, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_MEMORIA_MAX_BYTES", 60 * 1024)
+    for i in range(10):
+        cache.save_to_cache(f"entrada_{i}", CONTAS)
+        cache.read_from_cache(f"entrada_{i}")
+
+    status = cache.get_status_cache_memoria()
+    assert 0 < status["entradas"] < 10
+    assert status["bytes"] <= 60 * 1024
+    # As mais recentes ficam, as menos usadas saem primeiro
+    assert "entrada_9" in cache._cache_memoria
+    assert "entrada_0" not in cache._cache_memoria
+
+
+# ==================== FORMATO BINÁRIO ====================
+
+@pytest.mark.parametrize("formato, compressao", [
+    ("pickle", None),
+    ("pickle", ("gzip", 1)),
+    ("registros", None),
+    ("registros", ("gzip", 1)),
+])
+def test_formato_binario_ida_e_volta(diretorio_cache, formato, compressao):
+    assert cache.save_to_cache("chave_teste", CONTAS, expiry_minutes=30, formato=formato,
+                               hard_expiry_minutes=90, compressao=compressao)
+
+    cabecalho = cache.ler_cabecalho_cache("chave_teste")
+    assert cabecalho["formato"] == formato
+    assert cabecalho["compressao"] == (compressao[0] if compressao else None)
+    assert cabecalho["count"] == len(CONTAS)
+    assert cabecalho["expiry_minutes"] == 30
+    assert cabecalho["hard_expiry_minutes"] == 90
+    assert not cabecalho["expirado"]
+
+    cache.invalidar_cache_memoria()
+    assert cache.read_from_cache("chave_teste") == CONTAS
+
+
+def test_cabecalho_versao_1_continua_legivel(diretorio_cache):
+    caminho = cache._caminho_cache("chave_v1", "bin")
+    with open(caminho, "wb") as f:
+        f.write(cache._CABECALHO_V1.pack(
+            cache._CABECALHO_MAGIC, 1, cache.SERIALIZADORES["pickle"]["id"],
+            datetime.now().timestamp(), 60.0, len(CONTAS)
+        ))
+        pickle.dump(CONTAS, f)
+
+    cabecalho = cache.ler_cabecalho_cache("chave_v1")
+    assert cabecalho["formato"] == "pickle"
+    assert cabecalho["compressao"] is None
+    assert cabecalho["hard_expiry_minutes"] == 60.0
+    assert cache.read_from_cache("chave_v1") == CONTAS
+
+
+def test_cabecalho_invalido_nao_e_servido(diretorio_cache):
+    with open(cache._caminho_cache("chave_ruim", "bin"), "wb") as f:
+        f.write(b"XXXX" + bytes(60))
+
+    assert cache.ler_cabecalho_cache("chave_ruim") is None
+    assert cache.read_from_cache("chave_ruim") is None
+
+
+# ==================== ARMAZÉM DE DETALHES ====================
+
+def _salvar_varias(quantidade, versao=0):
+    for i in range(quantidade):
+        cache.salvar_detalhes_conta(i, {"seq": i, "versao": versao, "inven": list(range(i))})
+
+
+def test_detalhes_ida_e_volta(diretorio_cache):
+    _salvar_varias(40)
+    for i in range(40):
+        assert cache.ler_detalhes_conta(i) == {"seq": i, "versao": 0, "inven": list(range(i))}
+    assert cache.ler_detalhes_conta(999) is None
+    assert cache.total_detalhes_contas() == 40
+
+
+def test_detalhes_versao_mais_nova_vence(diretorio_cache):
+    _salvar_varias(10)
+    _salvar_varias(5, versao=1)
+    assert [cache.ler_detalhes_conta(i)["versao"] for i in range(10)] == [1] * 5 + [0] * 5
+    assert dict(cache.iterar_detalhes_contas()) == {
+        str(i): cache.ler_detalhes_conta(i) for i in range(10)
+    }
+
+
+def test_detalhes_velhos_e_vencidos(diretorio_cache):
+    cache.salvar_detalhes_conta("velha", {"a": 1}, expiry_minutes=0, hard_expiry_minutes=60)
+    cache.salvar_detalhes_conta("vencida", {"b": 2}, expiry_minutes=0, hard_expiry_minutes=0)
+
+    assert cache.ler_detalhes_conta("velha") is None
+    assert cache.ler_detalhes_conta_com_estado("velha") == ({"a": 1}, "velho")
+    assert cache.ler_detalhes_conta_com_estado("vencida") == (None, None)
+
+
+def test_indice_recarregado_do_disco(diretorio_cache):
+    _salvar_varias(20)
+    assert cache.salvar_indice_detalhes()
+    # Registros gravados depois do índice salvo são achados na varredura dos segmentos
+    cache.salvar_detalhes_conta(3, {"seq": 3, "versao": 2})
+    cache.salvar_detalhes_conta("nova", {"seq": "nova"})
+
+    cache._indice_detalhes = None
+    assert cache.total_detalhes_contas() == 21
+    assert cache.ler_detalhes_conta(3) == {"seq": 3, "versao": 2}
+    assert cache.ler_detalhes_conta("nova") == {"seq": "nova"}
+    assert cache.ler_detalhes_conta(7)["versao"] == 0
+
+
+def test_compactacao_mantem_indice_consistente(diretorio_cache):
+    _salvar_varias(30)
+    _salvar_varias(30, versao=1)
+    cache.salvar_detalhes_conta("vencida", {"x": 1}, expiry_minutes=0, hard_expiry_minutes=0)
+    esperado = {i: cache.ler_detalhes_conta(i) for i in range(30)}
+
+    liberados = cache.compactar_detalhes()
+
+    assert liberados > 0
+    assert cache.total_detalhes_contas() == 30
+    assert {i: cache.ler_detalhes_conta(i) for i in range(30)} == esperado
+    # O índice gravado pela compactação aponta para os segmentos novos
+    cache._indice_detalhes = None
+    assert {i: cache.ler_detalhes_conta(i) for i in range(30)} == esperado
+
+
+def test_compactacao_durante_leitura_nao_descarta_entrada(diretorio_cache, monkeypatch):
+    _salvar_varias(30)
+    _salvar_varias(30, versao=1)
+
+    # Compacta entre a consulta ao índice e a abertura do segmento, como faria
+    # outra thread: o offset lido do índice deixa de valer no arquivo novo
+    caminho_original = cache._caminho_segmento
+    compactou = []
+
+    def caminho_compactando(segmento):
+        if not compactou:
+            compactou.append(True)
+            cache.compactar_detalhes()
+        return caminho_original(segmento)
+
+    monkeypatch.setattr(cache, "_caminho_segmento", caminho_compactando)
+    assert cache.ler_detalhes_conta(12) == {"seq": 12, "versao": 1, "inven": list(range(12))}
+    assert compactou
+    assert cache.total_detalhes_contas() == 30
+
+
+# ==================== SNAPSHOT (MMAP) ====================
+
+@pytest.mark.parametrize("compressao", [None, ("gzip", 1)])
+def test_snapshot_decodifica_sob_demanda(diretorio_cache, monkeypatch, compressao):
+    cache.save_to_cache("contas_completas", CONTAS, compressao=compressao)
+    snapshot = cache.abrir_snapshot_contas("contas_completas")
+
+    decodificados = []
+    loads_original = pickle.loads
+    monkeypatch.setattr(cache.pickle, "loads", lambda dados: decodificados.append(1) or loads_original(dados))
+
+    assert len(snapshot) == len(CONTAS)
+    assert decodificados == []
+    assert snapshot[7] == CONTAS[7]
+    assert snapshot[-1] == CONTAS[-1]
+    assert len(decodificados) == 2
+    assert list(snapshot) == CONTAS
+    with pytest.raises(IndexError):
+        snapshot[len(CONTAS)]
+
+
+def test_snapshot_reaproveitado_ate_o_arquivo_mudar(diretorio_cache):
+    cache.save_to_cache("contas_completas", CONTAS)
+    snapshot = cache.abrir_snapshot_contas("contas_completas")
+    assert cache.abrir_snapshot_contas("contas_completas") is snapshot
+
+    cache.save_to_cache("contas_completas", CONTAS[:10])
+    novo = cache.abrir_snapshot_contas("contas_completas")
+    assert novo is not snapshot
+    assert len(novo) == 10
+    # Quem já tinha o mapeamento antigo continua lendo a versão anterior
+    assert list(snapshot) == CONTAS
+
+
+def test_snapshot_expirado_ou_em_outro_formato(diretorio_cache):
+    cache.save_to_cache("contas_completas", CONTAS, expiry_minutes=0)
+    assert cache.abrir_snapshot_contas("contas_completas") is None
+
+    cache.save_to_cache("outra_chave", CONTAS, formato="pickle")
+    assert cache.abrir_snapshot_contas("outra_chave") is None
+    assert cache.abrir_snapshot_contas("inexistente") is None
+
+
+# ==================== SINGLE-FLIGHT ====================
+
+def test_executar_unico_compartilha_uma_execucao():
+    import threading
+
+    chamadas = []
+    liberar = threading.Event()
+
+    def buscar():
+        chamadas.append(1)
+        liberar.wait(5)
+        return {"dados": 42}
+
+    resultados = []
+    threads = [
+        threading.Thread(target=lambda: resultados.append(cache.executar_unico("chave_sf", buscar)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    # Espera todas as threads estarem na mesma execução antes de liberar a função
+    for _ in range(500):
+        voo = cache._em_andamento.get("chave_sf")
+        if voo is not None and voo["aguardando"] == 7:
+            break
+        threading.Event().wait(0.01)
+    liberar.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(chamadas) == 1
+    assert resultados == [{"dados": 42}] * 8
+    assert "chave_sf" not in cache._em_andamento
+    # Sem execução em andamento a próxima chamada executa de novo
+    assert cache.executar_unico("chave_sf", lambda: "outra") == "outra"
+
+
+def test_executar_unico_repassa_a_excecao():
+    def falhar():
+        raise ValueError("upstream fora")
+
+    with pytest.raises(ValueError, match="upstream fora"):
+        cache.executar_unico("chave_erro", falhar)
+    assert "chave_erro" not in cache._em_andamento
@@ -0,0 +1,175 @@
+"""Testes da retomada do carregamento completo pelo checkpoint (core.loader)"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from core import cache, loader
+
+DETALHES_COMPLETOS = {
+    "tradeType": 1, "nftID": "1", "stats": [{"statName": "HP", "statValue": "100"}],
+    "inven_all": [{"name": "Adaga", "trade": True}], "spirit": {"lendarios": 0},
+}
+
+
+@pytest.fixture
+def checkpoint_em_disco(diretorio_cache, monkeypatch):
+    monkeypatch.setattr(loader, "CHECKPOINT_MAX_HORAS", 6.0)
+    monkeypatch.setattr(loader, "PUBLICACAO_PARCIAL_SEGUNDOS", 0)
+
+    def gravar(iniciado_em=None, concluidas=""):
+        loader._salvar_checkpoint_listagem({
+            "iniciado_em": (iniciado_em or datetime.now()).isoformat(),
+            "pagina": 3,
+            "contas": [{"seq": 1}, {"seq": 2}, {"seq": 3}],
+            "listagem_completa": True,
+            "concluidas": set(),
+        })
+        with open(loader.CHECKPOINT_CONCLUIDAS_PATH, 'w', encoding='utf-8') as f:
+            f.write(concluidas)
+
+    return gravar
+
+
+@pytest.fixture
+def carregamento_falso(monkeypatch):
+    """Substitui _carregar_detalhes_contas: registra as contas pedidas e conclui cada uma"""
+    pedidas = []
+
+    def carregar(contas, rotulo, ao_concluir=None, publicar_parcial=None):
+        pedidas.extend(conta["seq"] for conta in contas)
+        resultados = []
+        for conta in contas:
+            completa = {"seq": conta["seq"], "incompleto": conta.get("incompleto", False)}
+            ao_concluir(completa)
+            resultados.append(completa)
+        return resultados, set()
+
+    monkeypatch.setattr(loader, "_carregar_detalhes_contas", carregar)
+    return pedidas
+
+
+def _arquivos_do_checkpoint():
+    return [os.path.exists(loader.CHECKPOINT_LISTAGEM_PATH),
+            os.path.exists(loader.CHECKPOINT_CONCLUIDAS_PATH)]
+
+
+# ==================== _ler_checkpoint ====================
+
+def test_sem_checkpoint(diretorio_cache):
+    assert loader._ler_checkpoint() is None
+    assert not loader.tem_checkpoint_carregamento()
+
+
+def test_le_listagem_e_concluidas(checkpoint_em_disco):
+    checkpoint_em_disco(concluidas="1\n2\n")
+
+    checkpoint = loader._ler_checkpoint()
+    assert checkpoint["pagina"] == 3
+    assert [conta["seq"] for conta in checkpoint["contas"]] == [1, 2, 3]
+    assert checkpoint["concluidas"] == {"1", "2"}
+
+
+def test_descarta_ultima_linha_truncada(checkpoint_em_disco):
+    checkpoint_em_disco(concluidas="1\n2\n3")
+
+    assert loader._ler_checkpoint()["concluidas"] == {"1", "2"}
+
+
+def test_descarta_checkpoint_antigo(checkpoint_em_disco):
+    checkpoint_em_disco(iniciado_em=datetime.now() - timedelta(hours=7), concluidas="1\n")
+
+    assert loader._ler_checkpoint() is None
+    assert _arquivos_do_checkpoint() == [False, False]
+
+
+def test_descarta_checkpoint_ilegivel(checkpoint_em_disco):
+    checkpoint_em_disco(concluidas="1\n")
+    with open(loader.CHECKPOINT_LISTAGEM_PATH, 'w', encoding='utf-8') as f:
+        f.write('{"iniciado_em": ')
+
+    assert loader._ler_checkpoint() is None
+    assert _arquivos_do_checkpoint() == [False, False]
+
+
+# ==================== _iniciar_checkpoint / force ====================
+
+def test_retomar_usa_checkpoint_existente(checkpoint_em_disco):
+    checkpoint_em_disco(concluidas="1\n")
+
+    checkpoint = loader._iniciar_checkpoint(retomar=True)
+    assert checkpoint["pagina"] == 3
+    assert checkpoint["concluidas"] == {"1"}
+
+
+def test_sem_retomar_descarta_checkpoint(checkpoint_em_disco):
+    checkpoint_em_disco(concluidas="1\n")
+
+    checkpoint = loader._iniciar_checkpoint(retomar=False)
+    assert checkpoint["pagina"] == 0
+    assert checkpoint["contas"] == []
+    assert checkpoint["concluidas"] == set()
+    assert _arquivos_do_checkpoint() == [False, False]
+
+
+@pytest.mark.parametrize("force, pagina", [(False, 3), (True, 0)])
+def test_carregamento_completo_force_descarta_checkpoint(checkpoint_em_disco, monkeypatch, force, pagina):
+    checkpoint_em_disco(concluidas="1\n")
+    iniciados = []
+
+    def listagem(checkpoint):
+        iniciados.append(checkpoint)
+        return []
+
+    monkeypatch.setattr(loader, "_listagem_com_checkpoint", listagem)
+    monkeypatch.setattr(loader, "cache_carregando", False)
+    loader.carregar_contas_completas(force=force)
+
+    assert [checkpoint["pagina"] for checkpoint in iniciados] == [pagina]
+    assert iniciados[0]["concluidas"] == ({"1"} if not force else set())
+
+
+# ==================== _carregar_detalhes_com_checkpoint ====================
+
+def test_concluidas_vem_do_armazem_e_as_demais_sao_buscadas(checkpoint_em_disco, carregamento_falso):
+    checkpoint_em_disco(concluidas="1\n")
+    cache.salvar_detalhes_conta(1, DETALHES_COMPLETOS)
+    checkpoint = loader._ler_checkpoint()
+
+    resultados, status = loader._carregar_detalhes_com_checkpoint(
+        checkpoint, checkpoint["contas"], "[TESTE]")
+
+    assert carregamento_falso == [2, 3]
+    assert [conta["seq"] for conta in resultados] == [1, 2, 3]
+    assert status == {"HP"}
+
+
+def test_concluida_sem_detalhes_no_armazem_e_buscada_de_novo(checkpoint_em_disco, carregamento_falso):
+    checkpoint_em_disco(concluidas="1\n2\n")
+    cache.salvar_detalhes_conta(1, DETALHES_COMPLETOS)
+    checkpoint = loader._ler_checkpoint()
+
+    loader._carregar_detalhes_com_checkpoint(checkpoint, checkpoint["contas"], "[TESTE]")
+
+    assert carregamento_falso == [2, 3]
+
+
+def test_concluida_incompleta_e_buscada_de_novo(checkpoint_em_disco, carregamento_falso):
+    checkpoint_em_disco(concluidas="1\n2\n")
+    cache.salvar_detalhes_conta(1, DETALHES_COMPLETOS)
+    cache.salvar_detalhes_conta(2, dict(DETALHES_COMPLETOS, incompleto=True))
+    checkpoint = loader._ler_checkpoint()
+
+    loader._carregar_detalhes_com_checkpoint(checkpoint, checkpoint["contas"], "[TESTE]")
+
+    assert carregamento_falso == [2, 3]
+
+
+def test_so_contas_completas_entram_no_checkpoint(checkpoint_em_disco, carregamento_falso):
+    checkpoint_em_disco()
+    checkpoint = loader._ler_checkpoint()
+    contas = [{"seq": 1}, {"seq": 2, "incompleto": True}, {"seq": 3}]
+
+    loader._carregar_detalhes_com_checkpoint(checkpoint, contas, "[TESTE]")
+
+    assert loader._ler_checkpoint()["concluidas"] == {"1", "3"}
@@ -0,0 +1,141 @@
+"""Testes do TTL adaptativo por grupo de endpoints (core.ttl_adaptativo)"""
+import pytest
+
+from core import ttl_adaptativo as ttl
+from core.ttl_adaptativo import (
+    CHAVES_POR_GRUPO, TTL_INICIAL_POR_GRUPO,
+    grupos_vencidos, minutos_ate_vencer, registrar_busca,
+)
+
+AGORA = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def limites(monkeypatch):
+    monkeypatch.setattr(ttl, "TTL_ADAPTATIVO_MIN_MINUTOS", 30.0)
+    monkeypatch.setattr(ttl, "TTL_ADAPTATIVO_MAX_MINUTOS", 2880.0)
+
+
+def _detalhes_com_historico(grupo, intervalo, buscado_em=AGORA):
+    return {"ttl_grupos": {grupo: {"intervalo": intervalo, "verificacoes": 0, "mudancas": 0,
+                                   "buscado_em": buscado_em}}}
+
+
+# ==================== grupos_vencidos ====================
+
+@pytest.mark.parametrize("detalhes", [None, {}, {"ttl_grupos": {}}])
+def test_sem_historico_todos_os_grupos_vencidos(detalhes):
+    assert grupos_vencidos(detalhes, agora=AGORA) == set(CHAVES_POR_GRUPO)
+
+
+def test_grupo_vence_quando_o_intervalo_passa():
+    detalhes = _detalhes_com_historico("stats", 60)
+
+    assert "stats" not in grupos_vencidos(detalhes, agora=AGORA + 59 * 60)
+    assert "stats" in grupos_vencidos(detalhes, agora=AGORA + 60 * 60)
+
+
+def test_grupo_sem_historico_vence_junto_com_os_outros():
+    detalhes = _detalhes_com_historico("stats", 60)
+
+    assert grupos_vencidos(detalhes, agora=AGORA) == set(CHAVES_POR_GRUPO) - {"stats"}
+
+
+# ==================== registrar_busca ====================
+
+def test_primeira_busca_usa_intervalo_inicial():
+    detalhes = {"stats": {"ATAQUE": "10"}}
+    registrar_busca(detalhes, "stats", None, agora=AGORA)
+
+    assert detalhes["ttl_grupos"]["stats"] == {
+        "intervalo": TTL_INICIAL_POR_GRUPO["stats"], "verificacoes": 0, "mudancas": 0,
+        "buscado_em": AGORA,
+    }
+
+
+def test_anterior_sem_historico_nao_conta_verificacao():
+    detalhes = {"stats": {"ATAQUE": "10"}}
+    registrar_busca(detalhes, "stats", {"stats": {"ATAQUE": "5"}}, agora=AGORA)
+
+    info = detalhes["ttl_grupos"]["stats"]
+    assert info["intervalo"] == TTL_INICIAL_POR_GRUPO["stats"]
+    assert info["verificacoes"] == 0
+
+
+def test_mudanca_corta_intervalo_pela_metade():
+    detalhes = _detalhes_com_historico("stats", 360)
+    detalhes["stats"] = {"ATAQUE": "11"}
+    registrar_busca(detalhes, "stats", {"stats": {"ATAQUE": "10"}}, agora=AGORA + 3600)
+
+    info = detalhes["ttl_grupos"]["stats"]
+    assert info["intervalo"] == 180
+    assert info["verificacoes"] == 1
+    assert info["mudancas"] == 1
+    assert info["buscado_em"] == AGORA + 3600
+
+
+def test_sem_mudanca_aumenta_intervalo_em_50_por_cento():
+    detalhes = _detalhes_com_historico("stats", 360)
+    detalhes["stats"] = {"ATAQUE": "10"}
+    registrar_busca(detalhes, "stats", {"stats": {"ATAQUE": "10"}}, agora=AGORA + 3600)
+
+    info = detalhes["ttl_grupos"]["stats"]
+    assert info["intervalo"] == 540
+    assert info["verificacoes"] == 1
+    assert info["mudancas"] == 0
+
+
+def test_intervalo_nao_passa_do_minimo():
+    detalhes = _detalhes_com_historico("resumo", 40)
+    detalhes["price"] = 200
+    registrar_busca(detalhes, "resumo", {"price": 100}, agora=AGORA)
+
+    assert detalhes["ttl_grupos"]["resumo"]["intervalo"] == 30
+
+
+def test_intervalo_nao_passa_do_maximo():
+    detalhes = _detalhes_com_historico("codex", 2000)
+    registrar_busca(detalhes, "codex", {}, agora=AGORA)
+
+    assert detalhes["ttl_grupos"]["codex"]["intervalo"] == 2880
+
+
+def test_so_chaves_do_grupo_contam_como_mudanca():
+    detalhes = _detalhes_com_historico("stats", 360)
+    detalhes.update({"stats": {"ATAQUE": "10"}, "price": 200})
+    registrar_busca(detalhes, "stats", {"stats": {"ATAQUE": "10"}, "price": 100}, agora=AGORA)
+
+    assert detalhes["ttl_grupos"]["stats"]["mudancas"] == 0
+
+
+def test_nao_altera_o_historico_dos_outros_grupos():
+    detalhes = _detalhes_com_historico("stats", 360)
+    antes = dict(detalhes["ttl_grupos"]["stats"])
+    registrar_busca(detalhes, "resumo", None, agora=AGORA + 60)
+
+    assert detalhes["ttl_grupos"]["stats"] == antes
+    assert set(detalhes["ttl_grupos"]) == {"stats", "resumo"}
+
+
+# ==================== minutos_ate_vencer ====================
+
+def test_minutos_sem_historico_usam_o_minimo():
+    assert minutos_ate_vencer({}, agora=AGORA) == (30.0, 30.0)
+
+
+def test_minutos_ate_o_primeiro_e_o_ultimo_grupo():
+    detalhes = {"ttl_grupos": {
+        "resumo": {"intervalo": 60, "buscado_em": AGORA},
+        "stats": {"intervalo": 360, "buscado_em": AGORA},
+    }}
+
+    assert minutos_ate_vencer(detalhes, agora=AGORA + 10 * 60) == (50.0, 350.0)
+
+
+def test_minutos_nunca_ficam_abaixo_de_um():
+    detalhes = {"ttl_grupos": {
+        "resumo": {"intervalo": 60, "buscado_em": AGORA},
+        "stats": {"intervalo": 360, "buscado_em": AGORA},
+    }}
+
+    assert minutos_ate_vencer(detalhes, agora=AGORA + 1000 * 60) == (1.0, 1.0)